@@ -1,14 +1,85 @@
 import logging
+import os
 
+import anyio
 import click
 import uvicorn
+from ldap3.core.exceptions import LDAPException
 from uvicorn.config import LOG_LEVELS
 from uvicorn.logging import ColourizedFormatter
 from uvicorn.main import LEVEL_CHOICES
 
 import ldap_ui
 
-from . import settings
+from . import directory, settings
+
+# Default index refresh in seconds for several workers without a change feed
+MULTI_WORKER_REFRESH = 60
+
+logger = logging.getLogger(__name__)
+
+
+def discover() -> None:
+    """
+    Detect the base and schema DNs before starting workers,
+    and pass them on in the environment, so that all workers agree.
+    """
+
+    from . import ldap_api
+
+    try:
+        anyio.run(ldap_api.discover)
+    except (LDAPException, ValueError) as e:
+        logger.warning("Cannot detect directory settings: %s", e)
+        return
+
+    for name in ("BASE_DN", "SCHEMA_DN"):
+        if value := getattr(settings, name):
+            os.environ[name] = value
+
+    if settings.SCHEMA_SNAPSHOT:  # Workers load the same schema
+        directory.info.save(settings.SCHEMA_SNAPSHOT)
+
+
+def check_indexes() -> None:
+    """
+    Workers only see their own changes without a change feed,
+    so refresh in-memory indexes more often.
+    """
+
+    if settings.CHANGE_FEED != "off" or not (
+        settings.DN_INDEX or settings.SEARCH_INDEX or settings.MEMBERSHIP_INDEX
+    ):
+        return
+
+    if "DN_INDEX_REFRESH" not in os.environ:
+        settings.DN_INDEX_REFRESH = MULTI_WORKER_REFRESH
+        os.environ["DN_INDEX_REFRESH"] = str(MULTI_WORKER_REFRESH)
+    if settings.DN_INDEX_REFRESH:
+        logger.warning(
+            "Without CHANGE_FEED, workers may serve stale indexes for up to %d s",
+            settings.DN_INDEX_REFRESH,
+        )
+    else:
+        logger.warning("Without CHANGE_FEED, workers may serve stale indexes")
+
+
+def save_schema(path: str) -> None:
+    "Write a schema snapshot with the service credentials"
+
+    from . import ldap_api
+
+    async def read() -> None:
+        connection = await ldap_api.service_connect()
+        connection.unbind()
+
+    try:
+        anyio.run(read)
+    except (LDAPException, ValueError) as e:
+        raise click.ClickException(f"Cannot read the schema: {e}")
+    if directory.info.schema is None:
+        raise click.ClickException("The schema is not readable")
+    directory.info.save(path)
 
 
 def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> None:
@@ -62,6 +133,62 @@ def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> No
     is_flag=True,
     help="Watch for changes and reload?",
 )
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=1,
+    envvar="WEB_CONCURRENCY",
+    help="Number of worker processes.",
+    show_default=True,
+)
+@click.option(
+    "--loop",
+    type=click.Choice(["auto", "asyncio", "uvloop"]),
+    default="auto",
+    help="Event loop implementation, uvloop if installed.",
+    show_default=True,
+)
+@click.option(
+    "--http",
+    type=click.Choice(["auto", "h11", "httptools"]),
+    default="auto",
+    help="HTTP implementation, httptools if installed.",
+    show_default=True,
+)
+@click.option(
+    "--backlog",
+    type=int,
+    default=2048,
+    help="Maximum number of connections waiting to be accepted.",
+    show_default=True,
+)
+@click.option(
+    "--timeout-keep-alive",
+    type=int,
+    default=5,
+    help="Close idle keep-alive connections after this many seconds.",
+    show_default=True,
+)
+@click.option(
+    "--max-requests",
+    type=int,
+    default=None,
+    help="Recycle workers after about this many requests.",
+)
+@click.option(
+    "--timeout-graceful-shutdown",
+    type=int,
+    default=30,
+    help="Seconds to let requests finish when a worker stops.",
+    show_default=True,
+)
+@click.option(
+    "--save-schema",
+    "save_schema_path",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Save the root DSE and schema to a snapshot file and exit.",
+)
 @click.option(
     "--version",
     is_flag=True,
@@ -70,18 +197,57 @@ def print_version(ctx: click.Context, param: click.Parameter, value: bool) -> No
     is_eager=True,
     help="Display the current version and exit.",
 )
-def main(base_dn, host, port, ldap_url, log_level, reload):
+def main(
+    base_dn,
+    host,
+    port,
+    ldap_url,
+    log_level,
+    reload,
+    workers,
+    loop,
+    http,
+    backlog,
+    timeout_keep_alive,
+    max_requests,
+    timeout_graceful_shutdown,
+    save_schema_path,
+):
     logging.basicConfig(level=LOG_LEVELS[log_level])
     rootHandler = logging.getLogger().handlers[0]
     rootHandler.setFormatter(ColourizedFormatter(fmt="%(levelprefix)s %(message)s"))
 
+    # Workers and reloaded processes read the settings from the environment
     if base_dn is not None:
-        settings.BASE_DN = base_dn
+        settings.BASE_DN = os.environ["BASE_DN"] = base_dn
 
     if ldap_url is not None:
-        settings.LDAP_URL = ldap_url
+        settings.LDAP_URL = os.environ["LDAP_URL"] = ldap_url
+
+    if save_schema_path:
+        save_schema(save_schema_path)
+        return
+
+    if workers > 1:
+        if reload:
+            raise click.UsageError("--reload cannot be used with --workers")
+        check_indexes()
+        discover()
 
-    uvicorn.run("ldap_ui.app:app", host=host, port=port, reload=reload)
+    uvicorn.run(
+        "ldap_ui.app:app",
+        host=host,
+        port=port,
+        reload=reload,
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=backlog,
+        timeout_keep_alive=timeout_keep_alive,
+        limit_max_requests=max_requests,
+        limit_max_requests_jitter=max_requests // 10 if max_requests else 0,
+        timeout_graceful_shutdown=timeout_graceful_shutdown,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,182 @@
+"""
+Admission control for directory requests.
+
+Every API request holds one LDAP connection while it is processed.
+At most `LDAP_CONNECTIONS` requests are admitted at once, and each user
+may hold at most `LDAP_USER_CONNECTIONS` of them. Further requests wait
+in a queue that is served round-robin by user, so that one busy client
+cannot starve the others. Users are told apart by their credentials.
+Requests without credentials, e.g. if the UI binds with a hard-wired DN,
+may come from any number of users, possibly through one proxy address.
+They share one place in the queue, but not the per-user limit.
+
+Requests are shed with 503 Service Unavailable and a `Retry-After` header
+when the queue or the user's share of it is full, or after waiting for
+`ADMISSION_TIMEOUT` seconds. That keeps a saturated directory from
+timing out every request at once. Queue depth and waiting times
+are reported by `/statusz`, see `health`.
+"""
+
+import logging
+from collections import Counter, deque
+from http import HTTPStatus
+
+from anyio import Event, current_time, move_on_after
+from fastapi import HTTPException
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+# Requests without credentials, which are not limited per user
+SHARED = ""
+
+
+class Ticket:
+    "Admission of a single request"
+
+    def __init__(self, gate: "Admission", user: str) -> None:
+        self.gate = gate
+        self.user = user
+        self.released = False
+
+    def release(self) -> None:
+        "Give up the admission, e.g. before streaming a response"
+        if not self.released:
+            self.released = True
+            self.gate.release(self.user)
+
+
+class Admission:
+    "Bounded concurrency with a fair queue"
+
+    def __init__(
+        self, limit: int, per_user: int, queue_max: int, timeout: float
+    ) -> None:
+        self.limit = limit  # 0 for no limit
+        self.per_user = per_user  # 0 for no limit
+        self.queue_max = queue_max
+        self.timeout = timeout
+
+        self.active = 0
+        self.users: Counter[str] = Counter()  # Active requests by user
+        self.waiting: dict[str, deque[Event]] = {}  # In round-robin order
+        self.queued = 0
+
+        # Statistics
+        self.admitted = 0
+        self.shed = 0
+        self.waits = 0  # Requests that had to wait
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def capped(self, user: str) -> bool:
+        return bool(self.per_user) and user != SHARED
+
+    def admissible(self, user: str) -> bool:
+        return (not self.limit or self.active < self.limit) and (
+            not self.capped(user) or self.users[user] < self.per_user
+        )
+
+    def admit(self, user: str) -> None:
+        self.active += 1
+        self.users[user] += 1
+        self.admitted += 1
+
+    def overloaded(self, reason: str) -> HTTPException:
+        self.shed += 1
+        logger.debug("Request shed: %s", reason)
+        return HTTPException(
+            HTTPStatus.SERVICE_UNAVAILABLE,
+            f"The directory is busy: {reason}",
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+        )
+
+    async def acquire(self, user: str) -> Ticket:
+        "Wait for admission, or fail with 503 Service Unavailable"
+
+        if user not in self.waiting and self.admissible(user):
+            self.admit(user)
+            return Ticket(self, user)
+
+        queue = self.waiting.get(user)
+        if self.queued >= self.queue_max:
+            raise self.overloaded("too many waiting requests")
+        if queue and self.capped(user) and len(queue) >= self.per_user:
+            raise self.overloaded("too many requests by this user")
+
+        event = Event()
+        self.waiting.setdefault(user, deque()).append(event)
+        self.queued += 1
+        start = current_time()
+        try:
+            with move_on_after(self.timeout):
+                await event.wait()
+        except BaseException:  # Cancelled, e.g. the client went away
+            if event.is_set():
+                self.release(user)
+            else:
+                self.withdraw(user, event)
+            raise
+
+        waited = current_time() - start
+        self.waits += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        if not event.is_set():
+            self.withdraw(user, event)
+            raise self.overloaded(f"no capacity within {self.timeout:g} s")
+        return Ticket(self, user)  # Admitted by `dispatch`
+
+    def withdraw(self, user: str, event: Event) -> None:
+        "Remove a waiting request from the queue"
+        if (queue := self.waiting.get(user)) and event in queue:
+            queue.remove(event)
+            self.queued -= 1
+            if not queue:
+                del self.waiting[user]
+
+    def release(self, user: str) -> None:
+        self.active -= 1
+        self.users[user] -= 1
+        if not self.users[user]:
+            del self.users[user]
+        self.dispatch()
+
+    def dispatch(self) -> None:
+        "Admit waiting requests, one user after the other"
+
+        while self.waiting:
+            user = next((u for u in self.waiting if self.admissible(u)), None)
+            if user is None:
+                return
+            queue = self.waiting.pop(user)
+            queue.popleft().set()
+            self.queued -= 1
+            self.admit(user)
+            if queue:  # Back to the end of the line
+                self.waiting[user] = queue
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "wait_mean": self.wait_total / self.waits if self.waits else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+
+def user_key(authorization: str | None) -> str:
+    "Tell users apart by credentials"
+    return authorization or SHARED
+
+
+gate = Admission(
+    limit=settings.LDAP_CONNECTIONS,
+    per_user=settings.LDAP_USER_CONNECTIONS,
+    queue_max=settings.ADMISSION_QUEUE,
+    timeout=settings.ADMISSION_TIMEOUT,
+)
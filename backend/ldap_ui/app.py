@@ -9,13 +9,18 @@
 """
 
 import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from functools import partial
 from http import HTTPStatus
 
+from anyio import create_task_group
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
+from ldap3 import ASYNC_STREAM
 from ldap3.core.exceptions import (
+    LDAPAssertionFailedResult,
     LDAPEntryAlreadyExistsResult,
     LDAPException,
     LDAPInsufficientAccessRightsResult,
@@ -25,23 +30,75 @@
     LDAPOperationResult,
     LDAPUnwillingToPerformResult,
 )
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
+
+from . import __version__, directory, health, ldap_api, settings, subordinates
+from .changes import DirectoryWatcher, feed
+from .deadlines import DeadlineMiddleware
+from .dn_index import index
+from .member_index import memberships
+from .offload import monitor
+from .search_index import typeahead
+from .singleflight import SingleFlightMiddleware
+from .static_files import PrecompressedStaticFiles
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    "Discover the directory, and run background tasks"
+    if settings.SCHEMA_SNAPSHOT:
+        directory.info.load(settings.SCHEMA_SNAPSHOT)
+    await health.readiness.check()  # Warm up before taking traffic
+    async with create_task_group() as tasks:
+        if settings.SCHEMA_SNAPSHOT:
+            tasks.start_soon(
+                directory.info.watch,
+                settings.SCHEMA_SNAPSHOT,
+                ldap_api.service_connect,
+            )
+        if settings.LOOP_LAG_WARNING:
+            tasks.start_soon(monitor.run)
+        if settings.CHANGE_FEED != "off":
+            connect = partial(ldap_api.service_connect, ASYNC_STREAM)
+            tasks.start_soon(DirectoryWatcher(feed).run, connect)
+        feed.listeners.append(subordinates.cache.apply)
+        if settings.DN_INDEX:
+            feed.listeners.append(index.apply)
+            tasks.start_soon(index.run, ldap_api.service_connect)
+        if settings.MEMBERSHIP_INDEX:
+            feed.listeners.append(memberships.apply)
+            tasks.start_soon(memberships.run, ldap_api.service_connect)
+        if settings.SEARCH_INDEX:
+            feed.listeners.append(typeahead.apply)
+            tasks.start_soon(typeahead.run, ldap_api.service_connect)
+        yield
+        tasks.cancel_scope.cancel()
 
-from . import __version__, ldap_api, settings
 
 # Main ASGI entry
 
-app = FastAPI(debug=settings.DEBUG, title="LDAP UI", version=__version__)
+app = FastAPI(
+    debug=settings.DEBUG, title="LDAP UI", version=__version__, lifespan=lifespan
+)
 app.include_router(ldap_api.api)
-app.mount("/", StaticFiles(packages=["ldap_ui"], html=True))
-
-app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+app.include_router(health.router)
+app.mount("/", PrecompressedStaticFiles(packages=["ldap_ui"], html=True))
+
+app.add_middleware(SingleFlightMiddleware)
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=1000,
+    compresslevel=5,
+    exclude_content_types=(*DEFAULT_EXCLUDED_CONTENT_TYPES, "application/x-ndjson"),
+)
+app.add_middleware(DeadlineMiddleware)
 
 
 @app.middleware("http")
 async def cache_buster(request: Request, call_next) -> Response:
-    "Forbid caching of API responses"
+    "Forbid caching of API responses, unless they declare otherwise"
     response = await call_next(request)
-    if request.url.path.startswith("/api"):
+    if request.url.path.startswith("/api") and "Cache-Control" not in response.headers:
         response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
         response.headers["Pragma"] = "no-cache"
         response.headers["Expires"] = "0"
@@ -51,6 +108,7 @@ async def cache_buster(request: Request, call_next) -> Response:
 # API error handling
 
 LDAP_ERROR_TO_STATUS = {
+    LDAPAssertionFailedResult: HTTPStatus.PRECONDITION_FAILED,
     LDAPEntryAlreadyExistsResult: HTTPStatus.CONFLICT,
     LDAPInsufficientAccessRightsResult: HTTPStatus.FORBIDDEN,
     LDAPInvalidCredentialsResult: HTTPStatus.UNAUTHORIZED,
@@ -0,0 +1,270 @@
+"""
+Live notifications about directory changes.
+
+Browsers subscribe to the DNs they are showing with Server-Sent Events,
+and are notified when these entries or their children change.
+Notifications carry only the DN and the kind of change,
+clients re-read the entries with their own credentials.
+
+Changes made through this instance are always reported.
+Optionally, one watcher per process follows the directory itself
+with the LDAP Content Synchronization protocol (RFC 4533),
+or with a persistent search if the directory does not support it.
+"""
+
+import json
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from dataclasses import asdict, dataclass
+from enum import StrEnum
+from typing import Any
+
+from anyio import (
+    EndOfStream,
+    Event,
+    WouldBlock,
+    create_memory_object_stream,
+    fail_after,
+    from_thread,
+    lowlevel,
+    move_on_after,
+    sleep,
+)
+from ldap3 import NO_ATTRIBUTES, SUBTREE, Connection
+from ldap3.core.exceptions import LDAPException
+
+from . import settings
+from .controls import SYNC_REQUEST, sync_info, sync_request, sync_state
+from .dn import normalize, parent
+
+logger = logging.getLogger(__name__)
+
+# Persistent search, see draft-ietf-ldapext-psearch-03
+PERSISTENT_SEARCH = "2.16.840.1.113730.3.4.3"
+
+# Seconds between keep-alive comments on event streams
+KEEP_ALIVE = 15.0
+
+# Pending notifications per subscriber before it is told to reload
+BACKLOG = 100
+
+# Seconds to wait before reconnecting to the directory
+RETRY_DELAYS = (1, 5, 15, 60)
+
+# Result code that asks for a full refresh, see RFC 4533, section 2.6
+SYNC_REFRESH_REQUIRED = 4096
+
+
+class ChangeType(StrEnum):
+    ADD = "add"
+    MODIFY = "modify"
+    DELETE = "delete"
+    RENAME = "rename"
+    RESET = "reset"  # Changes were lost, reload everything
+
+
+@dataclass(frozen=True)
+class Change:
+    "Notification about a modified entry"
+
+    type: ChangeType
+    dn: str = ""
+    new_dn: str | None = None  # For renamed entries
+
+    def event(self) -> str:
+        "Format as Server-Sent Event"
+        return f"event: change\ndata: {json.dumps(asdict(self))}\n\n"
+
+
+class Subscription:
+    "Change notifications for a set of DNs and their children"
+
+    def __init__(self, dns: Iterable[str]) -> None:
+        self.dns = {normalize(dn) for dn in dns}
+        self.sender, self.receiver = create_memory_object_stream[Change](BACKLOG)
+
+    def matches(self, change: Change) -> bool:
+        if change.type == ChangeType.RESET:
+            return True
+        for dn in filter(None, (change.dn, change.new_dn)):
+            dn = normalize(dn)
+            if dn in self.dns or parent(dn) in self.dns:
+                return True
+        return False
+
+    def notify(self, change: Change) -> None:
+        try:
+            self.sender.send_nowait(change)
+        except WouldBlock:  # Slow client, tell it to start over
+            self.sender.close()
+
+
+class ChangeFeed:
+    "Fan out change notifications to subscribers and listeners"
+
+    def __init__(self) -> None:
+        self.subscriptions: set[Subscription] = set()
+        self.listeners: list[Callable[[Change], None]] = []
+        self.watching = False  # Are changes followed in the directory?
+
+    def publish(self, change: Change) -> None:
+        for listener in self.listeners:
+            listener(change)
+        for subscription in self.subscriptions:
+            if subscription.matches(change):
+                subscription.notify(change)
+
+    def local(self, change: Change) -> None:
+        "Report a change made by this instance, unless the watcher sees it anyway"
+        if not self.watching:
+            self.publish(change)
+
+    async def events(self, dns: Iterable[str]) -> AsyncIterator[str]:
+        "Stream notifications as Server-Sent Events"
+
+        subscription = Subscription(dns)
+        self.subscriptions.add(subscription)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    with fail_after(KEEP_ALIVE):
+                        change = await subscription.receiver.receive()
+                    yield change.event()
+                except TimeoutError:
+                    yield ": keep-alive\n\n"
+        except EndOfStream:  # Closed on overflow
+            yield Change(ChangeType.RESET).event()
+        finally:
+            self.subscriptions.discard(subscription)
+            subscription.receiver.close()
+
+
+feed = ChangeFeed()
+
+
+class DirectoryWatcher:
+    """
+    Follow changes in the directory with one long-running search.
+    ldap3 delivers responses in its receiver thread,
+    they are handed over to the event loop for publishing.
+    """
+
+    def __init__(self, feed: ChangeFeed) -> None:
+        self.feed = feed
+        self.cookie: bytes | None = None  # Resume point for content sync
+        self.refreshing = False  # Receiving initial content or missed changes?
+        self.resumed = False  # Refreshing after a reconnect?
+        self.ended = Event()  # Set when the directory ends the search
+
+    async def run(self, connect: Callable[[], Awaitable[Connection]]) -> None:
+        "Watch the directory until cancelled, reconnect on failure"
+
+        failures = 0
+        while True:
+            try:
+                connection = await connect()
+                try:
+                    self.ended = Event()
+                    self.start(connection)
+                    self.feed.watching = True
+                    failures = 0
+                    while not connection.closed and not self.ended.is_set():
+                        with move_on_after(1):
+                            await self.ended.wait()
+                finally:
+                    self.feed.watching = False
+                    connection.unbind()
+            except (LDAPException, ValueError) as e:
+                logger.warning("Cannot watch directory changes: %s", e)
+
+            # Changes may have been missed in between
+            self.feed.publish(Change(ChangeType.RESET))
+            await sleep(RETRY_DELAYS[min(failures, len(RETRY_DELAYS) - 1)])
+            failures += 1
+
+    def start(self, connection: Connection) -> None:
+        "Start the change search on an ASYNC_STREAM connection"
+
+        token = lowlevel.current_token()
+        supported = {oid for oid, *_ in connection.server.info.supported_controls or []}
+        mode = settings.CHANGE_FEED
+        if mode == "auto":
+            mode = "syncrepl" if SYNC_REQUEST in supported else "psearch"
+
+        def deliver(response: dict[str, Any]) -> None:
+            try:
+                if response["type"] == "searchResDone":
+                    from_thread.run_sync(self.end, response, token=token)
+                elif change := self.decode(response, mode):
+                    from_thread.run_sync(self.feed.publish, change, token=token)
+            except Exception:
+                logger.exception("Cannot process directory change")
+
+        if mode == "syncrepl":
+            self.refreshing, self.resumed = True, self.cookie is not None
+            connection.strategy.callback = deliver
+            with connection.strategy.async_lock:
+                msgid = connection.search(
+                    settings.BASE_DN,
+                    "(objectClass=*)",
+                    search_scope=SUBTREE,
+                    attributes=NO_ATTRIBUTES,
+                    controls=[sync_request(self.cookie)],
+                )
+                connection.strategy.persistent_search_message_id = msgid
+
+        elif mode == "psearch":
+            if PERSISTENT_SEARCH not in supported:
+                raise ValueError("Directory supports neither syncrepl nor psearch")
+            connection.extend.standard.persistent_search(
+                settings.BASE_DN,
+                attributes=NO_ATTRIBUTES,
+                streaming=False,
+                callback=deliver,
+            )
+
+        else:
+            raise ValueError(f"Unknown change feed: {mode}")
+
+    def end(self, response: dict[str, Any]) -> None:
+        "Reconnect when the directory ends the search, e.g. on a limit"
+
+        logger.warning(
+            "Directory ended the change search: %s",
+            response.get("message") or response.get("description"),
+        )
+        if response.get("result") == SYNC_REFRESH_REQUIRED:
+            self.cookie = None  # Start over with a full refresh
+        self.ended.set()
+
+    def decode(self, response: dict[str, Any], mode: str) -> Change | None:
+        "Extract a change notification from a search response"
+
+        if mode == "psearch":
+            change_type = response.get("changeType")
+            if response["type"] != "searchResEntry" or not change_type:
+                return None
+            if change_type == "modify dn":
+                return Change(
+                    ChangeType.RENAME, str(response["previousDN"]), response["dn"]
+                )
+            return Change(ChangeType(change_type), response["dn"])
+
+        if info := sync_info(response):
+            self.cookie = info.cookie or self.cookie
+            if info.refresh_done:
+                self.refreshing = False
+            if info.deleted:  # Only UUIDs are known
+                return Change(ChangeType.RESET)
+            return None
+
+        state = sync_state(response)
+        if state is None:
+            return None
+        self.cookie = state.cookie or self.cookie
+
+        # Initial content is not news, changes since a known cookie are
+        if state.state == "present" or (self.refreshing and not self.resumed):
+            return None
+        return Change(ChangeType(state.state), response["dn"])
@@ -0,0 +1,222 @@
+"""
+LDAP controls that are not covered by ldap3.
+
+Controls are passed to ldap3 operations as `(oid, criticality, value)`
+tuples with a BER encoded value. Response controls arrive undecoded
+and are parsed here.
+"""
+
+from dataclasses import dataclass
+from typing import Any
+from uuid import UUID
+
+from ldap3.operation.search import (
+    build_attribute_selection,
+    compile_filter,
+    parse_filter,
+    raw_attributes_to_dict_fast,
+)
+from ldap3.utils.asn1 import decode_sequence
+from pyasn1.codec.ber import decoder, encoder
+from pyasn1.type.constraint import SingleValueConstraint
+from pyasn1.type.namedtype import (
+    DefaultedNamedType,
+    NamedType,
+    NamedTypes,
+    OptionalNamedType,
+)
+from pyasn1.type.namedval import NamedValues
+from pyasn1.type.tag import Tag, tagClassContext, tagFormatConstructed, tagFormatSimple
+from pyasn1.type.univ import Boolean, Choice, Enumerated, OctetString, Sequence, SetOf
+
+Control = tuple[str, bool, bytes | None]
+
+#
+# Assertion control, see RFC 4528
+#
+
+ASSERTION = "1.3.6.1.1.12"
+
+
+def assertion(search_filter: str) -> Control:
+    "Request control that makes an update conditional on a filter"
+
+    node = parse_filter(
+        search_filter,
+        None,
+        auto_escape=True,
+        auto_encode=True,
+        validator=None,
+        check_names=False,
+    )
+    return ASSERTION, True, encoder.encode(compile_filter(node.elements[0]))
+
+
+#
+# Read entry controls, see RFC 4527
+#
+
+PRE_READ = "1.3.6.1.1.13.1"
+POST_READ = "1.3.6.1.1.13.2"
+
+
+def post_read(attributes: list[str]) -> Control:
+    "Request control to return an entry as it is after an update"
+    return POST_READ, True, encoder.encode(build_attribute_selection(attributes, None))
+
+
+def read_entry_value(encoded: bytes) -> dict[str, Any]:
+    "Decode the entry of a read entry control, keeping the values as bytes"
+    dn, attributes = decode_sequence(encoded, 0, len(encoded))[0][3]
+    return {
+        "raw_dn": dn[3],
+        "raw_attributes": raw_attributes_to_dict_fast(attributes[3]),
+    }
+
+
+#
+# LDAP Content Synchronization, see RFC 4533
+#
+
+SYNC_REQUEST = "1.3.6.1.4.1.4203.1.9.1.1"
+SYNC_STATE = "1.3.6.1.4.1.4203.1.9.1.2"
+SYNC_DONE = "1.3.6.1.4.1.4203.1.9.1.3"
+SYNC_INFO = "1.3.6.1.4.1.4203.1.9.1.4"
+
+
+class _SyncMode(Enumerated):
+    namedValues = NamedValues(("refreshOnly", 1), ("refreshAndPersist", 3))
+    subtypeSpec = Enumerated.subtypeSpec + SingleValueConstraint(1, 3)
+
+
+class _SyncRequestValue(Sequence):
+    componentType = NamedTypes(
+        NamedType("mode", _SyncMode()),
+        OptionalNamedType("cookie", OctetString()),
+        DefaultedNamedType("reloadHint", Boolean(False)),
+    )
+
+
+class _SyncState(Enumerated):
+    namedValues = NamedValues(("present", 0), ("add", 1), ("modify", 2), ("delete", 3))
+
+
+class _SyncStateValue(Sequence):
+    componentType = NamedTypes(
+        NamedType("state", _SyncState()),
+        NamedType("entryUUID", OctetString()),
+        OptionalNamedType("cookie", OctetString()),
+    )
+
+
+class _RefreshPhase(Sequence):
+    componentType = NamedTypes(
+        OptionalNamedType("cookie", OctetString()),
+        DefaultedNamedType("refreshDone", Boolean(True)),
+    )
+
+
+class _SyncIdSet(Sequence):
+    componentType = NamedTypes(
+        OptionalNamedType("cookie", OctetString()),
+        DefaultedNamedType("refreshDeletes", Boolean(False)),
+        NamedType("syncUUIDs", SetOf(componentType=OctetString())),
+    )
+
+
+def _context(tag: int, constructed: bool = True) -> Tag:
+    return Tag(
+        tagClassContext, tagFormatConstructed if constructed else tagFormatSimple, tag
+    )
+
+
+class _SyncInfoValue(Choice):
+    componentType = NamedTypes(
+        NamedType(
+            "newcookie",
+            OctetString().subtype(implicitTag=_context(0, constructed=False)),
+        ),
+        NamedType("refreshDelete", _RefreshPhase().subtype(implicitTag=_context(1))),
+        NamedType("refreshPresent", _RefreshPhase().subtype(implicitTag=_context(2))),
+        NamedType("syncIdSet", _SyncIdSet().subtype(implicitTag=_context(3))),
+    )
+
+
+def sync_request(cookie: bytes | None = None, persist: bool = True) -> Control:
+    "Request control to start or resume content synchronization"
+
+    value = _SyncRequestValue()
+    value["mode"] = "refreshAndPersist" if persist else "refreshOnly"
+    if cookie is not None:
+        value["cookie"] = cookie
+    return SYNC_REQUEST, True, encoder.encode(value)
+
+
+@dataclass(frozen=True)
+class SyncState:
+    "State of an entry, attached to search results"
+
+    state: str  # present, add, modify or delete
+    uuid: UUID
+    cookie: bytes | None
+
+
+@dataclass(frozen=True)
+class SyncInfo:
+    "Intermediate message about the synchronization progress"
+
+    cookie: bytes | None
+    refresh_done: bool = False
+    deleted: list[UUID] | None = None  # Entries deleted during refresh
+
+
+def _control_value(response: dict[str, Any], oid: str) -> bytes | None:
+    control = response.get("controls", {}).get(oid)
+    return control and control["value"]
+
+
+def read_entry(
+    response: dict[str, Any], oid: str = POST_READ
+) -> tuple[bytes, dict[str, list[bytes]]] | None:
+    "Raw DN and attributes of a read entry control in an operation result"
+
+    value = _control_value(response, oid)
+    if not isinstance(value, dict) or "raw_attributes" not in value:
+        return None  # Not decoded by `ldap_helpers.LazyAsyncStrategy`
+    return value["raw_dn"], value["raw_attributes"]
+
+
+def sync_state(response: dict[str, Any]) -> SyncState | None:
+    "Decode the sync state control of a search result entry"
+
+    if not (encoded := _control_value(response, SYNC_STATE)):
+        return None
+    value, _ = decoder.decode(encoded, asn1Spec=_SyncStateValue())
+    cookie = value["cookie"]
+    return SyncState(
+        state=value["state"].prettyPrint(),
+        uuid=UUID(bytes=bytes(value["entryUUID"])),
+        cookie=bytes(cookie) if cookie.isValue else None,
+    )
+
+
+def sync_info(response: dict[str, Any]) -> SyncInfo | None:
+    "Decode a sync info intermediate response"
+
+    if response.get("responseName") != SYNC_INFO:
+        return None
+    value, _ = decoder.decode(response["responseValue"], asn1Spec=_SyncInfoValue())
+    kind = value.getName()
+    if kind == "newcookie":
+        return SyncInfo(cookie=bytes(value["newcookie"]))
+
+    component = value[kind]
+    cookie = bytes(component["cookie"]) if component["cookie"].isValue else None
+    if kind == "syncIdSet":
+        return SyncInfo(
+            cookie=cookie,
+            deleted=[UUID(bytes=bytes(u)) for u in component["syncUUIDs"]]
+            if component["refreshDeletes"]
+            else None,
+        )
+    return SyncInfo(cookie=cookie, refresh_done=bool(component["refreshDone"]))
@@ -0,0 +1,104 @@
+"""
+Deadlines for API requests, and cancellation when clients go away.
+
+Every API request is cancelled after `REQUEST_DEADLINE` seconds,
+or `BULK_REQUEST_DEADLINE` for LDIF transfers and subtree operations.
+Overdue requests are answered with 504 Gateway Timeout, unless the
+response has already started. Requests are also cancelled as soon as
+the client disconnects, e.g. when a browser tab is closed while
+a large subtree is listed.
+
+Cancellation reaches pending LDAP operations, which are abandoned,
+see `ldap_helpers.get_response`. Interactive searches also ask the
+directory to give up after `SEARCH_TIME_LIMIT` seconds.
+"""
+
+import logging
+from http import HTTPStatus
+
+from anyio import (
+    CancelScope,
+    EndOfStream,
+    create_memory_object_stream,
+    create_task_group,
+    move_on_after,
+)
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+# Path prefixes of long-running requests
+BULK_PATHS = ("/api/copy/", "/api/ldif", "/api/subtree/")
+
+# Path prefixes without deadlines
+STREAMING_PATHS = ("/api/events",)
+
+
+def deadline(path: str) -> float | None:
+    "Seconds to process a request, or None without limit"
+
+    if path.startswith(STREAMING_PATHS):
+        return None
+    if path.startswith(BULK_PATHS):
+        return settings.BULK_REQUEST_DEADLINE or None
+    return settings.REQUEST_DEADLINE or None
+
+
+class DeadlineMiddleware:
+    "Cancel API requests that take too long, or whose clients went away"
+
+    def __init__(self, app: ASGIApp, prefix: str = "/api/") -> None:
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        started = complete = False
+        sender, receiver = create_memory_object_stream[Message](1)
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal started, complete
+            if message["type"] == "http.response.start":
+                started = True
+            elif message["type"] == "http.response.body":
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        async def forwarding_receive() -> Message:
+            try:
+                return await receiver.receive()
+            except EndOfStream:
+                return {"type": "http.disconnect"}
+
+        async def listen(scope: CancelScope) -> None:
+            "Pass the request body on, and watch for disconnects"
+            async with sender:
+                while True:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        if not complete:
+                            logger.debug("Client went away, cancelling request")
+                            scope.cancel()
+                        return
+                    await sender.send(message)
+
+        timeout = deadline(scope["path"])
+        async with create_task_group() as tasks:
+            tasks.start_soon(listen, tasks.cancel_scope)
+            with move_on_after(timeout or float("inf")) as timer:
+                await self.app(scope, forwarding_receive, tracking_send)
+            tasks.cancel_scope.cancel()  # Stop listening
+        receiver.close()
+
+        if timer.cancelled_caught and not started:
+            response = JSONResponse(
+                {"detail": [f"Request exceeded its deadline of {timeout:g} s"]},
+                status_code=HTTPStatus.GATEWAY_TIMEOUT,
+            )
+            await response(scope, receive, send)
@@ -0,0 +1,162 @@
+"""
+Root DSE and schema of the directory, cached per process.
+
+ldap3 reads the root DSE and the subschema entry on every bind.
+The schema is by far the largest transfer when connecting,
+and it rarely changes. It is kept for `SCHEMA_CACHE_TTL` seconds,
+and new connections are set up with the cached copy,
+see `ldap_api.ldap_connect`.
+
+With `SCHEMA_SNAPSHOT`, the information is saved to a JSON file
+and loaded from there by all worker processes, so that they agree
+on the schema version and need not read it from the directory.
+The live schema is checked every `SCHEMA_CACHE_TTL` seconds
+with a search for the `modifyTimestamp` of the subschema entry,
+and the snapshot is replaced if it has changed.
+"""
+
+import json
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from anyio import sleep
+from ldap3 import BASE, Connection, Server
+from ldap3.core.exceptions import LDAPException
+from ldap3.protocol.rfc4512 import DsaInfo, SchemaInfo
+
+from . import settings
+from .ldap_helpers import unique
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the live schema, if SCHEMA_CACHE_TTL is 0
+CHECK_INTERVAL = 300
+
+
+def _timestamp(schema: SchemaInfo | None) -> str | None:
+    "Modification time of the subschema entry, as stored"
+    values = schema.raw.get("modifyTimestamp") if schema else None
+    if not values:
+        return None
+    value = values[0]
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class ServerInfo:
+    "Cached server information"
+
+    def __init__(self) -> None:
+        self.dsa: DsaInfo | None = None
+        self.schema: SchemaInfo | None = None
+        self.loaded = 0.0  # Monotonic time of the last update
+        self.snapshot: int | None = None  # Modification time of the loaded file
+
+    @property
+    def current(self) -> bool:
+        "Can connections skip reading the server information?"
+        return self.schema is not None and (
+            self.snapshot is not None
+            or time.monotonic() - self.loaded < settings.SCHEMA_CACHE_TTL
+        )
+
+    def update(self, server: Server) -> None:
+        "Keep the information read by a connection"
+        if (
+            isinstance(server.info, DsaInfo)
+            and isinstance(server.schema, SchemaInfo)
+            and server.schema is not self.schema
+        ):
+            self.dsa, self.schema = server.info, server.schema
+            self.loaded = time.monotonic()
+
+    def load(self, path: str) -> bool:
+        "Read a snapshot file, if present"
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+            schema = SchemaInfo.from_json(json.dumps(data["schema"]))
+            dsa = DsaInfo.from_json(json.dumps(data["dsa"]), schema)
+        except FileNotFoundError:
+            return False
+        except (OSError, LDAPException, KeyError, ValueError) as e:
+            logger.warning("Cannot load schema snapshot %s: %s", path, e)
+            return False
+
+        self.dsa, self.schema = dsa, schema
+        self.loaded, self.snapshot = time.monotonic(), mtime
+        logger.info("Loaded schema snapshot %s", path)
+        return True
+
+    def save(self, path: str) -> None:
+        "Replace the snapshot file atomically"
+        if self.dsa is None or self.schema is None:
+            return
+
+        data = {
+            "dsa": json.loads(self.dsa.to_json(indent=None)),
+            "schema": json.loads(self.schema.to_json(indent=None)),
+        }
+        target = Path(path)
+        temp = target.with_name(f".{target.name}.{os.getpid()}")
+        temp.write_text(json.dumps(data), encoding="utf-8")
+        temp.replace(target)
+        self.snapshot = os.stat(path).st_mtime_ns
+        logger.info("Saved schema snapshot %s", path)
+
+    async def changed(self, connection: Connection) -> bool:
+        "Has the live schema been modified since it was read?"
+        if not (stamp := _timestamp(self.schema)) or not settings.SCHEMA_DN:
+            return True  # Cannot tell
+        entry = await unique(
+            connection,
+            connection.search(
+                settings.SCHEMA_DN,
+                "(objectClass=subschema)",
+                BASE,
+                attributes=["modifyTimestamp"],
+            ),
+        )
+        values = entry.raw_attributes.get("modifyTimestamp")
+        return not values or values[0].decode() != stamp
+
+    async def refresh(
+        self, path: str, connect: Callable[[], Awaitable[Connection]]
+    ) -> None:
+        "Follow changes of the snapshot file and of the live schema"
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is not None and mtime != self.snapshot and self.load(path):
+            return  # Replaced by another process
+        if mtime is None and self.schema is not None:
+            self.save(path)
+            return
+
+        connection = await connect()
+        try:
+            if self.schema is None or await self.changed(connection):
+                connection.refresh_server_info()
+                self.update(connection.server)
+                self.save(path)
+        finally:
+            connection.unbind()
+
+    async def watch(
+        self, path: str, connect: Callable[[], Awaitable[Connection]]
+    ) -> None:
+        "Keep the snapshot current until cancelled"
+        while True:
+            try:
+                await self.refresh(path, connect)
+            except (LDAPException, OSError, ValueError) as e:
+                logger.warning("Cannot refresh schema snapshot: %s", e)
+            await sleep(settings.SCHEMA_CACHE_TTL or CHECK_INTERVAL)
+
+
+info = ServerInfo()
@@ -0,0 +1,250 @@
+"""
+Distinguished names, see RFC 4514.
+
+DNs are compared in a normalized form: attribute types in lower case,
+values unescaped, case-folded with insignificant spaces removed,
+and re-escaped canonically. Multi-valued RDNs are sorted.
+This approximates the matching rules of common naming attributes
+without consulting the schema.
+
+Parsed DNs are cached, since the same DNs are seen over and over.
+"""
+
+import re
+from collections.abc import Iterator
+from functools import lru_cache
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+# Characters that are escaped in attribute values
+SPECIAL = frozenset(',+"\\<>;=')
+
+HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+# DNs without these characters are simply split at commas
+COMPLEX = re.compile(r'[\\"+;#]')
+
+ESCAPED = re.compile(r'[,+"\\<>;=]')
+
+
+def _value(dn: str, pos: int) -> tuple[str, int]:
+    "Scan an attribute value, return the normalized value and the end position"
+
+    if pos < len(dn) and dn[pos] == "#":  # BER encoded value
+        end = pos + 1
+        while end < len(dn) and dn[end] in HEX_DIGITS:
+            end += 1
+        return dn[pos:end].lower(), end
+
+    value, end = _string(dn, pos)
+    return escape(" ".join(value.lower().split())), end
+
+
+def _string(dn: str, pos: int) -> tuple[str, int]:
+    "Scan a string value, return the unescaped value and the end position"
+
+    if pos < len(dn) and dn[pos] == '"':  # Quoted value, RFC 2253
+        out, end = [], pos + 1
+        while end < len(dn) and dn[end] != '"':
+            if dn[end] == "\\":
+                end += 1
+            out.append(dn[end : end + 1])
+            end += 1
+        if end >= len(dn):
+            raise ValueError(f"Unterminated quote in DN: {dn}")
+        return "".join(out), end + 1
+
+    out, trailing = bytearray(), 0  # Length without unescaped trailing spaces
+    end = pos
+    while end < len(dn) and dn[end] not in ",+;":
+        char = dn[end]
+        if char == "\\":
+            pair = dn[end + 1 : end + 3]
+            if len(pair) == 2 and pair[0] in HEX_DIGITS and pair[1] in HEX_DIGITS:
+                out.append(int(pair, 16))
+                end += 3
+            elif pair:
+                out += pair[0].encode()
+                end += 2
+            else:
+                raise ValueError(f"Trailing backslash in DN: {dn}")
+            trailing = len(out)
+            continue
+        out += char.encode()
+        if char != " ":
+            trailing = len(out)
+        end += 1
+    return out[:trailing].decode(errors="surrogateescape"), end
+
+
+def escape(value: str) -> str:
+    "Escape an attribute value for use in a DN"
+
+    out = ESCAPED.sub(r"\\\g<0>", value) if ESCAPED.search(value) else value
+    if out[:1] in ("#", " "):
+        out = "\\" + out
+    if out.endswith(" ") and not out.endswith("\\ "):
+        out = out[:-1] + "\\ "
+    return out
+
+
+def _simple_rdn(rdn: str) -> str:
+    "Normalize an RDN without special characters"
+    attr, equals, value = rdn.partition("=")
+    attr = attr.strip().lower()
+    if not equals or not attr:
+        raise ValueError(f"Invalid RDN: {rdn}")
+    return f"{attr}={escape(' '.join(value.lower().split()))}"
+
+
+@lru_cache(maxsize=1 << 16)
+def parse(dn: str) -> tuple[tuple[str, str], ...]:
+    """
+    Split a DN into RDNs, leaf first.
+    Returns the original text and the normalized form of each RDN.
+    """
+
+    if not dn.strip():
+        return ()
+
+    if not COMPLEX.search(dn):  # Fast path, parents are likely cached
+        rdn, comma, rest = dn.partition(",")
+        head = rdn.strip(), _simple_rdn(rdn)
+        if not comma:
+            return (head,)
+        if not rest.strip():
+            raise ValueError(f"Invalid DN: {dn}")
+        return (head, *parse(rest))
+
+    rdns, avas = [], []
+    start = pos = 0
+    while True:
+        while pos < len(dn) and dn[pos] == " ":
+            pos += 1
+        equals = dn.find("=", pos)
+        if equals < 0:
+            raise ValueError(f"Invalid DN: {dn}")
+        attr = dn[pos:equals].strip().lower()
+        if not attr or any(c in SPECIAL for c in attr):
+            raise ValueError(f"Invalid attribute type in DN: {dn}")
+
+        value, pos = _value(dn, equals + 1)
+        avas.append(f"{attr}={value}")
+
+        while pos < len(dn) and dn[pos] == " ":
+            pos += 1
+        if pos < len(dn) and dn[pos] == "+":
+            pos += 1
+            continue
+        if pos < len(dn) and dn[pos] not in ",;":
+            raise ValueError(f"Invalid DN: {dn}")
+
+        rdns.append((dn[start:pos].strip(), "+".join(sorted(avas))))
+        avas = []
+        if pos >= len(dn):
+            break
+        pos += 1
+        start = pos
+    return tuple(rdns)
+
+
+def avas(rdn: str) -> list[tuple[str, str]]:
+    "Attribute types and unescaped values of an RDN"
+
+    result, pos = [], 0
+    while True:
+        equals = rdn.find("=", pos)
+        attr = rdn[pos:equals].strip()
+        if equals < 0 or not attr:
+            raise ValueError(f"Invalid RDN: {rdn}")
+        start = equals + 1
+        while start < len(rdn) and rdn[start] == " ":
+            start += 1
+        value, pos = _string(rdn, start)
+        result.append((attr, value))
+        while pos < len(rdn) and rdn[pos] == " ":
+            pos += 1
+        if pos >= len(rdn) or rdn[pos] != "+":
+            return result
+        pos += 1
+
+
+def normalize_rdn(rdn: str) -> str:
+    "Canonical form of a single RDN"
+    return parse(rdn)[0][1] if COMPLEX.search(rdn) else _simple_rdn(rdn)
+
+
+def rdns(dn: str) -> list[str]:
+    "RDNs of a DN as written, leaf first"
+    return [rdn for rdn, _ in parse(dn)]
+
+
+def normalize(dn: str) -> str:
+    "Canonical form of a DN for comparisons"
+    return ",".join(key for _, key in parse(dn))
+
+
+def within(dn: str, base: str) -> bool:
+    "Is a DN equal to or below another?"
+    key, base_key = normalize(dn), normalize(base)
+    return key == base_key or key.endswith("," + base_key)
+
+
+def parent(dn: str) -> str:
+    "DN of the parent entry, as written"
+    if not COMPLEX.search(dn):
+        return dn.partition(",")[2].strip()
+    return ",".join(rdns(dn)[1:])
+
+
+def sort_key(dn: str) -> str:
+    """
+    Order DNs by hierarchy, parents before children and siblings by RDN.
+    Normalized RDNs are joined leaf last by a character that sorts before
+    all others, so that keys compare like tuples, but faster.
+    Only DNs with special characters are parsed.
+    """
+    if COMPLEX.search(dn):
+        return "\0".join(key for _, key in reversed(parse(dn)))
+    return _simple_key(dn)
+
+
+def _simple_key(dn: str) -> str:
+    "Sort key of a DN without special characters"
+    rdn, comma, rest = dn.partition(",")
+    return f"{_parent_key(rest)}\0{_simple_rdn(rdn)}" if comma else _simple_rdn(rdn)
+
+
+# Parents are shared by many siblings
+_parent_key = lru_cache(maxsize=1 << 12)(_simple_key)
+
+
+class DnTree(Generic[T]):
+    """
+    Items arranged by the hierarchy of their DNs.
+    Iteration yields parents before children, and siblings by RDN.
+    """
+
+    def __init__(self) -> None:
+        self.entries: dict[str, T] = {}  # By sort key
+
+    def add(self, dn: str, item: T) -> None:
+        self.entries[sort_key(dn)] = item
+
+    def discard(self, dn: str) -> None:
+        self.entries.pop(sort_key(dn), None)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.items())
+
+    def items(self) -> list[T]:
+        "Parents before children"
+        return [self.entries[key] for key in sorted(self.entries)]
+
+    def deepest_first(self) -> Iterator[T]:
+        "Children before their parents, e.g. for deletion"
+        return (self.entries[key] for key in sorted(self.entries, reverse=True))
@@ -0,0 +1,219 @@
+"""
+In-memory index of the directory hierarchy.
+
+Navigation requests for the tree view are answered from memory
+instead of searching the directory for every opened node.
+The index is seeded with one paged scan below the base DN,
+and then kept current with change notifications, see `incremental`.
+
+Only DNs and structural object classes are kept.
+Nodes use slots, and RDNs and object classes are interned,
+so that large trees stay reasonably small in memory.
+
+The index is built with the service identity. It can be served as is
+if all users share that identity, otherwise visibility is checked
+against the directory, see `ldap_api.indexed_items`.
+"""
+
+import logging
+import sys
+from collections.abc import Iterable, Iterator
+
+from ldap3 import Connection
+
+from . import settings
+from .changes import Change, ChangeType
+from .dn import normalize_rdn, parent, parse, rdns
+from .entities import TreeItem
+from .incremental import IncrementalIndex
+from .ldap_helpers import paged_search
+
+logger = logging.getLogger(__name__)
+
+
+def keys(dn: str) -> list[str]:
+    "Normalized RDNs of a DN, leaf first"
+    return [key for _, key in parse(dn)]
+
+
+class Node:
+    "Directory entry in the index"
+
+    __slots__ = ("children", "oc", "parent", "rdn")
+
+    def __init__(self, rdn: str, parent: "Node | None", oc: str | None = None):
+        self.rdn = sys.intern(rdn)
+        self.parent = parent
+        self.oc = oc and sys.intern(oc)  # Unknown for placeholders and new entries
+        self.children: dict[str, Node] | None = None  # Keyed by normalized RDN
+
+    @property
+    def dn(self) -> str:
+        parts, node = [], self
+        while node is not None:
+            parts.append(node.rdn)
+            node = node.parent
+        return ",".join(parts)
+
+    def item(self) -> TreeItem:
+        assert self.oc is not None
+        return TreeItem.model_construct(
+            dn=self.dn,
+            structuralObjectClass=self.oc,
+            hasSubordinates=bool(self.children),
+        )
+
+    def attach(self, child: "Node") -> None:
+        if self.children is None:
+            self.children = {}
+        self.children[sys.intern(normalize_rdn(child.rdn))] = child
+        child.parent = self
+
+    def detach(self) -> None:
+        if self.parent and self.parent.children:
+            self.parent.children.pop(normalize_rdn(self.rdn), None)
+            if not self.parent.children:
+                self.parent.children = None
+        self.parent = None
+
+    def walk(self) -> Iterator["Node"]:
+        "Iterate over the subtree below this node, depth first"
+        stack = list((self.children or {}).values())
+        while stack:
+            node = stack.pop()
+            yield node
+            if node.children:
+                stack.extend(node.children.values())
+
+
+class DnIndex(IncrementalIndex):
+    "Hierarchy of DNs below the base DN"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.root: Node | None = None
+        self.base: list[str] = []
+
+    def clear(self, base_dn: str) -> None:
+        "Start over with an empty tree"
+        self.ready = False
+        self.base = keys(base_dn)
+        self.root = Node(base_dn, None)
+
+    def _path(self, dn: str) -> list[str] | None:
+        "Normalized RDNs below the base DN, top down"
+        try:
+            parts = keys(dn)
+        except ValueError:
+            return None
+        depth = len(parts) - len(self.base)
+        if depth < 0 or parts[depth:] != self.base:
+            return None
+        return parts[:depth][::-1]
+
+    def find(self, dn: str, create: bool = False) -> Node | None:
+        "Look up a DN, optionally creating missing nodes"
+
+        path = self._path(dn)
+        if path is None or self.root is None:
+            return None
+
+        node, rdn_values = self.root, rdns(dn)[: len(path)][::-1]
+        for key, rdn in zip(path, rdn_values):
+            child = node.children and node.children.get(key)
+            if not child:
+                if not create:
+                    return None
+                child = Node(rdn.strip(), node)
+                node.attach(child)
+            node = child
+        return node
+
+    def get(self, dn: str) -> Node | None:
+        "Look up a complete entry, if the index is usable"
+        node = self.find(dn) if self.ready else None
+        return node if node and node.oc else None
+
+    def children(self, dn: str) -> list[Node] | None:
+        "Immediate children of an entry, or None if uncertain"
+        node = self.get(dn)
+        if node is None:
+            return None
+        nodes = list((node.children or {}).values())
+        return nodes if all(n.oc for n in nodes) else None
+
+    def subtree(self, dn: str) -> list[Node] | None:
+        "All entries below a DN, or None if uncertain"
+        node = self.get(dn)
+        if node is None:
+            return None
+        nodes = list(node.walk())
+        return nodes if all(n.oc for n in nodes) else None
+
+    def add(self, dn: str, oc: str | None) -> None:
+        if node := self.find(dn, create=True):
+            node.oc = oc and sys.intern(oc)
+
+    def remove(self, dn: str) -> None:
+        if (node := self.find(dn)) and node is not self.root:
+            node.detach()
+
+    def move(self, dn: str, new_dn: str) -> None:
+        node, target = self.find(dn), self._path(new_dn)
+        if node is None or node is self.root or not target or self.root is None:
+            self.remove(dn)
+            self.add(new_dn, None)
+            return
+
+        node.detach()
+        node.rdn = sys.intern(rdns(new_dn)[0])
+        superior = self.find(parent(new_dn), create=True)
+        assert superior is not None
+        superior.attach(node)
+
+    def update(self, items: Iterable[TreeItem]) -> None:
+        "Complete known entries with fresh search results"
+        for item in items:
+            if (node := self.find(item.dn)) and node.oc is None:
+                node.oc = sys.intern(item.structuralObjectClass)
+
+    def apply(self, change: Change) -> None:
+        "Follow a change in the directory, without fetching entries"
+
+        if self.root is None:
+            return
+        match change.type:
+            case ChangeType.ADD:
+                self.add(change.dn, None)  # Object class is looked up on demand
+            case ChangeType.MODIFY:
+                # Content sync reports entries renamed by other clients
+                # as modified at their new DN. The old DN is unknown.
+                if self.find(change.dn) is None and self._path(change.dn):
+                    self.add(change.dn, None)
+                    self.rescan()
+            case ChangeType.DELETE:
+                self.remove(change.dn)
+            case ChangeType.RENAME:
+                assert change.new_dn
+                self.move(change.dn, change.new_dn)
+            case ChangeType.RESET:
+                self.reset()
+
+    async def scan(self, connection: Connection) -> None:
+        "Rebuild the index with a subtree search below the base DN"
+
+        assert settings.BASE_DN, "An LDAP base DN is required!"
+        self.clear(settings.BASE_DN)
+
+        count = 0
+        async for entry in paged_search(
+            connection, settings.BASE_DN, attributes=["structuralObjectClass"]
+        ):
+            self.add(entry.dn, entry.attributes["structuralObjectClass"])
+            count += 1
+
+        self.ready = True
+        logger.info("Indexed %d entries below %s", count, settings.BASE_DN)
+
+
+index = DnIndex()
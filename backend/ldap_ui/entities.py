@@ -1,10 +1,12 @@
 "Data types for ReST endpoints"
 
 from base64 import b64encode
+from hashlib import sha256
 from typing import Self
+from urllib.parse import quote
 
 from ldap3 import SchemaInfo
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 from .ldap_helpers import ResponseEntry
 
@@ -12,6 +14,30 @@
 
 AttributeNames = list[str]  # Names of modified attributes
 
+ValueCounts = dict[str, int | None]  # Number of values per attribute, if known
+
+
+def content_hash(data: bytes) -> str:
+    "Content address of a binary value"
+    return sha256(data).hexdigest()
+
+
+class Blob(BaseModel):
+    "Reference to a binary attribute value"
+
+    size: int
+    hash: str
+    url: str
+
+    @classmethod
+    def of(cls, dn: str, attr: str, index: int, data: bytes) -> Self:
+        digest = content_hash(data)
+        return cls(
+            size=len(data),
+            hash=digest,
+            url=f"api/blob/{attr}/{index:d}/{quote(dn, safe='=,')}?etag={digest}",
+        )
+
 
 class Entry(BaseModel):
     "Directory entry"
@@ -22,44 +48,88 @@ class Entry(BaseModel):
     autoFilled: AttributeNames
     changed: AttributeNames
     isNew: bool = False
+    truncated: ValueCounts = {}  # Attributes with more values than shown
+    blobs: dict[str, list[Blob]] = {}  # Binary values, if not sent inline
+
+    @staticmethod
+    def format_values(attr: str, vals: list[bytes], binary: bool) -> list[str]:
+        "Decode attribute values for transmission"
+        if attr == "userPassword":
+            return ["*****"]
+        if binary:
+            return [b64encode(val).decode() for val in vals]
+        return [val.decode() for val in vals]
 
     @classmethod
     def _format_attrs(
-        cls, entry: ResponseEntry, binary: set, schema: SchemaInfo
+        cls,
+        entry: ResponseEntry,
+        binary: set,
+        schema: SchemaInfo,
+        truncated: ValueCounts,
+        max_values: int | None,
+        blobs: dict[str, list[Blob]] | None,
     ) -> Attributes:
         result = {}
         for k in sorted(entry.raw_attributes):
             if not entry.is_modifiable(k, schema):
                 continue
             vals = entry.raw_attributes[k]
-            if k == "userPassword":
-                result[k] = ["*****"]
-            elif k in binary:
-                result[k] = [b64encode(val).decode() for val in vals]
+            if k in entry.incomplete:
+                truncated[k] = None  # Server-side value range
+            if max_values is not None and len(vals) > max_values:
+                truncated[k] = None if k in entry.incomplete else len(vals)
+                vals = vals[:max_values]
+            if blobs is not None and k in binary:
+                # Send references, the content is retrieved separately
+                blobs[k] = [Blob.of(entry.dn, k, i, val) for i, val in enumerate(vals)]
+                result[k] = [blob.hash for blob in blobs[k]]
             else:
-                result[k] = [val.decode() for val in vals]
+                result[k] = cls.format_values(k, vals, k in binary)
         return result
 
     @classmethod
-    def of(cls, entry: ResponseEntry, schema: SchemaInfo) -> Self:
-        "Decode an LDAP entry for transmission"
+    def of(
+        cls,
+        entry: ResponseEntry,
+        schema: SchemaInfo,
+        max_values: int | None = None,
+        inline: bool = True,
+    ) -> Self:
+        """
+        Decode an LDAP entry for transmission.
+        Binary values are either sent inline as base64, or as blob references.
+        """
 
         binary = sorted(
-            set(
+            {
                 attr
                 for attr in entry.raw_attributes
                 if entry.is_binary(attr, schema) and entry.is_modifiable(attr, schema)
-            )
+            }
         )
+        truncated: ValueCounts = {}
+        blobs: dict[str, list[Blob]] | None = None if inline else {}
         return cls(
-            attrs=cls._format_attrs(entry, set(binary), schema),
+            attrs=cls._format_attrs(
+                entry, set(binary), schema, truncated, max_values, blobs
+            ),
             dn=entry.dn,
             binary=binary,
             autoFilled=[],
             changed=[],
+            truncated=truncated,
+            blobs=blobs or {},
         )
 
 
+class EntryChanges(BaseModel):
+    "Changes to an entry, as computed by the client"
+
+    add: Attributes = {}  # New values
+    delete: Attributes = {}  # Removed values, or all values if empty
+
+
 class ChangePasswordRequest(BaseModel):
     "Change a password"
 
@@ -74,6 +144,14 @@ class SearchResult(BaseModel):
     name: str
 
 
+class ValuePage(BaseModel):
+    "Consecutive values of a multi-valued attribute"
+
+    values: list[str]
+    offset: int
+    total: int | None  # Unknown until the last page with ranged retrieval
+
+
 class Range(BaseModel):
     "Numeric attribute range"
 
@@ -82,17 +160,32 @@ class Range(BaseModel):
     next: int
 
 
+class CopyProgress(BaseModel):
+    "Outcome of one entry in a subtree copy"
+
+    dn: str
+    copied: int  # Entries copied so far
+    total: int
+    error: str | None = None
+
+
 class TreeItem(BaseModel):
     "Entry in the navigation tree"
 
     dn: str
     structuralObjectClass: str
     hasSubordinates: bool
+    children: list["TreeItem"] | None = None  # Unless prefetched
 
     @classmethod
     def of(cls, entry: ResponseEntry):
-        return cls(
+        return cls.model_construct(  # Trusted input, skip validation
             dn=entry.dn,
             structuralObjectClass=entry.attributes["structuralObjectClass"],
-            hasSubordinates=entry.hasSubordinates,
+            hasSubordinates=bool(entry.hasSubordinates),
         )
+
+
+# Compiled serializers for bulk responses
+TREE_ITEMS = TypeAdapter(list[TreeItem])
+SEARCH_RESULTS = TypeAdapter(list[SearchResult])
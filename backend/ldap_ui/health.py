@@ -0,0 +1,80 @@
+"""
+Liveness and readiness probes.
+
+`/healthz` succeeds as long as the process serves requests.
+`/readyz` succeeds once the directory settings and schema are known
+and the directory accepts connections. The directory check is cached
+for `READY_CHECK_INTERVAL` seconds and shared by concurrent probes,
+so that frequent probing does not load the directory.
+`/statusz` reports the load of the process as JSON: admitted and queued
+requests, waiting times, and the event loop lag.
+"""
+
+import logging
+from http import HTTPStatus
+
+from anyio import Lock, current_time
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from ldap3.core.exceptions import LDAPException
+
+from . import admission, ldap_api, offload, settings
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(include_in_schema=False)
+
+
+class Readiness:
+    "Cached outcome of directory checks"
+
+    def __init__(self) -> None:
+        self.ready = False
+        self.error: str | None = "Not checked yet"
+        self.checked = float("-inf")  # Time of the last check
+        self.lock = Lock()
+
+    async def check(self) -> bool:
+        "Connect to the directory, unless checked recently"
+
+        async with self.lock:
+            if current_time() - self.checked < settings.READY_CHECK_INTERVAL:
+                return self.ready
+            try:
+                await ldap_api.discover()
+                self.ready, self.error = True, None
+            except (LDAPException, ValueError) as e:
+                if self.ready or self.error != str(e):
+                    logger.warning("Directory is not available: %s", e)
+                self.ready, self.error = False, str(e)
+            self.checked = current_time()
+            return self.ready
+
+
+readiness = Readiness()
+
+
+@router.get("/healthz")
+async def healthz() -> PlainTextResponse:
+    return PlainTextResponse("OK")
+
+
+@router.get("/readyz")
+async def readyz() -> PlainTextResponse:
+    if await readiness.check():
+        return PlainTextResponse("OK")
+    return PlainTextResponse(
+        readiness.error or "Not ready",
+        status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(settings.READY_CHECK_INTERVAL)},
+    )
+
+
+@router.get("/statusz")
+async def statusz() -> JSONResponse:
+    return JSONResponse(
+        {
+            "admission": admission.gate.stats(),
+            "loop_lag": {"latest": offload.monitor.lag, "max": offload.monitor.max},
+        }
+    )
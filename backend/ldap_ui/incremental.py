@@ -0,0 +1,137 @@
+"""
+Common life cycle of in-memory indexes.
+
+Indexes are seeded with a scan of the directory with the service
+identity, and then follow change notifications, see `changes`.
+Added or modified entries are queued and fetched in the background.
+A new scan is made when the change feed is reset, when too many
+changes are pending, and every `DN_INDEX_REFRESH` seconds.
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable, Iterator
+
+from anyio import Event, move_on_after
+from ldap3 import Connection
+from ldap3.core.exceptions import LDAPException
+
+from . import settings
+from .changes import Change, ChangeType
+from .dn import normalize, parse, rdns
+
+logger = logging.getLogger(__name__)
+
+# Re-fetch entries in bulk if more changes are pending
+PENDING_MAX = 1000
+
+# Seconds to wait before retrying a failed scan
+RETRY_DELAY = 30
+
+
+class IncrementalIndex(ABC):
+    """
+    Index that is scanned once and then updated entry by entry.
+    Indexes that follow changes without re-reading entries
+    can override `apply` and keep the default hooks.
+    """
+
+    label = "directory"  # What is indexed, for log messages
+
+    def __init__(self) -> None:
+        self.ready = False  # Is the index complete?
+        self.pending: set[str] = set()  # DNs to re-fetch
+        self.invalid = Event()  # Set when a new scan is required
+        self.dirty = Event()  # Set when changes are pending
+
+    @abstractmethod
+    async def scan(self, connection: Connection) -> None:
+        "Rebuild the index"
+
+    @abstractmethod
+    def remove(self, dn: str) -> None:
+        "Drop a deleted entry"
+
+    async def fetch(self, connection: Connection, dn: str) -> None:
+        "Re-read a changed entry"
+
+    def _discard(self, key: str) -> None:
+        "Remove an entry by its normalized DN"
+
+    def _indexed(self) -> Iterator[tuple[str, str]]:
+        "Normalized and original DNs of all entries"
+        return iter(())
+
+    def rescan(self) -> None:
+        "Scan again soon, but keep serving the index until then"
+        self.invalid.set()
+        self.dirty.set()
+
+    def reset(self) -> None:
+        "Stop serving the index until it is scanned again"
+        self.ready = False
+        self.rescan()
+
+    def apply(self, change: Change) -> None:
+        "Follow a change in the directory"
+
+        match change.type:
+            case ChangeType.ADD | ChangeType.MODIFY:
+                self.pending.add(change.dn)
+            case ChangeType.DELETE:
+                self.remove(change.dn)
+            case ChangeType.RENAME:
+                assert change.new_dn
+                self.rename(change.dn, change.new_dn)
+            case ChangeType.RESET:
+                self.reset()
+        if len(self.pending) > PENDING_MAX:
+            self.invalid.set()
+        self.dirty.set()
+
+    def rename(self, dn: str, new_dn: str) -> None:
+        "Move entries at or below a DN, to be fetched with their new DNs"
+
+        target = normalize(dn)
+        depth, suffix = len(parse(dn)), "," + target
+        moved = [
+            (key, old_dn)
+            for key, old_dn in self._indexed()
+            if key == target or key.endswith(suffix)
+        ]
+        for key, old_dn in moved:
+            old_rdns = rdns(old_dn)
+            self._discard(key)
+            self.pending.add(",".join([*old_rdns[: len(old_rdns) - depth], new_dn]))
+
+    async def run(self, connect: Callable[[], Awaitable[Connection]]) -> None:
+        "Keep the index current until cancelled"
+
+        while True:
+            self.invalid = Event()
+            try:
+                connection = await connect()
+                try:
+                    await self.scan(connection)
+                finally:
+                    connection.unbind()
+
+                # Re-fetch changed entries until a rescan is due
+                while not self.invalid.is_set():
+                    with move_on_after(settings.DN_INDEX_REFRESH or float("inf")):
+                        await self.dirty.wait()
+                    if not self.dirty.is_set():
+                        break  # Periodic rescan
+                    self.dirty = Event()
+                    if self.pending and not self.invalid.is_set():
+                        connection = await connect()
+                        try:
+                            while self.pending:
+                                await self.fetch(connection, self.pending.pop())
+                        finally:
+                            connection.unbind()
+
+            except (LDAPException, KeyError, ValueError) as e:
+                logger.warning("Cannot index %s: %s", self.label, e)
+                with move_on_after(RETRY_DELAY):
+                    await self.invalid.wait()
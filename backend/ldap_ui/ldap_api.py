@@ -10,6 +10,8 @@
 import base64
 import io
 import re
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from enum import StrEnum
 from http import HTTPStatus
 from typing import Annotated, AsyncGenerator, cast
@@ -22,11 +24,12 @@
     File,
     Header,
     HTTPException,
+    Query,
     Request,
     Response,
     UploadFile,
 )
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from ldap3 import (
     ALL,
     ALL_ATTRIBUTES,
@@ -36,6 +39,8 @@
     MODIFY_ADD,
     MODIFY_DELETE,
     MODIFY_REPLACE,
+    NO_ATTRIBUTES,
+    SUBTREE,
     Connection,
     SchemaInfo,
     Server,
@@ -45,20 +50,52 @@
     LDAPOperationResult,
     LDAPResponseTimeoutError,
 )
-from ldif import LDIFParser
-
-from . import settings
+from pydantic import TypeAdapter
+
+from . import admission, directory, offload, settings, thumbnails
+from .admission import Ticket
+from .changes import Change, ChangeType, feed
+from .controls import ASSERTION, POST_READ, Control, assertion, post_read
+from .dn import DnTree, avas, normalize, parent, parse, rdns, within
+from .dn_index import Node, index
 from .entities import (
+    SEARCH_RESULTS,
+    TREE_ITEMS,
     AttributeNames,
     Attributes,
     ChangePasswordRequest,
     Entry,
+    EntryChanges,
     Range,
     SearchResult,
     TreeItem,
+    ValuePage,
+    content_hash,
+)
+from .ldap_helpers import (
+    CHANGE_SEQUENCE,
+    ResponseEntry,
+    compared,
+    empty,
+    entry_tag,
+    format_lazily,
+    get_response,
+    get_responses,
+    parse_ldif,
+    post_read_entry,
+    raw_size,
+    supports_control,
+    tag_assertion,
+    unique,
+    version_attributes,
+    version_tag,
 )
-from .ldap_helpers import ResponseEntry, empty, get_responses, unique
+from .matching import Modification, normalizer, value_changes
+from .member_index import group_result, memberships, search_filter
 from .schema import Schema
+from .search_index import typeahead
+from .subordinates import tree_items
+from .subtree import copy_entries
 
 NO_CONTENT = Response(status_code=HTTPStatus.NO_CONTENT)
 
@@ -73,6 +110,9 @@
 # Default search filter
 ANY = "(objectClass=*)"
 
+# Root DSE capabilities
+ACTIVE_DIRECTORY = "1.2.840.113556.1.4.800"  # Supports ranged value retrieval
+
 URL_PATTERN = re.compile(
     r"""^(?P<scheme>ldap|ldapi|ldaps)://
          (?P<host>[/A-Za-z0-9_.-]*)
@@ -105,12 +145,23 @@ def parse_url(url: str) -> tuple[str, str | None]:
     raise ValueError(f"Invalid URL: {url}")
 
 
-async def ldap_connect() -> Connection:
+async def ldap_connect(client_strategy: str = ASYNC) -> Connection:
     "Open an anonymous LDAP connection"
 
     url, base_dn = parse_url(settings.LDAP_URL)
-    server = Server(url, get_info=ALL)
-    connection = Connection(server, client_strategy=ASYNC, raise_exceptions=True)
+    info = directory.info
+    server = (
+        Server.from_definition(url, info.dsa, info.schema)
+        if info.current
+        else Server(url, get_info=ALL)
+    )
+    connection = Connection(
+        server,
+        client_strategy=client_strategy,
+        raise_exceptions=True,
+        auto_range=False,  # Fetching all value ranges blocks, see get_values
+    )
+    format_lazily(connection)  # Most attribute values are only used as bytes
 
     # Negotiate StartTLS before binding. Otherwise the bind and the root DSE
     # lookup below are sent in clear text, and directories that mandate
@@ -120,7 +171,8 @@ async def ldap_connect() -> Connection:
         connection.open(read_server_info=False)
         connection.start_tls()
 
-    connection.bind()
+    connection.bind(read_server_info=not info.current)
+    info.update(connection.server)
     dsa_info = connection.server.info
 
     if not settings.BASE_DN:
@@ -143,32 +195,65 @@ async def ldap_connect() -> Connection:
     return connection
 
 
-async def authenticated(
+async def discover() -> None:
+    "Detect the base and schema DNs from the root DSE, unless configured"
+    connection = await ldap_connect()
+    connection.unbind()
+
+
+async def admitted(
     authorization: Annotated[str | None, Header()] = None,
-) -> AsyncGenerator[Connection, None]:
-    "Authenticate against the directory"
+) -> AsyncGenerator[Ticket, None]:
+    "Wait for a share of the directory, see `admission`"
+
+    ticket = await admission.gate.acquire(admission.user_key(authorization))
+    try:
+        yield ticket
+    finally:
+        ticket.release()
+
+
+Admitted = Annotated[Ticket, Depends(admitted)]
+
+
+@asynccontextmanager
+async def bound(authorization: str | None) -> AsyncIterator[Connection]:
+    "Bind with the request's credentials, and unbind when done"
 
     connection = await ldap_connect()
+    try:
+        # Hard-wired credentials
+        dn = settings.GET_BIND_DN()
+        password = settings.GET_BIND_PASSWORD()
+
+        # Search for basic auth user
+        if not dn and authorization:
+            username, password = get_basic_credentials(authorization)
+            dn = settings.GET_BIND_PATTERN(username) or await anonymous_user_search(
+                connection, username
+            )
 
-    # Hard-wired credentials
-    dn = settings.GET_BIND_DN()
-    password = settings.GET_BIND_PASSWORD()
+        if not dn:  # Log in
+            raise LDAPInvalidCredentialsResult(
+                [{"desc": f"Invalid credentials for DN: {dn}"}]
+            )
 
-    # Search for basic auth user
-    if not dn and authorization:
-        username, password = get_basic_credentials(authorization)
-        dn = settings.GET_BIND_PATTERN(username) or await anonymous_user_search(
-            connection, username
+        connection.rebind(
+            user=dn, password=password, read_server_info=not directory.info.current
         )
+        directory.info.update(connection.server)
+        yield connection
+    finally:  # Also if binding failed or the request was cancelled
+        connection.unbind()
 
-    if not dn:  # Log in
-        raise LDAPInvalidCredentialsResult(
-            [{"desc": f"Invalid credentials for DN: {dn}"}]
-        )
 
-    connection.rebind(user=dn, password=password)
-    yield connection
-    connection.unbind()
+async def authenticated(
+    _ticket: Admitted,
+    authorization: Annotated[str | None, Header()] = None,
+) -> AsyncGenerator[Connection, None]:
+    "Authenticate against the directory"
+    async with bound(authorization) as connection:
+        yield connection
 
 
 def get_basic_credentials(authorization: str) -> list[str]:
@@ -198,6 +283,76 @@ async def anonymous_user_search(connection: Connection, username: str) -> str |
 AuthenticatedConnection = Annotated[Connection, Depends(authenticated)]
 
 
+async def service_connect(client_strategy: str = ASYNC) -> Connection:
+    "Connect for background tasks with the hard-wired credentials"
+
+    connection = await ldap_connect(client_strategy=client_strategy)
+    if dn := settings.GET_BIND_DN():
+        connection.rebind(
+            user=dn,
+            password=settings.GET_BIND_PASSWORD(),
+            read_server_info=not directory.info.current,
+        )
+        directory.info.update(connection.server)
+    return connection
+
+
+def index_trusted() -> bool:
+    "May the DN index be served without checking visibility?"
+    return settings.DN_INDEX_TRUSTED or bool(settings.GET_BIND_DN())
+
+
+async def indexed_items(
+    connection: Connection, dn: str, scope: str, nodes: list[Node] | None
+) -> list[TreeItem] | None:
+    """
+    Convert indexed entries to tree items, if the index knows them.
+    Unless the index is trusted, only entries that the user
+    can see are returned. This is a search without attributes.
+    """
+
+    if nodes is None:
+        return None
+    if not index_trusted():
+        visible = {
+            normalize(entry.dn)
+            async for entry in get_responses(
+                connection,
+                connection.search(
+                    dn, ANY, search_scope=scope, attributes=NO_ATTRIBUTES
+                ),
+            )
+        }
+        nodes = [node for node in nodes if normalize(node.dn) in visible]
+        if len(nodes) < len(visible) - (scope == SUBTREE):
+            return None  # Not indexed yet
+    return [node.item() for node in nodes]
+
+
+async def readable(connection: Connection, dns: list[str]) -> set[str]:
+    "Find the entries that the user can see, with concurrent searches"
+
+    msgids = {
+        dn: connection.search(dn, ANY, search_scope=BASE, attributes=NO_ATTRIBUTES)
+        for dn in dns
+    }
+    result = set()
+    for dn, msgid in msgids.items():
+        try:
+            async for _entry in get_responses(connection, msgid):
+                result.add(dn)
+        except LDAPOperationResult:
+            pass  # Not visible
+    return result
+
+
+def json_list(adapter: TypeAdapter, items: list) -> Response:
+    "Serialize a list of models without validation"
+    return Response(
+        adapter.dump_json(items, exclude_none=True), media_type="application/json"
+    )
+
+
 class Tag(StrEnum):
     EDITING = "Editing"
     MISC = "Misc"
@@ -215,6 +370,9 @@ async def get_base_entry(connection: AuthenticatedConnection) -> list[TreeItem]:
 
     if not settings.BASE_DN:
         raise ValueError("An LDAP base DN is required!")
+    if index_trusted() and (node := index.get(settings.BASE_DN)):
+        return [node.item()]
+
     result = await unique(
         connection,
         connection.search(
@@ -224,11 +382,14 @@ async def get_base_entry(connection: AuthenticatedConnection) -> list[TreeItem]:
             get_operational_attributes=True,
         ),
     )
-    return [TreeItem.of(result)]
+    return await tree_items(connection, [result])
 
 
 async def get_entry_by_dn(
-    connection: Connection, dn: str, with_operational_attributes=False
+    connection: Connection,
+    dn: str,
+    with_operational_attributes=False,
+    extra_attributes: list[str] | None = None,
 ) -> ResponseEntry:
     "Asynchronously retrieve an LDAP entry by its DN"
 
@@ -238,39 +399,261 @@ async def get_entry_by_dn(
             dn,
             search_filter=ANY,
             search_scope=BASE,
-            attributes=ALL_ATTRIBUTES,
+            attributes=[ALL_ATTRIBUTES, *(extra_attributes or [])],
             get_operational_attributes=with_operational_attributes,
         ),
     )
 
 
-@api.get("/tree/{basedn:path}", tags=[Tag.NAVIGATION], operation_id="get_tree")
-async def get_tree(basedn: str, connection: AuthenticatedConnection) -> list[TreeItem]:
-    "List directory entries below a DN"
+@api.get(
+    "/tree/{basedn:path}",
+    tags=[Tag.NAVIGATION],
+    operation_id="get_tree",
+    response_model=list[TreeItem],
+)
+async def get_tree(
+    basedn: str,
+    connection: AuthenticatedConnection,
+    depth: Annotated[int, Query(ge=1, le=settings.TREE_DEPTH_MAX)] = 1,
+    reveal: str | None = None,
+) -> Response:
+    """
+    List directory entries below a DN.
+    With `depth` or `reveal`, further levels are nested as children.
+    """
+
+    items = await indexed_items(connection, basedn, LEVEL, index.children(basedn))
+    if items is None:
+        items = await level_items(connection, basedn)
+    if depth > 1 or reveal:
+        await prefetch(connection, items, depth, reveal)
+    return json_list(TREE_ITEMS, items)
+
+
+async def level_items(connection: Connection, dn: str) -> list[TreeItem]:
+    "Search the immediate children of an entry"
 
-    return [
-        TreeItem.of(entry)
+    entries = [
+        entry
         async for entry in get_responses(
             connection,
             connection.search(
-                basedn,
+                dn,
                 search_filter=ANY,
                 search_scope=LEVEL,
                 get_operational_attributes=True,
+                time_limit=settings.SEARCH_TIME_LIMIT,
             ),
         )
     ]
+    items = await tree_items(connection, entries)
+    index.update(items)
+    return items
+
+
+async def prefetch(
+    connection: Connection, items: list[TreeItem], depth: int, reveal: str | None
+) -> None:
+    """
+    Attach the children of tree items, up to `depth` levels and along
+    the path to `reveal`. Each level is listed with concurrent searches.
+    Levels beyond TREE_PREFETCH_MAX entries are left for the client.
+    """
+
+    budget = settings.TREE_PREFETCH_MAX - len(items)
+    level = 1
+    while items and budget > 0 and level < settings.TREE_DEPTH_MAX:
+        level += 1
+        expandable = [item for item in items if item.hasSubordinates]
+        path = [item for item in expandable if reveal and within(reveal, item.dn)]
+        parents = path + [
+            item for item in expandable if level <= depth and item not in path
+        ]
+
+        trusted = index_trusted()
+        msgids, fetched = {}, {}
+        for item in parents:
+            if trusted and (nodes := index.children(item.dn)) is not None:
+                item.children = [node.item() for node in nodes]
+            else:
+                msgids[item.dn] = connection.search(
+                    item.dn,
+                    search_filter=ANY,
+                    search_scope=LEVEL,
+                    get_operational_attributes=True,
+                    time_limit=settings.SEARCH_TIME_LIMIT,
+                )
+
+        for item in parents:  # The path to `reveal` comes first
+            msgid = msgids.get(item.dn)
+            if budget <= 0:
+                item.children = None
+                if msgid is not None:
+                    connection.abandon(msgid)
+                continue
+            if msgid is not None:
+                try:
+                    fetched[item.dn] = [
+                        entry async for entry in get_responses(connection, msgid)
+                    ]
+                except LDAPOperationResult:
+                    continue  # Gone or invisible, let the client find out
+            budget -= len(fetched.get(item.dn) or item.children or [])
+
+        # Probe the whole level for grandchildren at once, if needed
+        entries = [entry for found in fetched.values() for entry in found]
+        children = iter(await tree_items(connection, entries))
+        for item in parents:
+            if item.dn in fetched:
+                item.children = [next(children) for _entry in fetched[item.dn]]
+                index.update(item.children)
+
+        items = [child for item in parents for child in item.children or []]
 
 
-@api.get("/entry/{dn:path}", tags=[Tag.EDITING], operation_id="get_entry")
-async def get_entry(dn: str, connection: AuthenticatedConnection) -> Entry:
-    "Retrieve a directory entry by DN"
-    return Entry.of(
-        await get_entry_by_dn(connection, dn),
+@api.get(
+    "/entry/{dn:path}",
+    tags=[Tag.EDITING],
+    operation_id="get_entry",
+    response_model=Entry,
+)
+async def get_entry(
+    dn: str,
+    connection: AuthenticatedConnection,
+    response: Response,
+    inline: bool = False,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Entry | Response:
+    "Retrieve a directory entry by DN, with binary values inline or as references"
+
+    versions = version_attributes(connection.server.schema)
+    if if_none_match and CHANGE_SEQUENCE in versions:
+        # Compare versions before reading and decoding the whole entry
+        version = await unique(
+            connection, connection.search(dn, ANY, BASE, attributes=versions)
+        )
+        if tag := version_tag(version):
+            headers = blob_headers(tag, False)
+            if not_modified(if_none_match, headers):
+                return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+
+    entry = await get_entry_by_dn(connection, dn, extra_attributes=versions)
+    headers = blob_headers(entry_tag(entry), False)
+    if not_modified(if_none_match, headers):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return await decode_entry(connection, entry, inline)
+
+
+async def decode_entry(
+    connection: Connection, entry: ResponseEntry, inline: bool
+) -> Entry:
+    "Decode an entry for the editor, in a worker thread if it is large"
+    return await offload.run_sync(
+        Entry.of,
+        entry,
         connection.server.schema,
+        settings.VALUES_MAX,
+        inline,
+        size=entry.size,
     )
 
 
+def supports_value_ranges(connection: Connection) -> bool:
+    "Does the directory support ranged retrieval of attribute values?"
+    capabilities = connection.server.info.other.get("supportedCapabilities", [])
+    return ACTIVE_DIRECTORY in capabilities
+
+
+async def get_value_range(
+    connection: Connection, dn: str, attr: str, start: int, stop: int | None
+) -> tuple[list[bytes], int | None]:
+    """
+    Retrieve the values of an attribute from `start` up to, but excluding, `stop`.
+    Returns the values and the total number of values, if known.
+    """
+
+    if not supports_value_ranges(connection):
+        entry = await unique(
+            connection,
+            connection.search(dn, ANY, search_scope=BASE, attributes=[attr]),
+        )
+        values = entry.raw_attributes.get(attr, [])
+        return values[start:stop], len(values)
+
+    values = []
+    while stop is None or start < stop:
+        upper = "*" if stop is None else stop - 1
+        entry = await unique(
+            connection,
+            connection.search(
+                dn,
+                ANY,
+                search_scope=BASE,
+                attributes=[f"{attr};range={start}-{upper}"],
+            ),
+        )
+        page = entry.raw_attributes.get(attr, [])
+        values += page
+        if attr not in entry.incomplete:  # Got the last range
+            return values, start + len(page)
+        if not page:
+            break
+        start += len(page)  # The server may return less than requested
+    return values, None
+
+
+@api.get("/values/{attr}/{dn:path}", tags=[Tag.EDITING], operation_id="get_values")
+async def get_values(
+    attr: str,
+    dn: str,
+    connection: AuthenticatedConnection,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(gt=0)] = settings.VALUES_MAX,
+    query: str | None = None,
+) -> ValuePage:
+    "Page through the values of a multi-valued attribute, optionally filtered"
+
+    schema = connection.server.schema
+    if query is None:
+        values, total = await get_value_range(
+            connection, dn, attr, offset, offset + limit
+        )
+    else:  # Filter the complete value list, but send only one page
+        needle = query.lower()
+        values = [
+            val
+            for val in (await get_value_range(connection, dn, attr, 0, None))[0]
+            if needle in val.decode(errors="replace").lower()
+        ]
+        values, total = values[offset : offset + limit], len(values)
+
+    entry = ResponseEntry(
+        raw_dn=dn.encode(),
+        dn=dn,
+        attributes={},
+        raw_attributes={attr: values},
+        type="searchResEntry",
+    )
+    return ValuePage(
+        values=Entry.format_values(attr, values, entry.is_binary(attr, schema)),
+        offset=offset,
+        total=total,
+    )
+
+
+@api.post("/compare/{attr}/{dn:path}", tags=[Tag.EDITING], operation_id="post_compare")
+async def compare(
+    attr: str,
+    dn: str,
+    value: Annotated[str, Body()],
+    connection: AuthenticatedConnection,
+) -> bool:
+    "Check whether an attribute has a value, e.g. for group membership"
+    return await compared(connection, connection.compare(dn, attr, value))
+
+
 @api.delete(
     "/entry/{dn:path}",
     status_code=HTTPStatus.NO_CONTENT,
@@ -278,32 +661,113 @@ async def get_entry(dn: str, connection: AuthenticatedConnection) -> Entry:
     operation_id="delete_entry",
 )
 async def delete_entry(dn: str, connection: AuthenticatedConnection) -> None:
-    for entry_dn in sorted(
-        [
-            entry.dn
-            async for entry in get_responses(
-                connection,
-                connection.search(dn, search_filter=ANY),
-            )
-        ],
-        key=len,
-        reverse=True,
-    ):
+    subtree = DnTree[str]()
+    async for entry in get_responses(connection, connection.search(dn, ANY)):
+        subtree.add(entry.dn, entry.dn)
+
+    for entry_dn in subtree.deepest_first():
         await empty(connection, connection.delete(entry_dn))
+        feed.local(Change(ChangeType.DELETE, entry_dn))
 
 
 @api.post("/entry/{dn:path}", tags=[Tag.EDITING], operation_id="post_entry")
 async def post_entry(
-    dn: str, attributes: Attributes, connection: AuthenticatedConnection
+    dn: str,
+    attributes: Attributes,
+    connection: AuthenticatedConnection,
+    if_match: Annotated[str | None, Header()] = None,
 ) -> AttributeNames:
-    entry = await get_entry_by_dn(connection, dn)
-    if modifications := get_modifications(entry, attributes, connection.server.schema):
+    schema = connection.server.schema
+    entry = await get_entry_by_dn(
+        connection, dn, extra_attributes=version_attributes(schema)
+    )
+
+    controls = None
+    if if_match:
+        tag = entry_tag(entry)
+        if not matches(if_match, tag):
+            raise HTTPException(
+                HTTPStatus.PRECONDITION_FAILED, f"Entry {dn} has been modified"
+            )
+        # Let the directory reject updates made since the entry was read
+        if (condition := tag_assertion(tag)) and supports_control(
+            connection, ASSERTION
+        ):
+            controls = [assertion(condition)]
+
+    if modifications := get_modifications(entry, attributes, schema):
         # Apply changes and send changed keys back
-        await empty(connection, connection.modify(dn, modifications))
+        await empty(connection, connection.modify(dn, modifications, controls=controls))
+        feed.local(Change(ChangeType.MODIFY, dn))
     return sorted(modifications)
 
 
-Modification = tuple[str, list[str]]
+def strong_tag(if_match: str) -> str | None:
+    "The entity tag of an `If-Match` precondition with a single strong tag"
+    tag = if_match.strip()
+    if len(tag) > 1 and tag[0] == tag[-1] == '"' and "," not in tag:
+        return tag[1:-1]
+    return None
+
+
+@api.patch(
+    "/entry/{dn:path}",
+    tags=[Tag.EDITING],
+    operation_id="patch_entry",
+    response_model=Entry,
+)
+async def patch_entry(
+    dn: str,
+    changes: EntryChanges,
+    connection: AuthenticatedConnection,
+    response: Response,
+    inline: bool = False,
+    if_match: Annotated[str | None, Header()] = None,
+) -> Entry:
+    """
+    Apply changes computed by the client, and return the updated entry.
+    With the Post-Read control, this takes a single LDAP operation.
+    """
+
+    schema = connection.server.schema
+    versions = version_attributes(schema)
+    modifications: dict[str, list[Modification]] = {}
+    for attr, values in changes.delete.items():
+        if attr not in PASSWORDS:
+            modifications[attr] = [(MODIFY_DELETE, values)]
+    for attr, values in changes.add.items():
+        if attr not in PASSWORDS and (values := list(filter(None, values))):
+            modifications.setdefault(attr, []).append((MODIFY_ADD, values))
+
+    controls: list[Control] = []
+    if if_match and if_match.strip() != "*":
+        tag = strong_tag(if_match)
+        condition = tag and tag_assertion(tag)
+        if condition and supports_control(connection, ASSERTION):
+            controls.append(assertion(condition))
+        else:  # Check the version of the entry, with a small race window
+            current = await get_entry_by_dn(connection, dn, extra_attributes=versions)
+            if not matches(if_match, entry_tag(current)):
+                raise HTTPException(
+                    HTTPStatus.PRECONDITION_FAILED, f"Entry {dn} has been modified"
+                )
+
+    entry: ResponseEntry | None = None
+    if modifications:
+        if supports_control(connection, POST_READ):
+            controls.append(post_read([ALL_ATTRIBUTES, *versions]))
+        _entries, result = await get_response(
+            connection, connection.modify(dn, modifications, controls=controls)
+        )
+        feed.local(Change(ChangeType.MODIFY, dn))
+        entry = post_read_entry(result, schema)
+
+    if entry is None:
+        entry = await get_entry_by_dn(connection, dn, extra_attributes=versions)
+    response.headers.update(blob_headers(entry_tag(entry), False))
+    updated = await decode_entry(connection, entry, inline)
+    updated.changed = sorted(modifications)
+    return updated
 
 
 def get_modifications(
@@ -326,14 +790,13 @@ def get_modifications(
     modifications = {}
     for attr, values in attributes.items():
         if not values:
-            modifications[attr] = (MODIFY_DELETE, [])
+            modifications[attr] = [(MODIFY_DELETE, [])]
         elif attr not in entry.attributes:
-            modifications[attr] = (MODIFY_ADD, values)
-        else:
-            new_values = {s.encode("UTF-8") for s in values}
-            old_values = set(entry.raw_attributes[attr])
-            if new_values != old_values:
-                modifications[attr] = (MODIFY_REPLACE, values)
+            modifications[attr] = [(MODIFY_ADD, values)]
+        elif changes := value_changes(
+            entry.raw_attributes[attr], values, normalizer(schema, attr)
+        ):
+            modifications[attr] = changes
     return modifications
 
 
@@ -348,6 +811,7 @@ async def put_entry(
         if attr not in PHOTOS
     }:
         await empty(connection, connection.add(dn, attributes=attributes))
+        feed.local(Change(ChangeType.ADD, dn))
     return ["dn"]  # Dummy
 
 
@@ -362,43 +826,218 @@ async def rename_entry(
     rdn: Annotated[str, Body()],
     connection: AuthenticatedConnection,
 ) -> None:
-    "Rename an entry"
-    entry = await get_entry_by_dn(connection, dn)
+    "Rename an entry in place, keeping the old RDN value"
+
+    await empty(connection, connection.modify_dn(dn, rdn, delete_old_dn=False))
+    feed.local(Change(ChangeType.RENAME, dn, f"{rdn},{parent(dn)}"))
+
+
+@api.post(
+    "/move/{dn:path}",
+    status_code=HTTPStatus.NO_CONTENT,
+    tags=[Tag.EDITING],
+    operation_id="post_move_entry",
+)
+async def move_entry(
+    dn: str,
+    superior: Annotated[str, Body()],
+    connection: AuthenticatedConnection,
+) -> None:
+    "Move an entry and its subtree below a new parent"
+
+    if within(superior, dn):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, "Cannot move an entry below itself")
+
+    rdn = rdns(dn)[0]
+    await empty(
+        connection,
+        connection.modify_dn(dn, rdn, delete_old_dn=True, new_superior=superior),
+    )
+    feed.local(Change(ChangeType.RENAME, dn, f"{rdn},{superior}"))
+
+
+@api.post("/copy/{dn:path}", tags=[Tag.EDITING], operation_id="post_copy_subtree")
+async def copy_subtree(
+    dn: str,
+    target: Annotated[str, Body()],
+    connection: AuthenticatedConnection,
+    exclude: Annotated[list[str], Query(default_factory=list)],
+) -> StreamingResponse:
+    "Copy an entry and its subtree to a new DN, with progress as JSON lines"
 
-    parent_dn = dn.split(",", 1)[1]
-    new_dn = f"{rdn},{parent_dn}"
-    await empty(connection, connection.add(new_dn, attributes=entry.raw_attributes))
     try:
-        await empty(connection, connection.delete(dn))
-    except LDAPOperationResult:
-        # Cannot delete Entry with subordinates -> Undo
-        await empty(connection, connection.delete(new_dn))
-        raise
+        if not parse(target):
+            raise ValueError("Missing target DN")
+        inside = within(target, dn)
+    except ValueError as e:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, e.args[0])
+    if inside:
+        raise HTTPException(
+            HTTPStatus.BAD_REQUEST, "Cannot copy an entry into its own subtree"
+        )
+
+    async def progress() -> AsyncGenerator[bytes, None]:
+        async for step in copy_entries(connection, dn, target, exclude):
+            yield step.model_dump_json().encode() + b"\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def byte_range(header: str, size: int) -> tuple[int, int] | None:
+    "Parse a single HTTP byte range into start and end offsets (inclusive)"
+
+    match = BYTE_RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None  # Multiple or malformed ranges: Send everything
+
+    first, last = match.groups()
+    if not first:  # Suffix range
+        return max(size - int(last), 0), size - 1
+    start, end = int(first), min(int(last) if last else size - 1, size - 1)
+    if start > end:
+        raise HTTPException(
+            HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size:d}"},
+        )
+    return start, end
+
+
+async def get_blob_value(
+    connection: Connection, attr: str, index: int, dn: str, etag: str | None
+) -> tuple[bytes, str]:
+    "Retrieve a binary value and its content hash, which must match `etag` if given"
+
+    entry = await unique(
+        connection,
+        connection.search(dn, ANY, search_scope=BASE, attributes=[attr]),
+    )
+
+    if attr not in entry.raw_attributes or len(entry.raw_attributes[attr]) <= index:
+        raise HTTPException(
+            HTTPStatus.NOT_FOUND, f"Attribute {attr} not found for DN {dn}"
+        )
+
+    data = entry.raw_attributes[attr][index]
+    digest = content_hash(data)
+    if etag is not None and etag != digest:
+        raise HTTPException(
+            HTTPStatus.NOT_FOUND, f"Value of {attr} has changed for DN {dn}"
+        )
+    return data, digest
+
+
+def blob_headers(tag: str, content_addressed: bool) -> dict[str, str]:
+    "Caching headers for binary content, or for entries with an entity tag"
+    return {
+        "Cache-Control": "private, max-age=31536000, immutable"
+        if content_addressed
+        else "private, no-cache",
+        "ETag": f'"{tag}"',
+    }
+
+
+def not_modified(if_none_match: str | None, headers: dict[str, str]) -> bool:
+    "Does the client have the current version?"
+    return bool(if_none_match) and (
+        if_none_match.strip() == "*"
+        or headers["ETag"] in (tag.strip() for tag in if_none_match.split(","))
+    )
+
+
+def matches(if_match: str, tag: str) -> bool:
+    "Does an `If-Match` precondition hold? Weak tags never match."
+    return if_match.strip() == "*" or f'"{tag}"' in (
+        t.strip() for t in if_match.split(",")
+    )
 
 
 @api.get(
     "/blob/{attr}/{index}/{dn:path}",
     tags=[Tag.EDITING],
     operation_id="get_blob",
-    include_in_schema=False,  # Not used in UI, images are transferred inline
+    include_in_schema=False,  # Used as an image source, no API call
 )
 async def get_blob(
-    attr: str, index: int, dn: str, connection: AuthenticatedConnection
+    attr: str,
+    index: int,
+    dn: str,
+    connection: AuthenticatedConnection,
+    etag: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+    if_range: Annotated[str | None, Header()] = None,
+    requested_range: Annotated[str | None, Header(alias="Range")] = None,
 ) -> Response:
-    "Retrieve a binary attribute"
+    """
+    Retrieve a binary attribute.
+    With an `etag` parameter, the URL is content-addressed and can be cached.
+    """
+
+    data, digest = await get_blob_value(connection, attr, index, dn, etag)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{attr}-{index:d}.bin"',
+        **blob_headers(digest, etag is not None),
+    }
 
-    entry = await get_entry_by_dn(connection, dn)
+    if not_modified(if_none_match, headers):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
 
-    if attr not in entry.raw_attributes or len(entry.raw_attributes[attr]) <= index:
-        raise HTTPException(
-            HTTPStatus.NOT_FOUND, f"Attribute {attr} not found for DN {dn}"
+    # Partial content, unless the client holds a stale version
+    span = (
+        byte_range(requested_range, len(data))
+        if requested_range and (if_range is None or if_range.strip() == headers["ETag"])
+        else None
+    )
+    if span:
+        start, end = span
+        headers["Content-Range"] = f"bytes {start:d}-{end:d}/{len(data):d}"
+        return Response(
+            data[start : end + 1],
+            status_code=HTTPStatus.PARTIAL_CONTENT,
+            media_type="application/octet-stream",
+            headers=headers,
         )
 
-    return Response(
-        entry.raw_attributes[attr][index],
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f'attachment; filename="{attr}-{index:d}.bin"'},
-    )
+    return Response(data, media_type="application/octet-stream", headers=headers)
+
+
+@api.get(
+    "/thumbnail/{attr}/{index}/{dn:path}",
+    tags=[Tag.EDITING],
+    operation_id="get_thumbnail",
+    include_in_schema=False,  # Used as an image source, no API call
+)
+async def get_thumbnail(
+    attr: str,
+    index: int,
+    dn: str,
+    connection: AuthenticatedConnection,
+    size: Annotated[int, Query(gt=0)] = 128,
+    etag: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
+    "Retrieve a downscaled photo that fits into a square of `size` pixels"
+
+    if attr not in PHOTOS:
+        raise HTTPException(HTTPStatus.NOT_FOUND, f"No thumbnails for {attr}")
+
+    size = thumbnails.thumbnail_size(size)
+    data, digest = await get_blob_value(connection, attr, index, dn, etag)
+    headers = blob_headers(f"{digest}-{size:d}", etag is not None)
+
+    if not_modified(if_none_match, headers):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+
+    try:
+        data = await thumbnails.cache.thumbnail(data, size)
+    except OSError:  # Not an image, or an unsupported format
+        raise HTTPException(
+            HTTPStatus.UNSUPPORTED_MEDIA_TYPE, f"Cannot read image in {attr}"
+        )
+    return Response(data, media_type=thumbnails.media_type(data), headers=headers)
 
 
 @api.put(
@@ -420,6 +1059,7 @@ async def put_blob(
         connection,
         connection.modify(dn, {attr: (MODIFY_ADD, [data])}),
     )
+    feed.local(Change(ChangeType.MODIFY, dn))
 
 
 @api.delete(
@@ -439,6 +1079,7 @@ async def delete_blob(
         )
     data = entry.raw_attributes[attr][:index] + entry.raw_attributes[attr][index + 1 :]
     await empty(connection, connection.modify(dn, {attr: (MODIFY_REPLACE, data)}))
+    feed.local(Change(ChangeType.MODIFY, dn))
 
 
 @api.post(
@@ -472,6 +1113,7 @@ async def change_password(
         await empty(
             connection, connection.modify(dn, {"userPassword": (MODIFY_DELETE, [])})
         )
+    feed.local(Change(ChangeType.MODIFY, dn))
 
 
 @api.get(
@@ -488,13 +1130,17 @@ async def export_ldif(dn: str, connection: AuthenticatedConnection) -> Response:
         raise TypeError("Expected async operation")
     while True:
         try:
-            entries, result = connection.get_response(msgid, timeout=0)
-            out.write("# ")
-            out.writelines(connection.response_to_ldif(entries))
+            entries, _result = connection.get_response(msgid, timeout=0)
             break
         except LDAPResponseTimeoutError:
             await sleep(0.01)
 
+    size = sum(raw_size(entry.get("raw_attributes", {})) for entry in entries)
+    out.write("# ")
+    out.writelines(
+        await offload.run_sync(connection.response_to_ldif, entries, size=size)
+    )
+
     file_name = dn.split(",")[0].split("=")[1]
     return PlainTextResponse(
         out.getvalue(),
@@ -524,20 +1170,37 @@ async def export_ldif(dn: str, connection: AuthenticatedConnection) -> Response:
 async def upload_ldif(request: Request, connection: AuthenticatedConnection) -> None:
     "Import LDIF"
 
-    parser = LDIFParser(io.BytesIO(await request.body()))
+    data = await request.body()
     try:
-        for dn, record in parser.parse():
-            await empty(connection, connection.add(dn, attributes=record))
+        records = await offload.run_sync(parse_ldif, data, size=len(data), process=True)
     except ValueError as e:
         raise HTTPException(HTTPStatus.UNPROCESSABLE_ENTITY, e.args[0])
 
+    for dn, record in records:
+        await empty(connection, connection.add(dn, attributes=record))
+        feed.local(Change(ChangeType.ADD, dn))
+
 
-@api.get("/search/{query:path}", tags=[Tag.NAVIGATION], operation_id="search")
-async def search(query: str, connection: AuthenticatedConnection) -> list[SearchResult]:
+@api.get(
+    "/search/{query:path}",
+    tags=[Tag.NAVIGATION],
+    operation_id="search",
+    response_model=list[SearchResult],
+)
+async def search(query: str, connection: AuthenticatedConnection) -> Response:
     "Search the directory"
 
     if len(query) < settings.SEARCH_QUERY_MIN:
-        return []
+        return json_list(SEARCH_RESULTS, [])
+
+    if typeahead.ready and "=" not in query and "*" not in query:
+        if index_trusted():
+            results = typeahead.search(query, settings.SEARCH_MAX)
+        else:  # Some results may be filtered out
+            results = typeahead.search(query, 2 * settings.SEARCH_MAX)
+            visible = await readable(connection, [r.dn for r in results])
+            results = [r for r in results if r.dn in visible][: settings.SEARCH_MAX]
+        return json_list(SEARCH_RESULTS, results)
 
     if "=" in query:  # Search specific attributes
         if "(" not in query:
@@ -553,17 +1216,97 @@ async def search(query: str, connection: AuthenticatedConnection) -> list[Search
     # Collect results
     res = []
     async for entry in get_responses(
-        connection, connection.search(settings.BASE_DN, search_filter=query)
+        connection,
+        connection.search(
+            settings.BASE_DN,
+            search_filter=query,
+            attributes=["cn"],
+            size_limit=settings.SEARCH_MAX,
+            time_limit=settings.SEARCH_TIME_LIMIT,
+        ),
     ):
         res.append(
-            SearchResult(
+            SearchResult.model_construct(
                 dn=entry.dn,
-                name=entry.attr("cn")[0] if "cn" in entry.attributes else entry.dn,
+                name=entry.attributes["cn"][0]
+                if "cn" in entry.attributes
+                else entry.dn,
             )
         )
         if len(res) >= settings.SEARCH_MAX:
             break
-    return res
+    return json_list(SEARCH_RESULTS, res)
+
+
+@api.get(
+    "/memberships/{dn:path}",
+    tags=[Tag.NAVIGATION],
+    operation_id="get_memberships",
+    response_model=list[SearchResult],
+)
+async def get_memberships(dn: str, connection: AuthenticatedConnection) -> Response:
+    "List the groups that an entry is a direct member of"
+
+    try:
+        rdn = rdns(dn)[0]
+    except (IndexError, ValueError):
+        raise HTTPException(HTTPStatus.BAD_REQUEST, f"Invalid DN: {dn}")
+
+    # User names for `memberUid`, from the RDN if possible
+    uids = [value for attr, value in avas(rdn) if attr.lower() == "uid"]
+    if not uids and (memberships.by_uid or not memberships.ready):
+        entry = await unique(
+            connection, connection.search(dn, ANY, BASE, attributes=["uid"])
+        )
+        uids = [value.decode() for value in entry.raw_attributes.get("uid", [])]
+
+    if memberships.ready:
+        results = memberships.memberships(dn, uids)
+        if not index_trusted():
+            visible = await readable(connection, [r.dn for r in results])
+            results = [r for r in results if r.dn in visible]
+        return json_list(SEARCH_RESULTS, results)
+
+    results = [
+        group_result(entry)
+        async for entry in get_responses(
+            connection,
+            connection.search(
+                settings.BASE_DN,
+                search_filter=search_filter(dn, uids),
+                attributes=["cn"],
+                time_limit=settings.SEARCH_TIME_LIMIT,
+            ),
+        )
+    ]
+    results.sort(key=lambda result: result.name.lower())
+    return json_list(SEARCH_RESULTS, results)
+
+
+@api.get(
+    "/events",
+    include_in_schema=False,  # Used as an EventSource, no API call
+)
+async def events(
+    ticket: Admitted,
+    dn: Annotated[list[str], Query(default_factory=list)],
+    authorization: Annotated[str | None, Header()] = None,
+) -> StreamingResponse:
+    "Subscribe to changes of entries and their children as Server-Sent Events"
+
+    # Notifications are not filtered by access rules, they only tell clients
+    # what to reload. Check the credentials, but do not hold an LDAP
+    # connection or an admission while streaming.
+    try:
+        async with bound(authorization):
+            pass
+    finally:
+        ticket.release()
+    return StreamingResponse(
+        feed.events(dn),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @api.get("/whoami", tags=[Tag.MISC], operation_id="get_who_am_i")
@@ -572,30 +1315,47 @@ async def whoami(connection: AuthenticatedConnection) -> str:
     return connection.user
 
 
-@api.get("/subtree/{root_dn:path}", tags=[Tag.MISC], operation_id="get_subtree")
-async def list_subtree(
-    root_dn: str, connection: AuthenticatedConnection
-) -> list[TreeItem]:
+@api.get(
+    "/subtree/{root_dn:path}",
+    tags=[Tag.MISC],
+    operation_id="get_subtree",
+    response_model=list[TreeItem],
+)
+async def list_subtree(root_dn: str, connection: AuthenticatedConnection) -> Response:
     "List the subtree below a DN"
 
-    return sorted(
-        [
-            TreeItem.of(entry)
+    nodes = index.subtree(root_dn)
+    if (items := await indexed_items(connection, root_dn, SUBTREE, nodes)) is None:
+        entries = [
+            entry
             async for entry in get_responses(
                 connection,
                 connection.search(
                     root_dn,
                     search_filter=ANY,
-                    attributes=ALL_ATTRIBUTES,
-                    get_operational_attributes=True,
+                    get_operational_attributes=True,  # No user attributes
                 ),
             )
-            if root_dn != entry.dn
-        ],
-        key=lambda item: tuple(reversed(item.dn.lower().split(","))),
+        ]
+        items = await tree_items(connection, entries, subtree=True)
+        index.update(items)
+
+    size = sum(len(item.dn) for item in items)
+    return Response(
+        await offload.run_sync(subtree_json, items, root_dn, size=size),
+        media_type="application/json",
     )
 
 
+def subtree_json(items: list[TreeItem], root_dn: str) -> bytes:
+    "Serialize the items below a DN, parents first"
+    subtree = DnTree[TreeItem]()
+    for item in items:
+        subtree.add(item.dn, item)
+    subtree.discard(root_dn)
+    return TREE_ITEMS.dump_json(subtree.items(), exclude_none=True)
+
+
 @api.get("/range/{attribute}", tags=[Tag.MISC], operation_id="get_range")
 async def attribute_range(attribute: str, connection: AuthenticatedConnection) -> Range:
     "List all values for a numeric attribute of an objectClass like uidNumber or gidNumber"
@@ -603,20 +1363,19 @@ async def attribute_range(attribute: str, connection: AuthenticatedConnection) -
     schema = connection.server.schema
     obj = schema.attribute_types[attribute]
 
-    values = set(
-        [
-            int(entry.attributes[attribute])
-            async for entry in get_responses(
-                connection,
-                connection.search(
-                    settings.BASE_DN,
-                    search_filter=f"({attribute}=*)",
-                    attributes=(attribute,),
-                ),
-            )
-            if obj and obj.syntax == INTEGER
-        ]
-    )
+    values = {
+        int(entry.attributes[attribute])
+        async for entry in get_responses(
+            connection,
+            connection.search(
+                settings.BASE_DN,
+                search_filter=f"({attribute}=*)",
+                attributes=(attribute,),
+                time_limit=settings.SEARCH_TIME_LIMIT,
+            ),
+        )
+        if obj and obj.syntax == INTEGER
+    }
 
     if not values:
         raise HTTPException(
@@ -642,4 +1401,6 @@ async def ldap_schema(connection: AuthenticatedConnection) -> Schema:
     "Dump the LDAP schema as JSON"
     if not settings.SCHEMA_DN:
         raise ValueError("An LDAP schema DN is required!")
-    return Schema.of(connection.server.schema)
+    schema = connection.server.schema
+    size = sum(len(value) for values in schema.raw.values() for value in values)
+    return await offload.run_sync(Schema.of, schema, size=size)
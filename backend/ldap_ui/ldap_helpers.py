@@ -10,32 +10,193 @@
 operation to complete without results.
 """
 
-from dataclasses import dataclass
+import re
+from collections.abc import Iterator, MutableMapping
+from dataclasses import dataclass, field
+from hashlib import sha256
 from http import HTTPStatus
+from io import BytesIO
 from typing import Any, AsyncGenerator
 
-from anyio import sleep
+from anyio import get_cancelled_exc_class, sleep
+from anyio.lowlevel import checkpoint
 from fastapi import HTTPException
-from ldap3 import Connection, SchemaInfo
+from ldap3 import SUBTREE, Connection, SchemaInfo
 from ldap3.core.exceptions import LDAPResponseTimeoutError
+from ldap3.core.results import RESULT_COMPARE_TRUE
+from ldap3.operation.search import raw_attributes_to_dict_fast
+from ldap3.protocol.formatters.standard import format_attribute_values
+from ldap3.strategy.asynchronous import AsyncStrategy
+from ldap3.utils.conv import escape_filter_chars, to_unicode
+from ldif import LDIFParser
 
+from .controls import POST_READ, PRE_READ, read_entry, read_entry_value
 from .schema import OCTET_STRING, Syntax
 
+# Attribute option for ranged value retrieval, e.g. `member;range=0-1499`
+RANGE_OPTION = ";range="
+
+# Simple paged results control, see RFC 2696
+PAGED_RESULTS = "1.2.840.113556.1.4.319"
+
+# Operational attributes that change with every update
+VERSION_ATTRIBUTES = ("entryCSN", "modifyTimestamp")
+
+# Unique per update, unlike `modifyTimestamp` with its one-second resolution
+CHANGE_SEQUENCE = "entryCSN"
+
+# Values that can be used verbatim in entity tags, see RFC 9110
+TAG_CHARS = re.compile(r"[\x21\x23-\x7e]+")
+
+
+class LazyAttributes(MutableMapping[str, Any]):
+    """
+    Attribute values that are formatted by ldap3 on first access.
+    Most attributes are only ever used as raw bytes.
+    """
+
+    def __init__(
+        self,
+        raw_attributes: dict[str, list[bytes]],
+        schema: SchemaInfo | None,
+        custom_formatter: Any = None,
+    ) -> None:
+        self._raw = raw_attributes
+        self._schema = schema
+        self._formatter = custom_formatter
+        self._names = {name.lower(): name for name in raw_attributes}
+        self._values: dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        name = key.lower()
+        if name not in self._values:
+            original = self._names[name]
+            self._values[name] = format_attribute_values(
+                self._schema, original, self._raw[original] or [], self._formatter
+            )
+        return self._values[name]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._names[key.lower()] = key
+        self._values[key.lower()] = value
+
+    def __delitem__(self, key: str) -> None:
+        del self._names[key.lower()]
+        self._values.pop(key.lower(), None)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and key.lower() in self._names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._names.values()))
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def rename(self, old: str, new: str) -> None:
+        "Move values to another attribute name without formatting them"
+
+        if (original := self._names.pop(old.lower(), None)) is None:
+            return
+        if original in self._raw:  # Unless moved by the caller
+            self._raw[new] = self._raw.pop(original)
+        self._names[new.lower()] = new
+        if old.lower() in self._values:
+            self._values[new.lower()] = self._values.pop(old.lower())
+
+
+class LazyAsyncStrategy(AsyncStrategy):
+    "Asynchronous strategy that does not format search results up front"
+
+    @staticmethod
+    def decode_control_fast(control, from_server=True):
+        # ldap3 would decode the values of read entry controls as text
+        oid = to_unicode(control[0][3], from_server=from_server)
+        if oid not in (PRE_READ, POST_READ):
+            return AsyncStrategy.decode_control_fast(control, from_server)
+
+        value = next(part[3] for part in control[1:] if part[2] == 4)
+        return oid, {
+            "description": "",
+            "criticality": False,
+            "value": read_entry_value(value),
+        }
+
+    def decode_response_fast(self, ldap_message: dict[str, Any]) -> dict[str, Any]:
+        if ldap_message["protocolOp"] != 4:  # Not a searchResEntry
+            return super().decode_response_fast(ldap_message)
+
+        dn, attributes = ldap_message["payload"][0][3], ldap_message["payload"][1][3]
+        raw_attributes = raw_attributes_to_dict_fast(attributes)
+        server = self.connection.server
+        result = {
+            "raw_dn": dn,
+            "dn": to_unicode(dn, from_server=True),
+            "raw_attributes": raw_attributes,
+            "attributes": LazyAttributes(
+                raw_attributes, server.schema, server.custom_formatter
+            ),
+            "type": "searchResEntry",
+        }
+        if ldap_message["controls"]:
+            result["controls"] = dict(
+                self.decode_control_fast(control[3])
+                for control in ldap_message["controls"]
+            )
+        return result
+
+
+def format_lazily(connection: Connection) -> None:
+    "Switch an asynchronous connection to lazily formatted search results"
+
+    if type(connection.strategy) is AsyncStrategy:
+        connection.strategy = LazyAsyncStrategy(connection)
+        for method in (  # Bound by ldap3 when the connection is created
+            "send",
+            "open",
+            "get_response",
+            "post_send_single_response",
+            "post_send_search",
+        ):
+            setattr(connection, method, getattr(connection.strategy, method))
 
 
 @dataclass(frozen=True)
 class ResponseEntry:
     raw_dn: bytes
     dn: str
-    attributes: dict[str, Any]
+    attributes: MutableMapping[str, Any]
     raw_attributes: dict[str, list[bytes]]
     type: str
 
+    # Attributes with more values on the server than were returned
+    incomplete: set[str] = field(default_factory=set)
+
+    def __post_init__(self):
+        # Fold ranged values like `member;range=0-1499` into their attribute
+        for key in [k for k in self.raw_attributes if RANGE_OPTION in k]:
+            attr, _, value_range = key.partition(RANGE_OPTION)
+            self.raw_attributes[attr] = self.raw_attributes.pop(key)
+            if isinstance(self.attributes, LazyAttributes):
+                self.attributes.rename(key, attr)
+            elif key in self.attributes:
+                self.attributes[attr] = self.attributes.pop(key)
+            if not value_range.endswith("-*"):
+                self.incomplete.add(attr)
+
     @property
-    def hasSubordinates(self):
-        return b"TRUE" in self.raw_attributes.get("hasSubordinates", []) or bool(
-            self.raw_attributes.get("numSubordinates", 0)
-        )
+    def size(self) -> int:
+        "Total length of the raw values, in bytes"
+        return raw_size(self.raw_attributes)
+
+    @property
+    def hasSubordinates(self) -> bool | None:
+        "Does the entry have children? None if the directory does not tell"
+        if values := self.raw_attributes.get("hasSubordinates"):
+            return b"TRUE" in values
+        if values := self.raw_attributes.get("numSubordinates"):
+            return any(int(v) for v in values)
+        return None
 
     def is_modifiable(self, attr: str, schema: SchemaInfo):
         "Is an attribute modifiable by users?"
@@ -66,22 +227,140 @@ def is_binary(self, attr: str, schema: SchemaInfo) -> bool:
         return syntax is None or Syntax.of(syntax).not_human_readable
 
 
+def raw_size(raw_attributes: dict[str, list[bytes]]) -> int:
+    "Total length of raw attribute values, in bytes"
+    return sum(len(value) for values in raw_attributes.values() for value in values)
+
+
+def version_attributes(schema: SchemaInfo | None) -> list[str]:
+    "Version attributes that can be requested from the directory"
+    return [
+        attr
+        for attr in VERSION_ATTRIBUTES
+        if schema is None or attr in schema.attribute_types
+    ]
+
+
+def version_tag(entry: ResponseEntry) -> str | None:
+    "Entity tag from the change sequence number of an entry, if present"
+    if values := entry.raw_attributes.get(CHANGE_SEQUENCE):
+        value = values[0].decode(errors="replace")
+        if TAG_CHARS.fullmatch(value):
+            return f"{CHANGE_SEQUENCE}:{value}"
+    return None
+
+
+def entry_tag(entry: ResponseEntry) -> str:
+    """
+    Entity tag for the state of an entry, a content hash as a last resort.
+    The hash includes `modifyTimestamp` if it was requested,
+    but does not rely on it: two updates within a second differ in content.
+    """
+
+    if tag := version_tag(entry):
+        return tag
+
+    digest = sha256()
+    for attr in sorted(entry.raw_attributes, key=str.lower):
+        digest.update(attr.lower().encode() + b"\0")
+        for value in entry.raw_attributes[attr]:
+            digest.update(len(value).to_bytes(4, "big") + value)
+    return f"sha256:{digest.hexdigest()[:32]}"
+
+
+def tag_assertion(tag: str) -> str | None:
+    "Search filter that holds while an entry has the given version"
+    attr, _, value = tag.partition(":")
+    return f"({attr}={escape_filter_chars(value)})" if attr == CHANGE_SEQUENCE else None
+
+
+def post_read_entry(
+    result: dict[str, Any], schema: SchemaInfo | None
+) -> ResponseEntry | None:
+    "Entry as returned with the result of an update, see `controls.post_read`"
+
+    if (entry := read_entry(result, POST_READ)) is None:
+        return None
+    raw_dn, raw_attributes = entry
+    return ResponseEntry(
+        raw_dn=raw_dn,
+        dn=to_unicode(raw_dn, from_server=True),
+        attributes=LazyAttributes(raw_attributes, schema),
+        raw_attributes=raw_attributes,
+        type="searchResEntry",
+    )
+
+
+def supports_control(connection: Connection, oid: str) -> bool:
+    "Does the directory announce a control?"
+    supported = connection.server.info.supported_controls or []
+    return any(control[0] == oid for control in supported)
+
+
+def parse_ldif(data: bytes) -> list[tuple[str, dict[str, list[str]]]]:
+    "Parse LDIF records, may run in a worker process"
+    return list(LDIFParser(BytesIO(data)).parse())
+
+
+async def get_response(
+    connection: Connection, msgid: int
+) -> tuple[list[dict[str, Any]], dict[str, Any]]:
+    "Wait for the complete response to an LDAP operation without blocking"
+
+    assert type(msgid) is int, "Expected async operation"
+    try:
+        while True:
+            try:
+                return connection.get_response(msgid, timeout=0, get_request=False)
+            except LDAPResponseTimeoutError:
+                await sleep(0.01)
+    except get_cancelled_exc_class():
+        connection.abandon(msgid)  # Nobody waits for the outcome any more
+        raise
+
+
 async def get_responses(
     connection: Connection, msgid: int
 ) -> AsyncGenerator[ResponseEntry, None]:
     "Stream LDAP result entries without blocking other tasks"
 
-    assert type(msgid) is int, "Expected async operation"
+    entries, _result = await get_response(connection, msgid)
+    for response in entries:
+        yield ResponseEntry(**response)
+
+
+async def paged_search(
+    connection: Connection,
+    base_dn: str,
+    search_filter: str = "(objectClass=*)",
+    attributes: list[str] | None = None,
+    page_size: int = 1000,
+) -> AsyncGenerator[ResponseEntry, None]:
+    "Stream the entries of a subtree page by page, if the directory supports it"
+
+    paged = supports_control(connection, PAGED_RESULTS)
+    cookie = None
     while True:
-        try:
-            entries, result = connection.get_response(
-                msgid, timeout=0, get_request=False
-            )
-            for response in entries:
+        entries, result = await get_response(
+            connection,
+            connection.search(
+                base_dn,
+                search_filter,
+                search_scope=SUBTREE,
+                attributes=attributes,
+                paged_size=page_size if paged else None,
+                paged_cookie=cookie,
+            ),
+        )
+        for response in entries:
+            if response["type"] == "searchResEntry":
                 yield ResponseEntry(**response)
-            return
-        except LDAPResponseTimeoutError:
-            await sleep(0.01)
+        await checkpoint()  # Let other tasks run between pages
+
+        controls = result.get("controls") or {}
+        cookie = controls.get(PAGED_RESULTS, {}).get("value", {}).get("cookie")
+        if not cookie:
+            break
 
 
 async def unique(
@@ -114,3 +393,13 @@ async def empty(
     async for r in get_responses(connection, msgid):
         connection.abandon(msgid)
         raise HTTPException(HTTPStatus.INTERNAL_SERVER_ERROR, "Unexpected result")
+
+
+async def compared(
+    connection: Connection,
+    msgid: int,
+) -> bool:
+    "Asynchronously collect the outcome of a compare operation"
+
+    _entries, result = await get_response(connection, msgid)
+    return result["result"] == RESULT_COMPARE_TRUE
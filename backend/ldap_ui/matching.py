@@ -0,0 +1,122 @@
+"""
+Value comparisons by equality matching rules, see RFC 4517.
+
+Each value is reduced to a key, so that the value sets of an attribute
+can be compared with hash lookups in linear time, even for groups with
+many thousands of members. The keys approximate the string preparation
+of RFC 4518. Values of attributes with unknown rules are compared exactly.
+"""
+
+from collections.abc import Callable, Sequence
+
+from ldap3 import MODIFY_ADD, MODIFY_DELETE, MODIFY_REPLACE
+from ldap3.protocol.rfc4512 import SchemaInfo
+
+from .dn import normalize
+
+Normalizer = Callable[[str], str]
+
+Modification = tuple[str, Sequence[str | bytes]]
+
+
+def _exact(value: str) -> str:
+    return value
+
+
+def _case_exact(value: str) -> str:
+    return " ".join(value.split())
+
+
+def _case_ignore(value: str) -> str:
+    return " ".join(value.split()).casefold()
+
+
+def _numeric(value: str) -> str:
+    return "".join(value.split())
+
+
+def _telephone(value: str) -> str:
+    return "".join(c for c in value if c not in " -").casefold()
+
+
+def _integer(value: str) -> str:
+    try:
+        return str(int(value))
+    except ValueError:
+        return value
+
+
+def _dn(value: str) -> str:
+    try:
+        return normalize(value)
+    except ValueError:
+        return value
+
+
+# Key functions by lower case rule name
+RULES: dict[str, Normalizer] = {
+    "booleanmatch": str.upper,
+    "caseexactia5match": _case_exact,
+    "caseexactmatch": _case_exact,
+    "caseignoreia5match": _case_ignore,
+    "caseignorelistmatch": _case_ignore,
+    "caseignorematch": _case_ignore,
+    "distinguishednamematch": _dn,
+    "integermatch": _integer,
+    "numericstringmatch": _numeric,
+    "objectidentifiermatch": str.lower,
+    "telephonenumbermatch": _telephone,
+    "uniquemembermatch": _dn,
+}
+
+
+def equality(schema: SchemaInfo | None, attr: str) -> str | None:
+    "Equality matching rule of an attribute type, possibly inherited"
+
+    seen: set[str] = set()
+    while schema and (attr_type := schema.attribute_types.get(attr)):
+        if attr_type.equality:
+            return attr_type.equality[0]
+        seen.add(attr.lower())
+        if not attr_type.superior or attr_type.superior[0].lower() in seen:
+            break
+        attr = attr_type.superior[0]
+    return None
+
+
+def normalizer(schema: SchemaInfo | None, attr: str) -> Normalizer:
+    "Key function that maps equal values of an attribute to the same key"
+    rule = equality(schema, attr)
+    return RULES.get(rule.lower(), _exact) if rule else _exact
+
+
+def value_changes(
+    old_values: list[bytes], values: list[str], key: Normalizer
+) -> list[Modification]:
+    """
+    Modifications from the old to the new values of an attribute.
+    Only added and removed values are sent, unless none are kept.
+    """
+
+    # Old values may hold duplicates by key, for approximated rules
+    old: dict[str, list[bytes]] = {}
+    for value in old_values:
+        old.setdefault(key(value.decode(errors="surrogateescape")), []).append(value)
+    new = {key(v): v for v in values}
+
+    # Values that are spelled differently are replaced, too
+    removed = [
+        v for k, vs in old.items() for v in vs if k not in new or new[k].encode() != v
+    ]
+    added = [v for k, v in new.items() if k not in old or v.encode() not in old[k]]
+    if not removed and not added:
+        return []
+    if len(removed) == len(old_values):
+        return [(MODIFY_REPLACE, list(new.values()))]
+
+    modifications: list[Modification] = []
+    if removed:
+        modifications.append((MODIFY_DELETE, removed))
+    if added:
+        modifications.append((MODIFY_ADD, added))
+    return modifications
@@ -0,0 +1,187 @@
+"""
+Reverse index of group memberships.
+
+Without the memberOf overlay, the groups of an entry can only be found
+by searching all groups for its DN in `member` or `uniqueMember`, or its
+`uid` in `memberUid`. Instead, groups can be kept in memory, keyed by
+their members, so that lookups are dictionary accesses.
+
+The index is seeded with a paged scan of groups and updated from change
+notifications, see `incremental`.
+Until the index is ready, memberships are searched in the directory.
+Visibility rules are the same as for the DN index,
+see `ldap_api.get_memberships`.
+"""
+
+import logging
+import re
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from ldap3 import BASE, Connection
+from ldap3.core.exceptions import LDAPNoSuchObjectResult
+from ldap3.utils.conv import escape_filter_chars
+
+from . import settings
+from .dn import normalize
+from .entities import SearchResult
+from .incremental import IncrementalIndex
+from .ldap_helpers import ResponseEntry, get_responses, paged_search
+
+logger = logging.getLogger(__name__)
+
+# Attributes with member DNs
+DN_ATTRIBUTES = ("member", "uniqueMember")
+
+# Attribute with member user names, see RFC 2307
+UID_ATTRIBUTE = "memberUid"
+
+GROUPS = "(|(member=*)(uniqueMember=*)(memberUid=*))"
+
+# Optional unique identifier of `uniqueMember` values, see RFC 4517
+UNIQUE_ID = re.compile(r"#'[01]*'B$")
+
+
+def member_keys(entry: ResponseEntry) -> frozenset[str]:
+    "Index keys of the members of a group"
+
+    keys = set()
+    for attr, values in entry.raw_attributes.items():
+        if attr.lower() == UID_ATTRIBUTE.lower():
+            keys.update(uid_key(v.decode(errors="replace")) for v in values)
+        elif attr.lower() in (a.lower() for a in DN_ATTRIBUTES):
+            for value in values:
+                try:
+                    dn = UNIQUE_ID.sub("", value.decode(errors="replace"))
+                    keys.add(normalize(dn))
+                except ValueError:
+                    logger.debug("Invalid member of %s: %s", entry.dn, value)
+    return frozenset(keys)
+
+
+def uid_key(uid: str) -> str:
+    "Index key of a user name, distinct from normalized DNs"
+    return "uid:" + uid
+
+
+def search_filter(dn: str, uids: list[str]) -> str:
+    "Find groups of an entry in the directory"
+    value = escape_filter_chars(dn)
+    terms = [f"({attr}={value})" for attr in DN_ATTRIBUTES] + [
+        f"({UID_ATTRIBUTE}={escape_filter_chars(uid)})" for uid in uids
+    ]
+    return f"(|{''.join(terms)})"
+
+
+def group_result(entry: ResponseEntry) -> SearchResult:
+    cn = entry.raw_attributes.get("cn")
+    return SearchResult.model_construct(
+        dn=entry.dn, name=cn[0].decode() if cn else entry.dn
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class Group:
+    "Indexed group"
+
+    dn: str
+    name: str
+    members: frozenset[str]  # Normalized DNs and user names
+
+
+class MembershipIndex(IncrementalIndex):
+    "Groups by member"
+
+    label = "group memberships"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.groups: dict[str, Group] = {}  # By normalized DN
+        self.members: dict[str, set[str]] = {}  # Member key -> group keys
+        self.by_uid = 0  # Groups with `memberUid` values
+
+    def clear(self) -> None:
+        self.ready = False
+        self.groups.clear()
+        self.members.clear()
+        self.by_uid = 0
+        self.pending.clear()
+
+    def add(self, entry: ResponseEntry) -> None:
+        "Add or replace a group"
+
+        self.remove(entry.dn)
+        members = member_keys(entry)
+        if not members:
+            return
+
+        key = normalize(entry.dn)
+        self.groups[key] = Group(entry.dn, group_result(entry).name, members)
+        self.by_uid += any(m.startswith("uid:") for m in members)
+        for member in members:
+            self.members.setdefault(member, set()).add(key)
+
+    def remove(self, dn: str) -> None:
+        self._discard(normalize(dn))
+
+    def _discard(self, key: str) -> None:
+        if group := self.groups.pop(key, None):
+            self.by_uid -= any(m.startswith("uid:") for m in group.members)
+            for member in group.members:
+                if groups := self.members.get(member):
+                    groups.discard(key)
+                    if not groups:
+                        del self.members[member]
+
+    def _indexed(self) -> Iterator[tuple[str, str]]:
+        return ((key, group.dn) for key, group in self.groups.items())
+
+    def memberships(self, dn: str, uids: list[str]) -> list[SearchResult]:
+        "Direct memberships of an entry, by name"
+
+        keys = {normalize(dn), *(uid_key(uid) for uid in uids)}
+        groups = {g for key in keys for g in self.members.get(key, ())}
+        return sorted(
+            (
+                SearchResult.model_construct(
+                    dn=self.groups[g].dn, name=self.groups[g].name
+                )
+                for g in groups
+            ),
+            key=lambda result: result.name.lower(),
+        )
+
+    async def scan(self, connection: Connection) -> None:
+        "Rebuild the index with a subtree search for groups"
+
+        assert settings.BASE_DN, "An LDAP base DN is required!"
+        self.clear()
+        async for entry in paged_search(
+            connection,
+            settings.BASE_DN,
+            search_filter=GROUPS,
+            attributes=["cn", *DN_ATTRIBUTES, UID_ATTRIBUTE],
+        ):
+            self.add(entry)
+        self.ready = True
+        logger.info("Indexed %d groups", len(self.groups))
+
+    async def fetch(self, connection: Connection, dn: str) -> None:
+        "Re-read a changed entry, if it is a group"
+        self.remove(dn)
+        try:
+            async for entry in get_responses(
+                connection,
+                connection.search(
+                    dn,
+                    GROUPS,
+                    BASE,
+                    attributes=["cn", *DN_ATTRIBUTES, UID_ATTRIBUTE],
+                ),
+            ):
+                self.add(entry)
+        except LDAPNoSuchObjectResult:
+            pass
+
+
+memberships = MembershipIndex()
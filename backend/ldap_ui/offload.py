@@ -0,0 +1,72 @@
+"""
+CPU-bound work off the event loop.
+
+Each worker serves all requests from one event loop. Parsing a large
+LDIF upload or formatting a big export on the loop stalls every other
+request until it is done. Work on large inputs is handed to a bounded
+pool of threads, or of processes for pure functions with picklable
+arguments. Small inputs are handled inline, since the hand-off costs
+more than it saves.
+
+`LoopLagMonitor` measures how late the event loop wakes up,
+to check that nothing blocks it.
+"""
+
+import logging
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+from anyio import CapacityLimiter, current_time, sleep, to_process, to_thread
+
+from . import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+threads = CapacityLimiter(max(settings.OFFLOAD_THREADS, 1))
+processes = CapacityLimiter(max(settings.OFFLOAD_PROCESSES, 1))
+
+
+async def run_sync(
+    func: Callable[..., T],
+    *args: Any,
+    size: int,
+    process: bool = False,
+) -> T:
+    """
+    Call a function inline for small inputs, or else in a worker.
+    `size` estimates the input in bytes. Functions that may run
+    in a process must be importable and take picklable arguments.
+    """
+
+    if size < settings.OFFLOAD_THRESHOLD:
+        return func(*args)
+    if process and settings.OFFLOAD_PROCESSES:
+        return await to_process.run_sync(func, *args, limiter=processes)
+    if not settings.OFFLOAD_THREADS:
+        return func(*args)
+    return await to_thread.run_sync(func, *args, limiter=threads)
+
+
+class LoopLagMonitor:
+    "Measure how late the event loop wakes up from sleeping"
+
+    def __init__(self, interval: float = 0.5, threshold: float = 0.1) -> None:
+        self.interval = interval
+        self.threshold = threshold  # Log lags above this, in seconds
+        self.lag = 0.0  # Latest measurement
+        self.max = 0.0
+
+    async def run(self) -> None:
+        "Measure until cancelled"
+        while True:
+            start = current_time()
+            await sleep(self.interval)
+            self.lag = max(current_time() - start - self.interval, 0.0)
+            self.max = max(self.max, self.lag)
+            if self.threshold and self.lag > self.threshold:
+                logger.warning("Event loop was blocked for %.3f s", self.lag)
+
+
+monitor = LoopLagMonitor(threshold=settings.LOOP_LAG_WARNING)
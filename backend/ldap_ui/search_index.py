@@ -0,0 +1,186 @@
+"""
+Local index for typeahead searches.
+
+The default search in the navigation bar matches a query against
+the attributes in `settings.SEARCH_PATTERNS`, either exactly or as a prefix.
+Directories without substring indexes answer such searches slowly,
+so the values of these attributes can be kept in a sorted array instead.
+Prefix lookups are binary searches, and results are ranked
+with exact matches first.
+
+The index is seeded with a paged scan and updated from change
+notifications, see `incremental`.
+Visibility rules are the same as for the DN index, see `ldap_api.search`.
+Queries with explicit attributes or wildcards always go to the directory.
+"""
+
+import logging
+import re
+from bisect import bisect_left, insort
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from ldap3 import BASE, Connection
+from ldap3.core.exceptions import LDAPNoSuchObjectResult
+
+from . import settings
+from .dn import normalize
+from .entities import SearchResult
+from .incremental import IncrementalIndex
+from .ldap_helpers import ResponseEntry, paged_search, unique
+
+logger = logging.getLogger(__name__)
+
+# Simple search patterns like `(cn=%s*)`
+PATTERN = re.compile(r"^\((\w+)=%s(\*?)\)$")
+
+
+@dataclass(frozen=True, slots=True)
+class Indexed:
+    "Searchable values of an entry"
+
+    dn: str
+    name: str
+    terms: tuple[tuple[str, bool], ...]  # Normalized values, exact match only?
+
+
+class SearchIndex(IncrementalIndex):
+    "Sorted attribute values for prefix searches"
+
+    label = "directory for searches"
+
+    def __init__(self, patterns: tuple[str, ...]) -> None:
+        super().__init__()
+
+        # Attribute names, and whether they are matched exactly
+        self.attrs: dict[str, bool] = {}
+        for pattern in patterns:
+            if match := PATTERN.match(pattern):
+                attr, wildcard = match.groups()
+                self.attrs[attr.lower()] = not wildcard
+
+        self.entries: dict[str, Indexed] = {}  # By normalized DN
+        self.terms: list[tuple[str, str, bool]] = []  # Sorted values, DNs, flags
+
+    def clear(self) -> None:
+        self.ready = False
+        self.entries.clear()
+        self.terms.clear()
+        self.pending.clear()
+
+    def add(self, entry: ResponseEntry) -> None:
+        "Add or replace an entry"
+
+        self.remove(entry.dn)
+        if key := self._store(entry):
+            for value, exact_only in self.entries[key].terms:
+                insort(self.terms, (value, key, exact_only))
+
+    def _store(self, entry: ResponseEntry) -> str | None:
+        "Keep the searchable values of an entry, without sorting them in"
+
+        terms = tuple(
+            sorted(
+                {
+                    (value.decode(errors="replace").lower(), self.attrs[attr.lower()])
+                    for attr, values in entry.raw_attributes.items()
+                    if attr.lower() in self.attrs
+                    for value in values
+                }
+            )
+        )
+        if not terms:
+            return None
+
+        cn = entry.raw_attributes.get("cn")
+        key = normalize(entry.dn)
+        self.entries[key] = Indexed(
+            dn=entry.dn, name=cn[0].decode() if cn else entry.dn, terms=terms
+        )
+        return key
+
+    def remove(self, dn: str) -> None:
+        self._discard(normalize(dn))
+
+    def _discard(self, key: str) -> None:
+        if indexed := self.entries.pop(key, None):
+            for value, exact_only in indexed.terms:
+                term = value, key, exact_only
+                pos = bisect_left(self.terms, term)
+                if pos < len(self.terms) and self.terms[pos] == term:
+                    del self.terms[pos]
+
+    def _indexed(self) -> Iterator[tuple[str, str]]:
+        return ((key, indexed.dn) for key, indexed in self.entries.items())
+
+    def search(self, query: str, limit: int) -> list[SearchResult]:
+        "Find entries by value prefix, exact matches first"
+
+        query = query.lower()
+        candidates: dict[str, bool] = {}  # Normalized DN, exact match?
+        pos = bisect_left(self.terms, (query,))
+        while pos < len(self.terms) and len(candidates) < limit * 10:
+            value, key, exact_only = self.terms[pos]
+            if not value.startswith(query):
+                break
+            if value == query or not exact_only:
+                candidates[key] = candidates.get(key, False) or value == query
+            pos += 1
+
+        ranked = sorted(
+            candidates.items(),
+            key=lambda c: (not c[1], self.entries[c[0]].name.lower()),
+        )
+        return [
+            SearchResult.model_construct(
+                dn=self.entries[key].dn, name=self.entries[key].name
+            )
+            for key, _exact in ranked[:limit]
+        ]
+
+    @property
+    def attributes(self) -> list[str]:
+        return sorted({*self.attrs, "cn"})
+
+    async def scan(self, connection: Connection) -> None:
+        "Rebuild the index with a subtree search below the base DN"
+
+        assert settings.BASE_DN, "An LDAP base DN is required!"
+        self.clear()
+
+        # Results use the canonical attribute names, e.g. `givenName` for `gn`
+        if schema := connection.server.schema:
+            for attr, exact_only in list(self.attrs.items()):
+                if attr_type := schema.attribute_types.get(attr):
+                    for name in attr_type.name:
+                        self.attrs.setdefault(name.lower(), exact_only)
+
+        # Sort all values at once, inserting them one by one is quadratic
+        async for entry in paged_search(
+            connection, settings.BASE_DN, attributes=self.attributes
+        ):
+            self._store(entry)
+        self.terms = sorted(
+            (value, key, exact_only)
+            for key, indexed in self.entries.items()
+            for value, exact_only in indexed.terms
+        )
+        self.ready = True
+        logger.info("Indexed %d searchable entries", len(self.entries))
+
+    async def fetch(self, connection: Connection, dn: str) -> None:
+        "Re-read a changed entry"
+        try:
+            self.add(
+                await unique(
+                    connection,
+                    connection.search(
+                        dn, "(objectClass=*)", BASE, attributes=self.attributes
+                    ),
+                )
+            )
+        except LDAPNoSuchObjectResult:
+            self.remove(dn)
+
+
+typeahead = SearchIndex(settings.SEARCH_PATTERNS)
@@ -41,6 +41,139 @@ def _boolean(b) -> bool:
 # DANGEROUS: Disable TLS host name verification.
 INSECURE_TLS = config("INSECURE_TLS", cast=_boolean, default=False)
 
+# Seconds to reuse the root DSE and schema for new connections,
+# 0 to read them on every connection.
+SCHEMA_CACHE_TTL = config("SCHEMA_CACHE_TTL", cast=int, default=300)
+
+# JSON file to share the root DSE and schema between processes and restarts.
+# It is created on startup if missing, and replaced when the live schema
+# changes, as checked every SCHEMA_CACHE_TTL seconds.
+# `ldap-ui --save-schema` creates it with BIND_DN, if the schema
+# cannot be read anonymously.
+SCHEMA_SNAPSHOT = config("SCHEMA_SNAPSHOT", default=None)
+
+# Seconds to cache the outcome of the directory check for `/readyz`.
+READY_CHECK_INTERVAL = config("READY_CHECK_INTERVAL", cast=int, default=10)
+
+
+#
+# Admission control
+#
+
+# Requests that may use the directory at once, per process, 0 for no limit.
+LDAP_CONNECTIONS = config("LDAP_CONNECTIONS", cast=int, default=64)
+
+# Concurrent requests per user, and waiting requests per user.
+# Users are told apart by credentials. Requests without credentials,
+# e.g. with BIND_DN, cannot be attributed to users, and are only
+# limited by LDAP_CONNECTIONS and ADMISSION_QUEUE.
+LDAP_USER_CONNECTIONS = config("LDAP_USER_CONNECTIONS", cast=int, default=16)
+
+# Requests that may wait for admission before new ones are rejected.
+ADMISSION_QUEUE = config("ADMISSION_QUEUE", cast=int, default=256)
+
+# Seconds to wait for admission before giving up with 503.
+ADMISSION_TIMEOUT = config("ADMISSION_TIMEOUT", cast=float, default=10.0)
+
+# Seconds that rejected clients are asked to wait before retrying.
+ADMISSION_RETRY_AFTER = config("ADMISSION_RETRY_AFTER", cast=int, default=5)
+
+
+#
+# Deadlines
+#
+
+# Seconds to process an API request before it is cancelled, 0 for no limit.
+REQUEST_DEADLINE = config("REQUEST_DEADLINE", cast=float, default=60.0)
+
+# The same for LDIF imports and exports, and for subtree listings and copies.
+BULK_REQUEST_DEADLINE = config("BULK_REQUEST_DEADLINE", cast=float, default=900.0)
+
+# Seconds that the directory may spend on an interactive search, 0 for no limit.
+SEARCH_TIME_LIMIT = config("SEARCH_TIME_LIMIT", cast=int, default=30)
+
+
+#
+# Entries
+#
+
+# Multi-valued attributes are cut short after this many values in entries.
+# The remaining values can be paged through with the `/api/values` endpoint.
+VALUES_MAX = config("VALUES_MAX", cast=int, default=500)
+
+# In-memory cache for photo thumbnails, in bytes.
+THUMBNAIL_CACHE_SIZE = config("THUMBNAIL_CACHE_SIZE", cast=int, default=32 << 20)
+
+# Optional directory to keep thumbnails across restarts.
+THUMBNAIL_CACHE_DIR = config("THUMBNAIL_CACHE_DIR", default=None)
+
+
+#
+# Offloading
+#
+
+# Inputs of this many bytes or more are processed in worker threads,
+# e.g. LDIF uploads and exports, large schemas and big binary values.
+OFFLOAD_THRESHOLD = config("OFFLOAD_THRESHOLD", cast=int, default=256 << 10)
+
+# Worker threads for offloaded work, 0 to process everything inline.
+OFFLOAD_THREADS = config("OFFLOAD_THREADS", cast=int, default=4)
+
+# Worker processes for LDIF parsing, 0 to use threads instead.
+# Processes are used even if OFFLOAD_THREADS is 0.
+# Processes avoid contention for the interpreter lock, but cost memory.
+OFFLOAD_PROCESSES = config("OFFLOAD_PROCESSES", cast=int, default=0)
+
+# Log a warning if the event loop is blocked for longer, in seconds.
+# 0 disables the monitor.
+LOOP_LAG_WARNING = config("LOOP_LAG_WARNING", cast=float, default=0.25)
+
+
+#
+# Change notifications
+#
+
+# Follow changes in the directory and push them to browsers.
+# Either "syncrepl" (RFC 4533), "psearch" (persistent search),
+# "auto" to pick what the directory supports, or "off".
+# Changes made through the UI are always reported.
+# The directory is watched with BIND_DN and BIND_PASSWORD, or anonymously.
+CHANGE_FEED = config("CHANGE_FEED", default="off")
+
+
+#
+# Navigation
+#
+
+# Keep the directory hierarchy in memory to answer tree requests
+# without searching the directory. The index follows CHANGE_FEED
+# and changes made through the UI.
+DN_INDEX = config("DN_INDEX", cast=_boolean, default=False)
+
+# Serve the index without checking the visibility of entries per user.
+# Only enable this if all users may see the whole tree.
+# Implied if BIND_DN is set, since all users share it.
+DN_INDEX_TRUSTED = config("DN_INDEX_TRUSTED", cast=_boolean, default=False)
+
+# Seconds between full rescans of the DN and search indexes, 0 to disable.
+# Needed to pick up changes by other clients if CHANGE_FEED is off.
+# With several workers and no CHANGE_FEED, this is also how workers learn
+# about changes made through each other, so it defaults to 60 seconds then.
+DN_INDEX_REFRESH = config(
+    "DN_INDEX_REFRESH", cast=int, default=0 if CHANGE_FEED != "off" else 3600
+)
+
+# Seconds to remember which entries have children, for directories
+# without the `hasSubordinates` and `numSubordinates` attributes.
+SUBORDINATES_CACHE_TTL = config("SUBORDINATES_CACHE_TTL", cast=int, default=30)
+
+# Levels of the tree that a single request may return.
+TREE_DEPTH_MAX = config("TREE_DEPTH_MAX", cast=int, default=8)
+
+# Entries that a single tree request may return when prefetching levels.
+# Deeper levels are left for the client to load.
+TREE_PREFETCH_MAX = config("TREE_PREFETCH_MAX", cast=int, default=1000)
+
 
 #
 # Binding
@@ -113,3 +246,14 @@ def GET_BIND_PASSWORD() -> str | None:
     cast=int,
     default=50,
 )
+
+# Answer default searches from a local index of the SEARCH_PATTERNS attributes.
+# Searches with explicit attributes or wildcards still go to the directory.
+# Visibility is handled like for DN_INDEX.
+SEARCH_INDEX = config("SEARCH_INDEX", cast=_boolean, default=False)
+
+# Keep groups by member in memory to list the groups of an entry,
+# for directories without the memberOf overlay. Groups are entries
+# with `member`, `uniqueMember` or `memberUid` values.
+# Visibility is handled like for DN_INDEX.
+MEMBERSHIP_INDEX = config("MEMBERSHIP_INDEX", cast=_boolean, default=False)
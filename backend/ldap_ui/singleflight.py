@@ -0,0 +1,127 @@
+"""
+Coalescing of identical concurrent requests.
+
+When many browsers open the UI at the same time, they request the same
+schema and tree nodes within moments. Each request would connect, bind
+and search on its own. Instead, the first of a set of identical
+concurrent GET requests is processed, and the others receive a copy
+of its response.
+
+Requests are identical if method, path, query and the headers
+that influence the response match. The `Authorization` header is
+part of the key, so responses are only shared between requests
+with the same bind identity.
+"""
+
+from dataclasses import dataclass, field
+from hashlib import sha256
+
+from anyio import Event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Request headers that change the outcome of a request
+VARY = (b"authorization", b"if-none-match", b"if-range", b"range")
+
+# Streaming responses are not shared
+STREAMING = (b"text/event-stream",)
+
+# Larger responses are not buffered for sharing, in bytes
+BODY_MAX = 1 << 20
+
+
+def copy(message: Message) -> Message:
+    "Copy a message, since outer middleware may change headers and bodies in place"
+    if "headers" in message:
+        return {**message, "headers": list(message["headers"])}
+    return dict(message)
+
+
+@dataclass
+class Flight:
+    "A request in progress, and its response"
+
+    done: Event = field(default_factory=Event)
+    messages: list[Message] = field(default_factory=list)
+    shared: bool = True  # Can the response be replayed?
+    size: int = 0
+
+    def record(self, message: Message) -> None:
+        if not self.shared:
+            return
+        if message["type"] == "http.response.start":
+            headers = dict(message.get("headers", []))
+            if headers.get(b"content-type", b"").startswith(STREAMING):
+                self.shared = False
+        elif message["type"] == "http.response.body":
+            self.size += len(message.get("body", b""))
+            if self.size > BODY_MAX:
+                self.shared = False
+        if self.shared:
+            self.messages.append(copy(message))
+        else:  # Release waiting requests early
+            self.messages.clear()
+            self.done.set()
+
+    @property
+    def complete(self) -> bool:
+        return bool(
+            self.shared
+            and self.messages
+            and self.messages[-1]["type"] == "http.response.body"
+            and not self.messages[-1].get("more_body", False)
+        )
+
+
+class SingleFlightMiddleware:
+    "Share responses between identical concurrent read requests"
+
+    def __init__(self, app: ASGIApp, prefix: str = "/api/") -> None:
+        self.app = app
+        self.prefix = prefix
+        self.flights: dict[bytes, Flight] = {}
+
+    def key(self, scope: Scope) -> bytes | None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("GET", "HEAD")
+            or not scope["path"].startswith(self.prefix)
+        ):
+            return None
+
+        digest = sha256()
+        path = scope.get("raw_path") or scope["path"].encode()
+        for part in (scope["method"].encode(), path, scope["query_string"]):
+            digest.update(part)
+            digest.update(b"\0")
+        headers = dict(scope["headers"])
+        for header in VARY:
+            digest.update(headers.get(header, b""))
+            digest.update(b"\0")
+        return digest.digest()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        key = self.key(scope)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        if flight := self.flights.get(key):  # Wait for the leader
+            await flight.done.wait()
+            if flight.complete:
+                for message in flight.messages:
+                    await send(copy(message))
+                return
+            await self.app(scope, receive, send)  # Nothing to share
+            return
+
+        flight = self.flights[key] = Flight()
+
+        async def recording_send(message: Message) -> None:
+            flight.record(message)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            del self.flights[key]
+            flight.done.set()
@@ -0,0 +1,94 @@
+"""
+Static frontend assets.
+
+The frontend build writes Brotli and gzip variants next to each
+compressible file, see `vite.config.ts`. They are served according
+to the `Accept-Encoding` request header, so that assets need not
+be compressed again on every request.
+
+Asset file names contain a content hash, so they are cached
+by browsers for good. Other files like `index.html` are revalidated.
+"""
+
+import mimetypes
+import os
+import re
+from functools import lru_cache
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# Precompressed variants by preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Content-hashed build output, e.g. `assets/index-BxV3k1_a.js`
+HASHED = re.compile(r"[\\/]assets[\\/][^\\/]+-[\w-]{8}\.\w+$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def accepted_encodings(header: str) -> set[str]:
+    "Content codings acceptable to the client"
+    result = set()
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        if not coding.strip():
+            continue
+        quality = params.strip().removeprefix("q=").strip() if params else "1"
+        try:
+            if float(quality) > 0:
+                result.add(coding.strip().lower())
+        except ValueError:
+            pass
+    return result
+
+
+@lru_cache(maxsize=1024)
+def variant(path: str, suffix: str) -> os.stat_result | None:
+    "Look up a precompressed file, build output does not change at runtime"
+    try:
+        return os.stat(path + suffix)
+    except OSError:
+        return None
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    "Serve precompressed variants of static files if acceptable"
+
+    def file_response(
+        self,
+        full_path: str | os.PathLike[str],
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        path = os.fspath(full_path)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+
+        response = None
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and (stat := variant(path, suffix)):
+                response = FileResponse(
+                    path + suffix,
+                    status_code=status_code,
+                    stat_result=stat,
+                    media_type=mimetypes.guess_type(path)[0] or "text/plain",
+                    headers={"Content-Encoding": encoding},
+                )
+                break
+        if response is None:
+            response = FileResponse(
+                path, status_code=status_code, stat_result=stat_result
+            )
+
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = (
+            IMMUTABLE if HASHED.search(path) else REVALIDATE
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,138 @@
+"""
+Child existence for directories without `hasSubordinates`.
+
+The tree shows entries as expandable if they have children, as reported
+by the `hasSubordinates` or `numSubordinates` operational attributes.
+Some directories provide neither, e.g. Active Directory and some 389-DS
+configurations. There, the entries of a tree level are probed at once
+with concurrent one-level searches for a single entry without attributes.
+
+Answers are cached per user for `SUBORDINATES_CACHE_TTL` seconds,
+and dropped when entries are added, moved or deleted below.
+"""
+
+import logging
+import time
+
+from ldap3 import LEVEL, NO_ATTRIBUTES, Connection
+from ldap3.core.exceptions import LDAPOperationResult
+
+from . import settings
+from .changes import Change, ChangeType
+from .dn import normalize, parent
+from .entities import TreeItem
+from .ldap_helpers import ResponseEntry, get_response
+
+logger = logging.getLogger(__name__)
+
+ANY = "(objectClass=*)"
+
+# Cached answers, before expired ones are purged
+CACHE_MAX = 10_000
+
+
+class SubordinateCache:
+    "Short-lived answers to child probes"
+
+    def __init__(self, ttl: int) -> None:
+        self.ttl = ttl
+        # Normalized DN -> user -> (expiry, has children)
+        self.entries: dict[str, dict[str, tuple[float, bool]]] = {}
+        self.size = 0
+
+    def get(self, user: str, dn: str) -> bool | None:
+        if (answer := self.entries.get(normalize(dn), {}).get(user)) is None:
+            return None
+        expires, found = answer
+        return found if time.monotonic() < expires else None
+
+    def put(self, user: str, dn: str, found: bool) -> None:
+        if not self.ttl:
+            return
+        if self.size >= CACHE_MAX:
+            self.purge()
+        answers = self.entries.setdefault(normalize(dn), {})
+        self.size += user not in answers
+        answers[user] = (time.monotonic() + self.ttl, found)
+
+    def purge(self) -> None:
+        "Drop expired answers, or all if none have expired"
+        now = time.monotonic()
+        for key, answers in list(self.entries.items()):
+            for user, (expires, _found) in list(answers.items()):
+                if expires <= now:
+                    del answers[user]
+            if not answers:
+                del self.entries[key]
+        self.size = sum(len(answers) for answers in self.entries.values())
+        if self.size >= CACHE_MAX:
+            self.clear()
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
+
+    def apply(self, change: Change) -> None:
+        "Forget about the parents of added, moved or deleted entries"
+
+        if change.type == ChangeType.RESET:
+            self.clear()
+            return
+        if change.type == ChangeType.MODIFY:
+            return
+        for dn in filter(None, (change.dn, change.new_dn)):
+            if answers := self.entries.pop(normalize(parent(dn)), None):
+                self.size -= len(answers)
+
+
+cache = SubordinateCache(settings.SUBORDINATES_CACHE_TTL)
+
+
+async def probe(connection: Connection, items: list[TreeItem]) -> None:
+    "Find out which tree items have children, with concurrent searches"
+
+    user = connection.user or ""
+    pending = []
+    for item in items:
+        if (found := cache.get(user, item.dn)) is not None:
+            item.hasSubordinates = found
+        else:
+            msgid = connection.search(
+                item.dn,
+                ANY,
+                search_scope=LEVEL,
+                attributes=NO_ATTRIBUTES,
+                size_limit=1,
+            )
+            pending.append((item, msgid))
+
+    for item, msgid in pending:
+        try:
+            entries, _result = await get_response(connection, msgid)
+        except LDAPOperationResult as e:  # Gone, or not visible
+            logger.debug("Cannot probe %s: %s", item.dn, e)
+            item.hasSubordinates = False
+            continue
+        item.hasSubordinates = bool(entries)  # A size limit result is fine
+        cache.put(user, item.dn, item.hasSubordinates)
+
+
+async def tree_items(
+    connection: Connection, entries: list[ResponseEntry], subtree: bool = False
+) -> list[TreeItem]:
+    """
+    Convert search results to tree items, and probe for children where
+    the directory does not tell. Complete subtrees need no probes.
+    """
+
+    items = [TreeItem.of(entry) for entry in entries]
+    unknown = [
+        item for item, entry in zip(items, entries) if entry.hasSubordinates is None
+    ]
+    if unknown and subtree:
+        parents = {normalize(parent(item.dn)) for item in items}
+        for item in unknown:
+            item.hasSubordinates = normalize(item.dn) in parents
+    elif unknown:
+        await probe(connection, unknown)
+    return items
@@ -0,0 +1,109 @@
+"""
+Server-side copies of subtrees.
+
+The source subtree is read with a paged search and arranged by DN,
+so that parents are added before their children. Adds are pipelined:
+up to `COPY_WINDOW` requests are in flight on the connection,
+and an entry is only sent once its parent has been created.
+
+Only user attributes are copied, operational attributes such as
+`entryUUID` or `createTimestamp` are set by the directory.
+Attributes with unique values (e.g. `uid` or `mail`) can be excluded,
+unless they are part of an RDN.
+"""
+
+from collections import deque
+from collections.abc import AsyncGenerator, Iterable
+
+from ldap3 import ALL_ATTRIBUTES, Connection
+from ldap3.core.exceptions import LDAPOperationResult
+
+from .changes import Change, ChangeType, feed
+from .dn import DnTree, avas, normalize, parent, parse, rdns
+from .entities import CopyProgress
+from .ldap_helpers import ResponseEntry, empty, paged_search
+
+# Add requests in flight
+COPY_WINDOW = 16
+
+RawAttributes = dict[str, list[bytes]]
+
+
+def copy_attributes(
+    entry: ResponseEntry, new_rdn: str, exclude: set[str]
+) -> RawAttributes:
+    "User attributes for a copy of an entry with a new RDN"
+
+    old_rdn = rdns(entry.dn)[0]
+    keep = {attr.lower() for attr, _ in avas(new_rdn)}
+    attributes = {
+        attr: list(values)
+        for attr, values in entry.raw_attributes.items()
+        if attr.lower() not in exclude or attr.lower() in keep
+    }
+    if normalize(old_rdn) == normalize(new_rdn):
+        return attributes
+
+    # Replace the naming values
+    names = {attr.lower(): attr for attr in attributes}
+    for attr, value in avas(old_rdn):
+        if key := names.get(attr.lower()):
+            attributes[key] = [
+                v
+                for v in attributes[key]
+                if v.decode(errors="replace").lower() != value.lower()
+            ]
+    for attr, value in avas(new_rdn):
+        values = attributes.setdefault(names.get(attr.lower(), attr), [])
+        if value.encode() not in values:
+            values.append(value.encode())
+    return {attr: values for attr, values in attributes.items() if values}
+
+
+async def copy_entries(
+    connection: Connection,
+    dn: str,
+    target: str,
+    exclude: Iterable[str] = (),
+    window: int = COPY_WINDOW,
+) -> AsyncGenerator[CopyProgress, None]:
+    "Copy an entry and its subordinates to a new DN, reporting each entry"
+
+    skipped = {attr.lower() for attr in exclude}
+    subtree = DnTree[ResponseEntry]()
+    async for entry in paged_search(connection, dn, attributes=ALL_ATTRIBUTES):
+        subtree.add(entry.dn, entry)
+
+    depth = len(parse(dn))
+    total, copied, failed = len(subtree), 0, False
+    pending: deque[tuple[str, int]] = deque()  # New DNs and message IDs
+    in_flight: set[str] = set()  # Normalized new DNs
+
+    async def complete() -> CopyProgress:
+        nonlocal copied, failed
+        new_dn, msgid = pending.popleft()
+        in_flight.discard(normalize(new_dn))
+        try:
+            await empty(connection, msgid)
+        except LDAPOperationResult as e:
+            failed = True
+            return CopyProgress(dn=new_dn, copied=copied, total=total, error=str(e))
+        copied += 1
+        feed.local(Change(ChangeType.ADD, new_dn))
+        return CopyProgress(dn=new_dn, copied=copied, total=total)
+
+    for entry in subtree.items():
+        relative = rdns(entry.dn)[:-depth]
+        new_dn = ",".join([*relative, target])
+        superior = normalize(parent(new_dn)) if relative else None
+        while pending and (len(pending) >= window or superior in in_flight):
+            yield await complete()
+        if failed:
+            break
+
+        attributes = copy_attributes(entry, rdns(new_dn)[0], skipped)
+        pending.append((new_dn, connection.add(new_dn, attributes=attributes)))
+        in_flight.add(normalize(new_dn))
+
+    while pending:
+        yield await complete()
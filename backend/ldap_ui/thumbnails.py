@@ -0,0 +1,147 @@
+"""
+Downscaled previews of photo attributes.
+
+Photos are decoded and resized in a worker thread, since this is
+too expensive for the event loop. Results are kept in a bounded LRU cache
+in memory, and optionally on disk. Both are keyed by the content hash
+of the original image, so that stale entries are never served.
+
+Resizing requires Pillow. Without it, or if an image is too large
+or malformed to be decoded, the original image is returned.
+"""
+
+import io
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+from anyio import to_thread
+
+from . import settings
+from .entities import content_hash
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover
+    Image = None
+
+# Supported edge lengths. Requested sizes are rounded up to limit cache churn.
+SIZES = (32, 64, 128, 256, 512)
+
+JPEG_QUALITY = 85
+
+# Leading bytes of common image formats
+MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def thumbnail_size(size: int) -> int:
+    "Round up to the nearest supported thumbnail size"
+    return next((s for s in SIZES if s >= size), SIZES[-1])
+
+
+def media_type(data: bytes) -> str:
+    "Tell the type of an image by its leading bytes"
+    return next(
+        (media_type for magic, media_type in MAGIC if data.startswith(magic)),
+        "application/octet-stream",
+    )
+
+
+def resize(data: bytes, size: int) -> bytes:
+    "Scale an image down to fit into a square of the given size, as JPEG"
+
+    assert Image is not None, "Pillow is not installed"
+    with Image.open(io.BytesIO(data)) as image:
+        if image.format == "JPEG" and max(image.size) <= size:
+            return data  # Small enough already
+
+        image.draft("RGB", (size, size))  # Let the JPEG decoder downscale
+        preview = ImageOps.exif_transpose(image).convert("RGB")
+        preview.thumbnail((size, size))
+
+        out = io.BytesIO()
+        preview.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        return out.getvalue()
+
+
+class ThumbnailCache:
+    "LRU cache for thumbnails with a byte budget and an optional disk store"
+
+    def __init__(self, max_size: int, directory: str | None = None) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self.directory = Path(directory) if directory else None
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+
+    def get(self, key: str) -> bytes | None:
+        if (data := self._items.get(key)) is not None:
+            self._items.move_to_end(key)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_size:
+            return
+        if (old := self._items.pop(key, None)) is not None:
+            self.size -= len(old)
+        self._items[key] = data
+        self.size += len(data)
+        while self.size > self.max_size:
+            _key, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+    def _path(self, key: str) -> Path:
+        assert self.directory is not None
+        return self.directory / key[:2] / f"{key}.jpg"
+
+    def load(self, key: str) -> bytes | None:
+        "Read a thumbnail from disk (blocking)"
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def store(self, key: str, data: bytes) -> None:
+        "Atomically write a thumbnail to disk (blocking)"
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            tmp.replace(path)
+        except OSError as e:
+            logger.warning("Cannot store thumbnail %s: %s", path, e)
+
+    async def thumbnail(self, data: bytes, size: int) -> bytes:
+        "Look up or create a thumbnail"
+
+        if Image is None:
+            return data
+
+        key = f"{content_hash(data)}-{size:d}"
+        if (cached := self.get(key)) is not None:
+            return cached
+
+        if self.directory and (stored := await to_thread.run_sync(self.load, key)):
+            self.put(key, stored)
+            return stored
+
+        try:
+            result = await to_thread.run_sync(resize, data, size)
+        except (Image.DecompressionBombError, ValueError) as e:
+            logger.info("Cannot scale image, sending it as is: %s", e)
+            return data
+        self.put(key, result)
+        if self.directory:
+            await to_thread.run_sync(self.store, key, result)
+        return result
+
+
+cache = ThumbnailCache(settings.THUMBNAIL_CACHE_SIZE, settings.THUMBNAIL_CACHE_DIR)
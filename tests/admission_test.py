@@ -0,0 +1,101 @@
+import unittest
+from http import HTTPStatus
+
+from anyio import create_task_group, sleep
+from fastapi import HTTPException
+from ldap_ui.admission import SHARED, Admission, user_key
+
+
+class AdmissionTest(unittest.IsolatedAsyncioTestCase):
+    async def test_limit(self):
+        gate = Admission(limit=2, per_user=0, queue_max=10, timeout=5)
+        first = await gate.acquire("fred")
+        await gate.acquire("wilma")
+        self.assertEqual(2, gate.active)
+
+        admitted = []
+
+        async def wait(user: str) -> None:
+            await gate.acquire(user)
+            admitted.append(user)
+
+        async with create_task_group() as tg:
+            tg.start_soon(wait, "barney")
+            await sleep(0.01)
+            self.assertEqual(1, gate.queued)
+            self.assertEqual([], admitted)
+
+            first.release()
+            first.release()  # Only once
+        self.assertEqual(["barney"], admitted)
+        self.assertEqual(2, gate.active)
+        self.assertEqual(0, gate.queued)
+
+    async def test_round_robin(self):
+        gate = Admission(limit=1, per_user=0, queue_max=10, timeout=5)
+        ticket = await gate.acquire("script")
+        order = []
+
+        async def work(user: str) -> None:
+            admitted = await gate.acquire(user)
+            order.append(user)
+            await sleep(0.01)
+            admitted.release()
+
+        async with create_task_group() as tg:
+            for user in ("script", "script", "script", "fred"):
+                tg.start_soon(work, user)
+                await sleep(0.001)
+            ticket.release()
+        self.assertEqual(["script", "fred", "script", "script"], order)
+
+    async def test_per_user(self):
+        gate = Admission(limit=10, per_user=1, queue_max=10, timeout=5)
+        await gate.acquire("script")
+        await gate.acquire("fred")  # Others are not affected
+
+        async with create_task_group() as tg:
+            tg.start_soon(gate.acquire, "script")
+            await sleep(0.01)
+
+            # The user's share of the queue is full
+            with self.assertRaises(HTTPException) as cm:
+                await gate.acquire("script")
+            self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, cm.exception.status_code)
+            tg.cancel_scope.cancel()
+        self.assertEqual(0, gate.queued)
+
+    async def test_shared(self):
+        "Requests without credentials are not limited per user"
+        self.assertEqual(SHARED, user_key(None))
+        self.assertEqual("Basic ZnJlZA==", user_key("Basic ZnJlZA=="))
+
+        gate = Admission(limit=10, per_user=1, queue_max=10, timeout=5)
+        for _ in range(3):
+            await gate.acquire(SHARED)
+        self.assertEqual(3, gate.active)
+
+    async def test_shedding(self):
+        gate = Admission(limit=1, per_user=0, queue_max=1, timeout=0.01)
+        await gate.acquire("fred")
+
+        with self.assertRaises(HTTPException) as cm:
+            await gate.acquire("wilma")  # Waits in vain
+        self.assertIn("Retry-After", cm.exception.headers or {})
+        self.assertEqual(0, gate.queued)
+
+        async with create_task_group() as tg:
+            tg.start_soon(gate.acquire, "wilma")
+            await sleep(0.001)
+            with self.assertRaises(HTTPException):
+                await gate.acquire("barney")  # Queue is full
+            tg.cancel_scope.cancel()
+
+        stats = gate.stats()
+        self.assertEqual(2, stats["shed"])
+        self.assertEqual(1, stats["active"])
+        self.assertGreater(stats["wait_max"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
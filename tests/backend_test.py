@@ -7,6 +7,7 @@
 from fastapi.testclient import TestClient
 from ldap_ui import settings
 from ldap_ui.app import app
+from ldap_ui.dn import within
 from ldap_ui.entities import Attributes
 from ldap_ui.schema import Schema
 from ldif import LDIFParser
@@ -107,6 +108,16 @@ def test_get_tree_flintstones(self):
             self.assertHTTPStatus(result)
             self.assertGreaterEqual(len(result.json()), 4)
 
+    def test_get_tree_reveal(self):
+        with self.client:
+            result = self.client.get(
+                "/api/tree/o=Flintstones", auth=AUTH, params={"reveal": FRED_DN}
+            )
+            self.assertHTTPStatus(result)
+            people = [e for e in result.json() if within(FRED_DN, e["dn"])]
+            self.assertEqual(1, len(people))
+            self.assertIn(FRED_DN, [e["dn"] for e in people[0]["children"]])
+
     def test_search_fred(self):
         with self.client:
             result = self.client.get("/api/search/fred", auth=AUTH)
@@ -130,6 +141,15 @@ def test_get_subtree(self):
             self.assertHTTPStatus(result)
             self.assertEqual(2, len(result.json()))
 
+    def test_get_memberships(self):
+        with self.client:
+            result = self.client.get(f"/api/memberships/{FRED_DN}", auth=AUTH)
+            self.assertHTTPStatus(result)
+            self.assertIsInstance(result.json(), list)
+
+            result = self.client.get("/api/memberships/invalid", auth=AUTH)
+            self.assertHTTPStatus(result, HTTPStatus.BAD_REQUEST)
+
     def test_get_range(self):
         with self.client:
             result = self.client.get("/api/range/uidNumber", auth=AUTH)
@@ -201,6 +221,54 @@ def test_030_modify_entry(self):
             self.assertEqual(result.json(), ["sn"])
             self.assertEntryEqual(TEST_DN, attrs)
 
+    def test_035_conditional_requests(self):
+        with self.client:
+            result = self.client.get(f"/api/entry/{TEST_DN}", auth=AUTH)
+            self.assertHTTPStatus(result)
+            etag = result.headers["ETag"]
+
+            result = self.client.get(
+                f"/api/entry/{TEST_DN}", auth=AUTH, headers={"If-None-Match": etag}
+            )
+            self.assertHTTPStatus(result, HTTPStatus.NOT_MODIFIED)
+
+            result = self.client.post(
+                f"/api/entry/{TEST_DN}",
+                auth=AUTH,
+                headers={"If-Match": '"sha256:stale"'},
+                json={"description": ["lost update"]},
+            )
+            self.assertHTTPStatus(result, HTTPStatus.PRECONDITION_FAILED)
+
+            result = self.client.post(
+                f"/api/entry/{TEST_DN}",
+                auth=AUTH,
+                headers={"If-Match": etag},
+                json={"sn": ["baz"]},
+            )
+            self.assertHTTPStatus(result)
+            self.assertEqual([], result.json())
+
+    def test_037_patch_entry(self):
+        with self.client:
+            result = self.client.patch(
+                f"/api/entry/{TEST_DN}",
+                auth=AUTH,
+                json={"add": {"description": ["patched"]}},
+            )
+            self.assertHTTPStatus(result)
+            self.assertEqual(["description"], result.json()["changed"])
+            self.assertEqual(["patched"], result.json()["attrs"]["description"])
+
+            result = self.client.patch(
+                f"/api/entry/{TEST_DN}",
+                auth=AUTH,
+                headers={"If-Match": result.headers["ETag"]},
+                json={"delete": {"description": []}},
+            )
+            self.assertHTTPStatus(result)
+            self.assertNotIn("description", result.json()["attrs"])
+
     def test_040_put_image_to_entry(self):
         with self.client:
             result = self.client.put(
@@ -223,6 +291,30 @@ def test_050_get_uploaded_image(self):
                 result.headers["Content-Disposition"],
             )
 
+    def test_055_get_cached_image(self):
+        with self.client:
+            result = self.client.get(f"/api/entry/{TEST_DN}", auth=AUTH)
+            self.assertHTTPStatus(result)
+            (blob,) = result.json()["blobs"]["jpegPhoto"]
+            self.assertEqual(len(JPEG), blob["size"])
+
+            result = self.client.get(blob["url"], auth=AUTH)
+            self.assertHTTPStatus(result)
+            self.assertEqual(JPEG, result.content)
+            self.assertIn("immutable", result.headers["Cache-Control"])
+
+            etag = result.headers["ETag"]
+            result = self.client.get(
+                blob["url"], auth=AUTH, headers={"If-None-Match": etag}
+            )
+            self.assertHTTPStatus(result, HTTPStatus.NOT_MODIFIED)
+
+            result = self.client.get(
+                blob["url"], auth=AUTH, headers={"Range": "bytes=0-1"}
+            )
+            self.assertHTTPStatus(result, HTTPStatus.PARTIAL_CONTENT)
+            self.assertEqual(JPEG[:2], result.content)
+
     def test_060_delete_image_from_entry(self):
         with self.client:
             result = self.client.delete(
@@ -263,6 +355,24 @@ def test_100_rename_entry(self):
             )
             self.assertHTTPStatus(result, HTTPStatus.NO_CONTENT)
 
+    def test_105_move_entry_below_itself(self):
+        with self.client:
+            result = self.client.post(
+                f"/api/move/sn=baz,{BASE_DN}",
+                auth=AUTH,
+                json=f"ou=sub,sn=baz,{BASE_DN}",
+            )
+            self.assertHTTPStatus(result, HTTPStatus.BAD_REQUEST)
+
+    def test_106_copy_to_invalid_dn(self):
+        with self.client:
+            result = self.client.post(
+                f"/api/copy/sn=baz,{BASE_DN}",
+                auth=AUTH,
+                json="sn=baz\\",
+            )
+            self.assertHTTPStatus(result, HTTPStatus.BAD_REQUEST)
+
     def test_110_delete_entry(self):
         with self.client:
             result = self.client.delete(
@@ -0,0 +1,156 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+from anyio import create_task_group, sleep, to_thread
+from ldap_ui import changes, controls, settings
+from ldap_ui.changes import Change, ChangeFeed, ChangeType, DirectoryWatcher
+from pyasn1.codec.ber import decoder, encoder
+
+PEOPLE_DN = "ou=People,o=Flintstones"
+FRED_DN = f"cn=Fred Flintstone,{PEOPLE_DN}"
+
+
+def entry(dn: str, state: str, cookie: bytes | None = None) -> dict:
+    value = controls._SyncStateValue()
+    value["state"] = state
+    value["entryUUID"] = uuid4().bytes
+    if cookie is not None:
+        value["cookie"] = cookie
+    return {
+        "type": "searchResEntry",
+        "dn": dn,
+        "controls": {controls.SYNC_STATE: {"value": encoder.encode(value)}},
+    }
+
+
+def refresh_done(cookie: bytes) -> dict:
+    value = controls._SyncInfoValue()
+    value["refreshPresent"]["cookie"] = cookie
+    return {
+        "type": "intermediateResponse",
+        "responseName": controls.SYNC_INFO,
+        "responseValue": encoder.encode(value),
+    }
+
+
+class SyncControlTest(unittest.TestCase):
+    def test_sync_request(self):
+        oid, critical, encoded = controls.sync_request(b"rid=001,csn=1")
+        self.assertEqual(controls.SYNC_REQUEST, oid)
+        self.assertTrue(critical)
+
+        value, rest = decoder.decode(encoded, asn1Spec=controls._SyncRequestValue())
+        self.assertFalse(rest)
+        self.assertEqual("refreshAndPersist", value["mode"].prettyPrint())
+        self.assertEqual(b"rid=001,csn=1", bytes(value["cookie"]))
+
+    def test_sync_state(self):
+        state = controls.sync_state(entry(FRED_DN, "modify", b"csn=2"))
+        self.assertEqual("modify", state.state)
+        self.assertEqual(b"csn=2", state.cookie)
+        self.assertIsNone(controls.sync_state({"type": "searchResEntry"}))
+
+    def test_sync_info(self):
+        info = controls.sync_info(refresh_done(b"csn=3"))
+        self.assertEqual(b"csn=3", info.cookie)
+        self.assertTrue(info.refresh_done)
+
+
+class WatcherTest(unittest.TestCase):
+    def test_syncrepl(self):
+        watcher = DirectoryWatcher(ChangeFeed())
+        watcher.refreshing = True
+
+        # Initial content is skipped
+        self.assertIsNone(watcher.decode(entry(FRED_DN, "add"), "syncrepl"))
+        self.assertIsNone(watcher.decode(refresh_done(b"csn=1"), "syncrepl"))
+        self.assertFalse(watcher.refreshing)
+        self.assertEqual(b"csn=1", watcher.cookie)
+
+        change = watcher.decode(entry(FRED_DN, "delete", b"csn=2"), "syncrepl")
+        self.assertEqual(Change(ChangeType.DELETE, FRED_DN), change)
+        self.assertEqual(b"csn=2", watcher.cookie)
+
+    def test_psearch(self):
+        watcher = DirectoryWatcher(ChangeFeed())
+        change = watcher.decode(
+            {
+                "type": "searchResEntry",
+                "dn": FRED_DN,
+                "changeType": "modify dn",
+                "previousDN": f"cn=Fred,{PEOPLE_DN}",
+            },
+            "psearch",
+        )
+        self.assertEqual(ChangeType.RENAME, change.type)
+        self.assertEqual(FRED_DN, change.new_dn)
+
+
+class ReconnectTest(unittest.IsolatedAsyncioTestCase):
+    async def test_search_done(self):
+        "The watcher reconnects when the directory ends the search"
+
+        feed = ChangeFeed()
+        seen = []
+        feed.listeners.append(seen.append)
+        watcher = DirectoryWatcher(feed)
+        watcher.cookie = b"csn=1"
+
+        connection = MagicMock(name="Connection")
+        connection.closed = False
+        connection.server.info.supported_controls = [(controls.SYNC_REQUEST,)]
+        connect = AsyncMock(return_value=connection)
+
+        with (
+            patch.object(settings, "CHANGE_FEED", "syncrepl"),
+            patch.object(changes, "RETRY_DELAYS", (0,)),
+        ):
+            async with create_task_group() as tg:
+                tg.start_soon(watcher.run, connect)
+                await sleep(0.01)
+                self.assertTrue(feed.watching)
+                self.assertEqual(1, connect.await_count)
+
+                # Delivered in the receiver thread of ldap3
+                done = {
+                    "type": "searchResDone",
+                    "result": changes.SYNC_REFRESH_REQUIRED,
+                    "description": "e-syncRefreshRequired",
+                }
+                await to_thread.run_sync(connection.strategy.callback, done)
+                await sleep(0.01)
+                tg.cancel_scope.cancel()
+
+        self.assertEqual(2, connect.await_count)
+        self.assertEqual([Change(ChangeType.RESET)], seen)
+        self.assertIsNone(watcher.cookie)  # Full refresh
+
+
+class ChangeFeedTest(unittest.IsolatedAsyncioTestCase):
+    async def test_scoped_events(self):
+        feed = ChangeFeed()
+        events = feed.events(["OU=people, o=flintstones"])
+        self.assertTrue((await anext(events)).startswith("retry:"))
+
+        feed.publish(Change(ChangeType.MODIFY, "cn=Dino,ou=Pets,o=Flintstones"))
+        feed.publish(Change(ChangeType.ADD, FRED_DN))
+        event = await anext(events)
+        self.assertIn('"type": "add"', event)
+        self.assertIn(FRED_DN, event)
+
+        await events.aclose()
+        self.assertFalse(feed.subscriptions)
+
+    async def test_local_changes(self):
+        feed = ChangeFeed()
+        seen = []
+        feed.listeners.append(seen.append)
+        feed.local(Change(ChangeType.ADD, FRED_DN))
+        feed.watching = True
+        feed.local(Change(ChangeType.DELETE, FRED_DN))
+        self.assertEqual([Change(ChangeType.ADD, FRED_DN)], seen)
+
+
+if __name__ == "__main__":
+    unittest.main()
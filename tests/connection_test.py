@@ -1,6 +1,7 @@
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
+from ldap3.core.exceptions import LDAPInvalidCredentialsResult
 from ldap_ui import ldap_api, settings
 
 
@@ -19,8 +20,8 @@ async def _operation_order(self, ldap_url: str) -> list[str]:
         order: list[str] = []
         connection = MagicMock(name="Connection")
         for op in ("open", "start_tls", "bind"):
-            getattr(connection, op).side_effect = (
-                lambda *args, _op=op, **kwargs: order.append(_op)
+            getattr(connection, op).side_effect = lambda *args, _op=op, **kwargs: (
+                order.append(_op)
             )
 
         # Pin BASE_DN/SCHEMA_DN so the root DSE auto-detection is skipped and
@@ -55,5 +56,20 @@ async def test_ldaps_skips_starttls(self):
         self.assertIn("bind", order)
 
 
+class BindingTest(unittest.IsolatedAsyncioTestCase):
+    async def test_unbind_on_failure(self):
+        "Connections are closed if binding fails"
+
+        connection = MagicMock(name="Connection")
+        with (
+            patch.object(ldap_api, "ldap_connect", AsyncMock(return_value=connection)),
+            patch.object(settings, "GET_BIND_DN", lambda: None),
+            self.assertRaises(LDAPInvalidCredentialsResult),
+        ):
+            async with ldap_api.bound(None):
+                pass
+        connection.unbind.assert_called_once()
+
+
 if __name__ == "__main__":
     unittest.main()
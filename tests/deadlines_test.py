@@ -0,0 +1,84 @@
+import unittest
+from http import HTTPStatus
+from unittest.mock import MagicMock, patch
+
+from anyio import create_task_group, sleep
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from ldap3.core.exceptions import LDAPResponseTimeoutError
+from ldap_ui import settings
+from ldap_ui.deadlines import DeadlineMiddleware, deadline
+from ldap_ui.ldap_helpers import get_response
+
+app = FastAPI()
+app.add_middleware(DeadlineMiddleware)
+
+
+@app.get("/api/slow")
+async def slow() -> str:
+    await sleep(1)
+    return "done"
+
+
+@app.get("/api/fast")
+async def fast() -> str:
+    return "done"
+
+
+class DeadlineTest(unittest.IsolatedAsyncioTestCase):
+    def test_deadline(self):
+        self.assertIsNone(deadline("/api/events"))
+        self.assertEqual(
+            settings.REQUEST_DEADLINE, deadline("/api/entry/o=Flintstones")
+        )
+        self.assertEqual(settings.BULK_REQUEST_DEADLINE, deadline("/api/ldif/o=x"))
+        with patch.object(settings, "REQUEST_DEADLINE", 0):
+            self.assertIsNone(deadline("/api/entry/o=Flintstones"))
+
+    def test_timeout(self):
+        client = TestClient(app)
+        with patch.object(settings, "REQUEST_DEADLINE", 0.05):
+            result = client.get("/api/slow")
+            self.assertEqual(HTTPStatus.GATEWAY_TIMEOUT, result.status_code)
+            self.assertEqual(HTTPStatus.OK, client.get("/api/fast").status_code)
+
+    async def test_disconnect(self):
+        "Requests are cancelled when the client goes away"
+
+        finished = False
+
+        async def endpoint(scope, receive, send):
+            nonlocal finished
+            await sleep(1)
+            finished = True
+
+        async def receive():
+            await sleep(0.01)
+            return {"type": "http.disconnect"}
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        middleware = DeadlineMiddleware(endpoint)
+        scope = {"type": "http", "path": "/api/entry/o=Flintstones"}
+        await middleware(scope, receive, send)
+        self.assertFalse(finished)
+        self.assertEqual([], sent)
+
+    async def test_abandon(self):
+        "Pending LDAP operations are abandoned on cancellation"
+
+        connection = MagicMock(name="Connection")
+        connection.get_response.side_effect = LDAPResponseTimeoutError("pending")
+
+        async with create_task_group() as tg:
+            tg.start_soon(get_response, connection, 42)
+            await sleep(0.05)
+            tg.cancel_scope.cancel()
+        connection.abandon.assert_called_once_with(42)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from ldap3.protocol.rfc4512 import DsaInfo, SchemaInfo
+from ldap_ui import directory, settings
+from ldap_ui.directory import ServerInfo
+
+CN = b"( 2.5.4.3 NAME ( 'cn' 'commonName' ) SUP name )"
+
+
+def schema_info(timestamp: bytes) -> SchemaInfo:
+    raw = {"attributeTypes": [CN], "modifyTimestamp": [timestamp]}
+    attributes = {k: [v.decode() for v in values] for k, values in raw.items()}
+    return SchemaInfo("cn=Subschema", attributes, raw)
+
+
+def server(timestamp: bytes = b"20240101000000Z") -> MagicMock:
+    result = MagicMock()
+    result.info = DsaInfo(
+        {"namingContexts": ["o=Flintstones"]}, {"namingContexts": [b"o=Flintstones"]}
+    )
+    result.schema = schema_info(timestamp)
+    return result
+
+
+class ServerInfoTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "schema.json")
+
+    def test_update(self):
+        info = ServerInfo()
+        self.assertFalse(info.current)
+
+        info.update(MagicMock())  # Not read from a directory
+        self.assertFalse(info.current)
+
+        live = server()
+        info.update(live)
+        self.assertTrue(info.current)
+        self.assertIs(live.schema, info.schema)
+
+        with patch.object(settings, "SCHEMA_CACHE_TTL", 0):
+            self.assertFalse(info.current)
+
+    def test_snapshot(self):
+        info = ServerInfo()
+        self.assertFalse(info.load(self.path))
+        info.update(server())
+        info.save(self.path)
+
+        loaded = ServerInfo()
+        self.assertTrue(loaded.load(self.path))
+        self.assertEqual(["o=Flintstones"], loaded.dsa.naming_contexts)
+        self.assertIn("commonName", loaded.schema.attribute_types)
+        with patch.object(settings, "SCHEMA_CACHE_TTL", 0):
+            self.assertTrue(loaded.current)  # Snapshots do not expire
+
+    async def test_refresh(self):
+        info = ServerInfo()
+        info.update(server())
+        connect = AsyncMock(return_value=MagicMock())
+        await info.refresh(self.path, connect)  # Create the snapshot
+        self.assertTrue(os.path.exists(self.path))
+        connect.assert_not_awaited()
+
+        # The live schema is modified
+        connection = connect.return_value
+        connection.server = server(b"20250101000000Z")
+        with patch.object(ServerInfo, "changed", AsyncMock(return_value=True)):
+            await info.refresh(self.path, connect)
+        connection.refresh_server_info.assert_called_once()
+        self.assertIs(connection.server.schema, info.schema)
+
+        # Another process loads the new snapshot
+        other = ServerInfo()
+        other.update(server())
+        other.snapshot = 0
+        await other.refresh(self.path, connect)
+        self.assertEqual(["20250101000000Z"], other.schema.raw["modifyTimestamp"])
+
+    def test_timestamp(self):
+        self.assertEqual(
+            "20240101000000Z", directory._timestamp(schema_info(b"20240101000000Z"))
+        )
+        self.assertIsNone(directory._timestamp(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
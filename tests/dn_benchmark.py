@@ -0,0 +1,55 @@
+"""
+Compare ways to order a subtree, parents before children.
+
+Sorts the DNs of a large subtree in random order, once with tuples of
+lower case RDNs as sort keys, and once with `DnTree`, as used by
+`/api/subtree`, subtree copies and deletions.
+
+Run with: python tests/dn_benchmark.py [entries]
+"""
+
+import random
+import sys
+import time
+from collections.abc import Callable
+
+from ldap_ui.dn import DnTree
+
+
+def subtree(count: int) -> list[str]:
+    dns = ["dc=example,dc=com"]
+    dns += [f"ou=Unit{u},dc=example,dc=com" for u in range(30)]
+    dns += [f"uid=user{i},ou=Unit{i % 30},dc=example,dc=com" for i in range(count)]
+    dns += [f"cn=Group\\, {i},ou=Unit0,dc=example,dc=com" for i in range(count // 100)]
+    random.seed(42)
+    random.shuffle(dns)
+    return dns
+
+
+def tuples(dns: list[str]) -> list[str]:
+    "Tuples of RDNs as sort keys"
+    return sorted(dns, key=lambda dn: tuple(reversed(dn.lower().split(","))))
+
+
+def tree(dns: list[str]) -> list[str]:
+    "Joined RDNs as sort keys, parsing only DNs with special characters"
+    ordered = DnTree[str]()
+    for dn in dns:
+        ordered.add(dn, dn)
+    return ordered.items()
+
+
+def measure(name: str, func: Callable, dns: list[str]) -> None:
+    rounds = 5
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(dns)
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{name:10} {elapsed * 1000:8.1f} ms {len(dns) / elapsed:12,.0f} DNs/s")
+
+
+if __name__ == "__main__":
+    dns = subtree(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000)
+    assert tree(dns)[0] == "dc=example,dc=com"
+    measure("tuples", tuples, dns)
+    measure("tree", tree, dns)
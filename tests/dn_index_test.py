@@ -0,0 +1,84 @@
+import unittest
+
+from anyio import Event
+from ldap_ui.changes import Change, ChangeType
+from ldap_ui.dn_index import DnIndex
+from ldap_ui.entities import TreeItem
+
+BASE_DN = "o=Flintstones"
+PEOPLE_DN = f"ou=People,{BASE_DN}"
+FRED_DN = f"cn=Fred Flintstone,{PEOPLE_DN}"
+
+
+class DnIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = DnIndex()
+        self.index.clear(BASE_DN)
+        self.index.add(BASE_DN, "organization")
+        self.index.add(FRED_DN, "inetOrgPerson")
+        self.index.add(PEOPLE_DN, "organizationalUnit")
+        self.index.ready = True
+
+    def test_lookup(self):
+        node = self.index.get("CN=fred flintstone, ou=people,o=flintstones")
+        self.assertEqual(FRED_DN, node.dn)
+        self.assertIsNone(self.index.get("cn=Wilma Flintstone," + PEOPLE_DN))
+        self.assertIsNone(self.index.get("o=Rubbles"))
+
+        (people,) = self.index.children(BASE_DN)
+        item = people.item()
+        self.assertEqual(PEOPLE_DN, item.dn)
+        self.assertEqual("organizationalUnit", item.structuralObjectClass)
+        self.assertTrue(item.hasSubordinates)
+        self.assertEqual(
+            {PEOPLE_DN, FRED_DN}, {n.dn for n in self.index.subtree(BASE_DN)}
+        )
+
+    def test_changes(self):
+        wilma_dn = f"cn=Wilma Flintstone,{PEOPLE_DN}"
+        self.index.apply(Change(ChangeType.ADD, wilma_dn))
+        self.assertIsNone(self.index.children(PEOPLE_DN))  # Class unknown
+
+        self.index.update(
+            [
+                TreeItem(
+                    dn=wilma_dn,
+                    structuralObjectClass="inetOrgPerson",
+                    hasSubordinates=False,
+                )
+            ]
+        )
+        self.assertEqual(2, len(self.index.children(PEOPLE_DN)))
+
+        self.index.apply(Change(ChangeType.RENAME, PEOPLE_DN, f"ou=Folks,{BASE_DN}"))
+        self.assertIsNone(self.index.get(FRED_DN))
+        self.assertEqual(
+            f"cn=Fred Flintstone,ou=Folks,{BASE_DN}",
+            self.index.get(f"cn=fred flintstone,ou=folks,{BASE_DN}").dn,
+        )
+
+        self.index.apply(Change(ChangeType.DELETE, f"ou=Folks,{BASE_DN}"))
+        self.assertEqual([], self.index.children(BASE_DN))
+
+        self.index.apply(Change(ChangeType.MODIFY, BASE_DN))
+        self.assertFalse(self.index.invalid.is_set())
+
+        self.index.apply(Change(ChangeType.RESET))
+        self.assertFalse(self.index.ready)
+        self.assertTrue(self.index.invalid.is_set())
+
+    def test_renamed_elsewhere(self):
+        "Modified entries with unknown DNs were renamed"
+        barney_dn = f"cn=Barney Rubble,{PEOPLE_DN}"
+        self.index.apply(Change(ChangeType.MODIFY, barney_dn))
+        self.assertIsNotNone(self.index.find(barney_dn))
+        self.assertTrue(self.index.ready)  # Still served
+        self.assertTrue(self.index.invalid.is_set())  # Until rescanned
+
+        self.index.invalid = Event()
+        self.index.apply(Change(ChangeType.MODIFY, "cn=Dino,o=Rubbles"))
+        self.assertFalse(self.index.invalid.is_set())  # Outside the base DN
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+from ldap_ui.dn import (
+    DnTree,
+    avas,
+    escape,
+    normalize,
+    normalize_rdn,
+    parent,
+    rdns,
+    sort_key,
+    within,
+)
+
+FRED_DN = "cn=Fred Flintstone,ou=People,o=Flintstones"
+
+
+class DnTest(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(
+            "cn=fred flintstone,ou=people,o=flintstones", normalize(FRED_DN)
+        )
+        self.assertEqual(
+            normalize(FRED_DN),
+            normalize("CN = fred  flintstone , OU=people;o=flintstones"),
+        )
+        self.assertEqual("cn=a\\,b,o=x", normalize('cn="a,b",o=x'))
+        self.assertEqual("cn=ä,o=x", normalize("cn=\\C3\\A4,o=x"))
+        self.assertEqual("cn=\\#1,o=x", normalize("cn=\\231,o=x"))
+        self.assertEqual("uid=#04024869", normalize("UID=#04024869"))
+        self.assertEqual(normalize("sn=b+cn=a,o=x"), normalize("cn=a+sn=b,o=x"))
+        self.assertEqual("", normalize(""))
+        self.assertEqual("cn=a", normalize_rdn("CN=A"))
+
+        for invalid in ("cn", "cn=a,", "=a", "cn=a\\"):
+            with self.assertRaises(ValueError):
+                normalize(invalid)
+
+    def test_split(self):
+        self.assertEqual(["cn=a\\,b", "o=x"], rdns("cn=a\\,b,o=x"))
+        self.assertEqual("o=x", parent("cn=a\\,b,o=x"))
+        self.assertEqual("ou=People,o=Flintstones", parent(FRED_DN))
+        self.assertEqual("", parent("o=x"))
+        self.assertEqual("\\ a\\=b\\ ", escape(" a=b "))
+        self.assertEqual([("cn", "a,b"), ("sn", "c")], avas("cn=a\\,b + sn= c"))
+        self.assertTrue(within(FRED_DN, "O=flintstones"))
+        self.assertTrue(within(FRED_DN, FRED_DN))
+        self.assertFalse(within(FRED_DN, "o=stones"))
+
+    def test_tree(self):
+        dns = [
+            "cn=b\\,x,ou=People,o=Flintstones",
+            "o=Flintstones",
+            FRED_DN,
+            "ou=Groups,o=Flintstones",
+            "ou=People,o=Flintstones",
+            "cn=a,ou=Groups,o=Flintstones",
+        ]
+        tree = DnTree[str]()
+        for dn in dns:
+            tree.add(dn, dn)
+        self.assertEqual(6, len(tree))
+        self.assertEqual(
+            [
+                "o=Flintstones",
+                "ou=Groups,o=Flintstones",
+                "cn=a,ou=Groups,o=Flintstones",
+                "ou=People,o=Flintstones",
+                "cn=b\\,x,ou=People,o=Flintstones",
+                FRED_DN,
+            ],
+            tree.items(),
+        )
+        self.assertEqual("o=Flintstones", list(tree.deepest_first())[-1])
+
+        tree.discard("O=flintstones")
+        self.assertEqual(5, len(tree))
+
+        # Insignificant spaces are ignored, like in normalized DNs
+        tree.add("cn = A ,  ou=groups, o=Flintstones", "again")
+        self.assertEqual(5, len(tree))
+        self.assertEqual(sort_key("cn=a\\,x,o=x"), sort_key("cn = A\\,X , o = x"))
+        self.assertEqual("ou=Groups,o=Flintstones", tree.items()[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+from pathlib import Path
+
+from factories import response_entry
+from ldap3 import SchemaInfo
+from ldap_ui.entities import Entry, content_hash
+
+SCHEMA_INFO = Path(__file__).parent / "resources" / "schema.json"
+
+GROUP_DN = "cn=Stone Age,ou=Groups,o=Flintstones"
+
+
+class EntryTest(unittest.TestCase):
+    schema = SchemaInfo.from_json(SCHEMA_INFO.read_text())
+
+    def test_truncated_values(self):
+        members = [f"cn=member{i},o=Flintstones".encode() for i in range(10)]
+        entry = Entry.of(
+            response_entry(GROUP_DN, {"cn": [b"Stone Age"], "member": members}),
+            self.schema,
+            max_values=3,
+        )
+        self.assertEqual(3, len(entry.attrs["member"]))
+        self.assertEqual({"member": 10}, entry.truncated)
+
+    def test_value_range(self):
+        raw = response_entry(
+            GROUP_DN, {"cn": [b"Stone Age"], "member;range=0-1": [b"cn=a", b"cn=b"]}
+        )
+        self.assertIn("member", raw.raw_attributes)
+        self.assertEqual({"member"}, raw.incomplete)
+
+        entry = Entry.of(raw, self.schema)
+        self.assertEqual(["cn=a", "cn=b"], entry.attrs["member"])
+        self.assertEqual({"member": None}, entry.truncated)
+
+    def test_last_value_range(self):
+        raw = response_entry(GROUP_DN, {"member;range=2-*": [b"cn=c"]})
+        self.assertEqual([b"cn=c"], raw.raw_attributes["member"])
+        self.assertFalse(raw.incomplete)
+
+    def test_blob_references(self):
+        photo = b"\xff\xd8\xff\xe0 not quite a JPEG"
+        raw = response_entry(GROUP_DN, {"cn": [b"Stone Age"], "jpegPhoto": [photo]})
+
+        entry = Entry.of(raw, self.schema, inline=False)
+        self.assertEqual(["jpegPhoto"], entry.binary)
+        (blob,) = entry.blobs["jpegPhoto"]
+        self.assertEqual(len(photo), blob.size)
+        self.assertEqual(content_hash(photo), blob.hash)
+        self.assertTrue(blob.url.startswith("api/blob/jpegPhoto/0/cn=Stone%20Age,"))
+        self.assertTrue(blob.url.endswith(f"?etag={blob.hash}"))
+
+        inline = Entry.of(raw, self.schema)
+        self.assertFalse(inline.blobs)
+        self.assertNotEqual(entry.attrs["jpegPhoto"], inline.attrs["jpegPhoto"])
+
+
+if __name__ == "__main__":
+    unittest.main()
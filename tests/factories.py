@@ -0,0 +1,21 @@
+"Test data shared by unit tests"
+
+from collections.abc import MutableMapping
+from typing import Any
+
+from ldap_ui.ldap_helpers import ResponseEntry
+
+
+def response_entry(
+    dn: str,
+    raw_attributes: dict[str, list[bytes]] | None = None,
+    attributes: MutableMapping[str, Any] | None = None,
+) -> ResponseEntry:
+    "Search result for an entry, as returned by `get_responses`"
+    return ResponseEntry(
+        raw_dn=dn.encode(),
+        dn=dn,
+        attributes={} if attributes is None else attributes,
+        raw_attributes={} if raw_attributes is None else raw_attributes,
+        type="searchResEntry",
+    )
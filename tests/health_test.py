@@ -0,0 +1,48 @@
+import unittest
+from http import HTTPStatus
+from unittest.mock import AsyncMock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from ldap3.core.exceptions import LDAPSocketOpenError
+from ldap_ui import health, ldap_api
+
+app = FastAPI()
+app.include_router(health.router)
+
+
+class HealthTest(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        health.readiness = health.Readiness()
+
+    def test_healthz(self):
+        self.assertEqual(HTTPStatus.OK, self.client.get("/healthz").status_code)
+
+    def test_readyz(self):
+        with patch.object(
+            ldap_api, "discover", AsyncMock(side_effect=LDAPSocketOpenError("down"))
+        ) as discover:
+            result = self.client.get("/readyz")
+            self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, result.status_code)
+            self.assertIn("Retry-After", result.headers)
+            discover.side_effect = None
+
+            # The outcome is cached
+            result = self.client.get("/readyz")
+            self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, result.status_code)
+            self.assertEqual(1, discover.await_count)
+
+            health.readiness.checked = float("-inf")
+            self.assertEqual(HTTPStatus.OK, self.client.get("/readyz").status_code)
+            self.assertEqual(2, discover.await_count)
+
+    def test_statusz(self):
+        result = self.client.get("/statusz")
+        self.assertEqual(HTTPStatus.OK, result.status_code)
+        self.assertEqual(0, result.json()["admission"]["queued"])
+        self.assertIn("max", result.json()["loop_lag"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from anyio import create_task_group, sleep
+from ldap_ui import incremental
+from ldap_ui.changes import Change, ChangeType
+from ldap_ui.incremental import IncrementalIndex
+
+FRED_DN = "cn=Fred Flintstone,ou=People,o=Flintstones"
+
+
+class Index(IncrementalIndex):
+    "Records what is scanned and fetched"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.scans = 0
+        self.fetched: list[str] = []
+
+    async def scan(self, connection) -> None:
+        self.scans += 1
+        self.ready = True
+
+    async def fetch(self, connection, dn: str) -> None:
+        self.fetched.append(dn)
+
+    def remove(self, dn: str) -> None:
+        pass
+
+
+class IncrementalIndexTest(unittest.IsolatedAsyncioTestCase):
+    async def test_run(self):
+        index = Index()
+        connection = MagicMock(name="Connection")
+        connect = AsyncMock(return_value=connection)
+
+        async with create_task_group() as tg:
+            tg.start_soon(index.run, connect)
+            await sleep(0.01)
+            self.assertEqual(1, index.scans)
+
+            index.apply(Change(ChangeType.MODIFY, FRED_DN))
+            await sleep(0.01)
+            self.assertEqual([FRED_DN], index.fetched)
+            self.assertEqual(set(), index.pending)
+
+            index.apply(Change(ChangeType.RESET))
+            self.assertFalse(index.ready)
+            await sleep(0.01)
+            self.assertEqual(2, index.scans)
+            self.assertTrue(index.ready)
+            tg.cancel_scope.cancel()
+
+        self.assertEqual(3, connect.await_count)
+        self.assertEqual(3, connection.unbind.call_count)
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            IncrementalIndex()  # type: ignore[abstract]
+
+    def test_pending_max(self):
+        index = Index()
+        for i in range(incremental.PENDING_MAX + 1):
+            index.apply(Change(ChangeType.ADD, f"cn={i},o=Flintstones"))
+        self.assertTrue(index.invalid.is_set())  # Rescan instead
+
+
+if __name__ == "__main__":
+    unittest.main()
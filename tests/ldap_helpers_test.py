@@ -0,0 +1,177 @@
+import unittest
+
+from factories import response_entry
+from ldap3 import ASYNC, Connection, Server
+from ldap3.protocol.rfc4511 import (
+    LDAPDN,
+    AttributeDescription,
+    AttributeValue,
+    PartialAttribute,
+    SearchResultEntry,
+    Vals,
+)
+from ldap3.strategy.asynchronous import AsyncStrategy
+from ldap_ui.controls import ASSERTION, POST_READ, assertion
+from ldap_ui.ldap_helpers import (
+    LazyAsyncStrategy,
+    LazyAttributes,
+    ResponseEntry,
+    entry_tag,
+    format_lazily,
+    post_read_entry,
+    tag_assertion,
+    version_tag,
+)
+from pyasn1.codec.ber import encoder
+
+FRED_DN = b"cn=Fred Flintstone,ou=People,o=Flintstones"
+
+
+def search_result_entry(dn: bytes, attributes: dict[str, list[bytes]]) -> dict:
+    "Mimic the output of ldap3's fast BER decoder"
+
+    def tlv(value):
+        return (None, None, None, value)
+
+    return {
+        "protocolOp": 4,
+        "controls": None,
+        "payload": [
+            tlv(dn),
+            tlv(
+                [
+                    tlv([tlv(name.encode()), tlv([tlv(v) for v in values])])
+                    for name, values in attributes.items()
+                ]
+            ),
+        ],
+    }
+
+
+class LazyFormattingTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = Connection(Server("ldap://localhost"), client_strategy=ASYNC)
+
+    def test_format_lazily(self):
+        self.assertIs(type(self.connection.strategy), AsyncStrategy)
+        format_lazily(self.connection)
+        self.assertIsInstance(self.connection.strategy, LazyAsyncStrategy)
+        self.assertEqual(
+            self.connection.get_response, self.connection.strategy.get_response
+        )
+
+    def test_decode(self):
+        message = search_result_entry(
+            FRED_DN, {"cn": [b"Fred Flintstone"], "uidNumber": [b"1000"]}
+        )
+        eager = AsyncStrategy(self.connection).decode_response_fast(message)
+        lazy = LazyAsyncStrategy(self.connection).decode_response_fast(message)
+        self.assertEqual(eager["raw_attributes"], lazy["raw_attributes"])
+        self.assertEqual(eager["dn"], lazy["dn"])
+        self.assertIsInstance(lazy["attributes"], LazyAttributes)
+        self.assertEqual(dict(eager["attributes"]), dict(lazy["attributes"]))
+
+        entry = ResponseEntry(**lazy)
+        self.assertEqual(["Fred Flintstone"], entry.attributes["CN"])
+        self.assertEqual({"cn", "uidNumber"}, set(entry.attributes))
+
+    def test_ranged_values(self):
+        raw = {"member;range=0-1": [b"cn=a", b"cn=b"]}
+        entry = fred(raw)
+        # Nothing is formatted before the values are used
+        assert isinstance(entry.attributes, LazyAttributes)
+        self.assertIn("Member", entry.attributes)
+        self.assertNotIn("member;range=0-1", entry.attributes)
+        self.assertNotIn(42, entry.attributes)
+        self.assertFalse(entry.attributes._values)
+
+        self.assertEqual(["cn=a", "cn=b"], entry.attributes["member"])
+        self.assertEqual({"member"}, set(entry.attributes))
+
+    def test_rename(self):
+        attributes = LazyAttributes({"cn;lang-en": [b"Fred"]}, None)
+        attributes.rename("cn;lang-en", "cn")
+        self.assertEqual(["Fred"], attributes["cn"])
+        attributes.rename("cn", "commonName")  # Formatted values move, too
+        self.assertEqual(["Fred"], attributes["commonName"])
+        self.assertNotIn("cn", attributes)
+
+    def test_post_read_control(self):
+        photo = b"\xff\xd8\xff\xe0"  # Not text
+        entry = SearchResultEntry()
+        entry["object"] = LDAPDN(FRED_DN)
+        attribute = PartialAttribute()
+        attribute["type"] = AttributeDescription("jpegPhoto")
+        attribute["vals"] = Vals()
+        attribute["vals"].append(AttributeValue(photo))
+        entry["attributes"].append(attribute)
+
+        control = (
+            (None, None, None, POST_READ.encode()),
+            (None, None, 4, encoder.encode(entry)),
+        )
+        oid, decoded = LazyAsyncStrategy.decode_control_fast(control)
+        self.assertEqual(POST_READ, oid)
+
+        result = post_read_entry({"controls": {oid: decoded}}, None)
+        assert result is not None
+        self.assertEqual(FRED_DN.decode(), result.dn)
+        self.assertEqual({"jpegPhoto": [photo]}, result.raw_attributes)
+
+        self.assertIsNone(post_read_entry({"result": 0}, None))
+
+
+def fred(raw: dict[str, list[bytes]]) -> ResponseEntry:
+    return response_entry(FRED_DN.decode(), raw, LazyAttributes(raw, None))
+
+
+class EntityTagTest(unittest.TestCase):
+    CSN = b"20240101120000.123456Z#000000#000#000000"
+
+    def test_version_tag(self):
+        entry = fred({"modifyTimestamp": [b"20240101120000Z"], "entryCSN": [self.CSN]})
+        self.assertEqual(f"entryCSN:{self.CSN.decode()}", version_tag(entry))
+        self.assertEqual(version_tag(entry), entry_tag(entry))
+
+        # Timestamps cannot tell apart two updates within the same second
+        entry = fred({"cn": [b"Fred"], "modifyTimestamp": [b"20240101120000Z"]})
+        self.assertIsNone(version_tag(entry))
+        self.assertTrue(entry_tag(entry).startswith("sha256:"))
+        self.assertNotEqual(
+            entry_tag(entry),
+            entry_tag(fred({"cn": [b"Fred"], "modifyTimestamp": [b"20240101120001Z"]})),
+        )
+        self.assertNotEqual(
+            entry_tag(entry),
+            entry_tag(fred({"cn": [b"Fr"], "modifyTimestamp": [b"20240101120000Z"]})),
+        )
+
+    def test_content_hash(self):
+        entry = fred({"cn": [b"Fred"], "sn": [b"Flintstone"]})
+        self.assertIsNone(version_tag(entry))
+        self.assertTrue(entry_tag(entry).startswith("sha256:"))
+        self.assertEqual(
+            entry_tag(entry),
+            entry_tag(fred({"sn": [b"Flintstone"], "cn": [b"Fred"]})),
+        )
+        self.assertNotEqual(
+            entry_tag(entry),
+            entry_tag(fred({"cn": [b"Fre"], "sn": [b"dFlintstone"]})),
+        )
+
+    def test_assertion(self):
+        self.assertIsNone(tag_assertion("sha256:0123"))
+        self.assertIsNone(tag_assertion("modifyTimestamp:20240101120000Z"))
+        condition = tag_assertion(f"entryCSN:{self.CSN.decode()}")
+        self.assertEqual(f"(entryCSN={self.CSN.decode()})", condition)
+
+        oid, critical, value = assertion(condition)
+        self.assertEqual(ASSERTION, oid)
+        self.assertTrue(critical)
+        # Context tag 3 is an equality match, see RFC 4511
+        self.assertEqual(b"\xa3", value[:1])
+        self.assertIn(self.CSN, value)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from click.testing import CliRunner
+from ldap_ui import __main__, settings
+
+
+class MainTest(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+
+    def test_workers(self):
+        with (
+            patch.dict(os.environ),
+            patch.object(settings, "BASE_DN"),
+            patch.object(__main__, "discover") as discover,
+            patch.object(__main__.uvicorn, "run") as run,
+        ):
+            result = self.runner.invoke(
+                __main__.main, ["-w", "4", "-b", "o=Flintstones", "--loop", "asyncio"]
+            )
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertEqual("o=Flintstones", os.environ["BASE_DN"])
+        discover.assert_called_once()
+        self.assertEqual(4, run.call_args.kwargs["workers"])
+        self.assertEqual("asyncio", run.call_args.kwargs["loop"])
+
+    def test_reload_with_workers(self):
+        with patch.object(__main__.uvicorn, "run") as run:
+            result = self.runner.invoke(__main__.main, ["-w", "2", "--reload"])
+        self.assertNotEqual(0, result.exit_code)
+        run.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from pathlib import Path
+
+from ldap3 import MODIFY_ADD, MODIFY_DELETE, MODIFY_REPLACE, SchemaInfo
+from ldap_ui.matching import equality, normalizer, value_changes
+
+SCHEMA_INFO = Path(__file__).parent / "resources" / "schema.json"
+
+
+class MatchingTest(unittest.TestCase):
+    schema = SchemaInfo.from_json(SCHEMA_INFO.read_text())
+
+    def test_equality(self):
+        self.assertEqual("caseIgnoreMatch", equality(self.schema, "cn"))  # Inherited
+        self.assertEqual("distinguishedNameMatch", equality(self.schema, "member"))
+        self.assertIsNone(equality(self.schema, "unknownAttribute"))
+        self.assertIsNone(equality(None, "cn"))
+
+    def test_normalizer(self):
+        cn = normalizer(self.schema, "cn")
+        self.assertEqual(cn("Fred  Flintstone "), cn("fred flintstone"))
+
+        member = normalizer(self.schema, "member")
+        self.assertEqual(
+            member("cn=Fred,o=Flintstones"), member("CN=fred, O=Flintstones")
+        )
+
+        uid_number = normalizer(self.schema, "uidNumber")
+        self.assertEqual(uid_number("0042"), uid_number("42"))
+
+        self.assertNotEqual(
+            normalizer(self.schema, "jpegPhoto")("a"),
+            normalizer(self.schema, "jpegPhoto")("A"),
+        )
+
+    def test_value_changes(self):
+        member = normalizer(self.schema, "member")
+        old = [b"cn=Fred,o=Flintstones", b"cn=Wilma,o=Flintstones"]
+
+        self.assertEqual([], value_changes(old, [v.decode() for v in old], member))
+        self.assertEqual(
+            [(MODIFY_ADD, ["cn=Barney,o=Flintstones"])],
+            value_changes(
+                old,
+                [
+                    "cn=Fred,o=Flintstones",
+                    "cn=Wilma,o=Flintstones",
+                    "cn=Barney,o=Flintstones",
+                ],
+                member,
+            ),
+        )
+        self.assertEqual(
+            [(MODIFY_DELETE, [b"cn=Wilma,o=Flintstones"])],
+            value_changes(old, ["cn=Fred,o=Flintstones"], member),
+        )
+        self.assertEqual(
+            [(MODIFY_REPLACE, ["cn=Barney,o=Flintstones"])],
+            value_changes(old, ["cn=Barney,o=Flintstones"], member),
+        )
+
+    def test_spelling(self):
+        "Values that match, but are spelled differently, are replaced"
+        cn = normalizer(self.schema, "cn")
+        self.assertEqual(
+            [(MODIFY_DELETE, [b"fred"]), (MODIFY_ADD, ["Fred"])],
+            value_changes([b"fred", b"Freddy"], ["Fred", "Freddy"], cn),
+        )
+
+    def test_duplicates(self):
+        "Old values that match each other are all removed"
+        cn = normalizer(self.schema, "cn")
+        self.assertEqual(
+            [(MODIFY_DELETE, [b"fred", b"FRED"]), (MODIFY_ADD, ["Fred"])],
+            value_changes([b"fred", b"FRED", b"Barney"], ["Fred", "Barney"], cn),
+        )
+        self.assertEqual(
+            [(MODIFY_DELETE, [b"FRED"])],
+            value_changes([b"Fred", b"FRED", b"Barney"], ["Fred", "Barney"], cn),
+        )
+        self.assertEqual(
+            [(MODIFY_REPLACE, ["Fred"])],
+            value_changes([b"fred", b"FRED"], ["Fred"], cn),
+        )
+
+    def test_large_groups(self):
+        member = normalizer(self.schema, "member")
+        old = [f"cn=user{i},ou=People,o=Flintstones".encode() for i in range(50_000)]
+        new = [v.decode() for v in old] + ["cn=new,ou=People,o=Flintstones"]
+
+        self.assertEqual(
+            [(MODIFY_ADD, ["cn=new,ou=People,o=Flintstones"])],
+            value_changes(old, new, member),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+from factories import response_entry
+from ldap_ui.changes import Change, ChangeType
+from ldap_ui.ldap_helpers import ResponseEntry
+from ldap_ui.member_index import MembershipIndex, search_filter
+
+GROUPS_DN = "ou=Groups,o=Flintstones"
+FRED_DN = "cn=Fred Flintstone,ou=People,o=Flintstones"
+WILMA_DN = "cn=Wilma Flintstone,ou=People,o=Flintstones"
+
+
+def group(cn: str, **members: list[str]) -> ResponseEntry:
+    return response_entry(
+        f"cn={cn},{GROUPS_DN}",
+        {
+            "cn": [cn.encode()],
+            **{attr: [v.encode() for v in values] for attr, values in members.items()},
+        },
+    )
+
+
+class MembershipIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = MembershipIndex()
+        self.index.add(group("stonecutters", member=[FRED_DN]))
+        self.index.add(
+            group("family", uniqueMember=[f"{FRED_DN}#'0101'B", WILMA_DN.upper()])
+        )
+        self.index.add(group("users", memberUid=["fred", "wilma"]))
+        self.index.add(group("empty"))
+
+    def names(self, dn: str, uids: tuple[str, ...] = ()) -> list[str]:
+        return [r.name for r in self.index.memberships(dn, list(uids))]
+
+    def test_memberships(self):
+        self.assertEqual(["family", "stonecutters"], self.names(FRED_DN))
+        self.assertEqual(
+            ["family", "stonecutters", "users"], self.names(FRED_DN, ["fred"])
+        )
+        self.assertEqual(
+            ["family"], self.names("cn=wilma flintstone, ou=people, o=flintstones")
+        )
+        self.assertEqual([], self.names("cn=Barney Rubble,o=Flintstones", ["barney"]))
+        self.assertEqual(3, len(self.index.groups))  # Empty groups are skipped
+        self.assertEqual(1, self.index.by_uid)
+
+    def test_changes(self):
+        self.index.add(group("stonecutters", member=[WILMA_DN]))
+        self.assertEqual(["family"], self.names(FRED_DN))
+        self.assertEqual(["family", "stonecutters"], self.names(WILMA_DN))
+
+        self.index.apply(Change(ChangeType.DELETE, f"cn=family,{GROUPS_DN}"))
+        self.assertEqual([], self.names(FRED_DN))
+        self.assertNotIn(FRED_DN.lower(), self.index.members)
+
+        self.index.apply(Change(ChangeType.MODIFY, f"cn=users,{GROUPS_DN}"))
+        self.assertIn(f"cn=users,{GROUPS_DN}", self.index.pending)
+
+        self.index.apply(Change(ChangeType.RENAME, GROUPS_DN, "ou=Teams,o=Flintstones"))
+        self.assertEqual([], self.names(WILMA_DN))
+        self.assertIn("cn=stonecutters,ou=Teams,o=Flintstones", self.index.pending)
+
+    def test_search_filter(self):
+        self.assertEqual(
+            "(|(member=cn=a\\28b\\29,o=x)(uniqueMember=cn=a\\28b\\29,o=x)(memberUid=ab))",
+            search_filter("cn=a(b),o=x", ["ab"]),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from anyio import create_task_group, sleep
+from ldap_ui import offload, settings
+from ldap_ui.ldap_helpers import parse_ldif
+
+LDIF = b"""dn: cn=Fred Flintstone,ou=People,o=Flintstones
+objectClass: person
+cn: Fred Flintstone
+sn: Flintstone
+"""
+
+
+def thread_name(_data: bytes) -> str:
+    return threading.current_thread().name
+
+
+def process_id(_data: bytes) -> int:
+    return os.getpid()
+
+
+def block(seconds: float) -> None:
+    "Stall the event loop, like CPU bound work would"
+    time.sleep(seconds)
+
+
+class OffloadTest(unittest.IsolatedAsyncioTestCase):
+    async def test_inline(self):
+        name = await offload.run_sync(thread_name, b"", size=10)
+        self.assertEqual(threading.current_thread().name, name)
+
+    async def test_thread(self):
+        name = await offload.run_sync(thread_name, b"", size=settings.OFFLOAD_THRESHOLD)
+        self.assertNotEqual(threading.current_thread().name, name)
+
+        with patch.object(settings, "OFFLOAD_THREADS", 0):
+            name = await offload.run_sync(
+                thread_name, b"", size=settings.OFFLOAD_THRESHOLD
+            )
+            self.assertEqual(threading.current_thread().name, name)
+
+    async def test_process(self):
+        with (
+            patch.object(settings, "OFFLOAD_PROCESSES", 1),
+            patch.object(settings, "OFFLOAD_THREADS", 0),  # Independent
+        ):
+            records = await offload.run_sync(
+                parse_ldif, LDIF, size=settings.OFFLOAD_THRESHOLD, process=True
+            )
+            pid = await offload.run_sync(
+                process_id, b"", size=settings.OFFLOAD_THRESHOLD, process=True
+            )
+        self.assertNotEqual(os.getpid(), pid)
+        self.assertEqual(
+            [("cn=Fred Flintstone,ou=People,o=Flintstones", ["Flintstone"])],
+            [(dn, record["sn"]) for dn, record in records],
+        )
+
+    async def test_loop_lag(self):
+        monitor = offload.LoopLagMonitor(interval=0.01, threshold=0.05)
+        async with create_task_group() as tasks:
+            tasks.start_soon(monitor.run)
+            await sleep(0.02)
+            with self.assertLogs(offload.logger, level="WARNING"):
+                block(0.1)
+                await sleep(0.05)
+            tasks.cancel_scope.cancel()
+        self.assertGreaterEqual(monitor.max, 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from factories import response_entry
+from ldap_ui import search_index, settings
+from ldap_ui.changes import Change, ChangeType
+from ldap_ui.ldap_helpers import ResponseEntry
+from ldap_ui.search_index import SearchIndex
+
+PEOPLE_DN = "ou=People,o=Flintstones"
+PATTERNS = ("(uid=%s)", "(cn=%s*)", "(sn=%s*)")
+
+
+def person(cn: str, uid: str) -> ResponseEntry:
+    return response_entry(
+        f"cn={cn},{PEOPLE_DN}",
+        {
+            "cn": [cn.encode()],
+            "sn": [cn.split()[-1].encode()],
+            "uid": [uid.encode()],
+        },
+    )
+
+
+class SearchIndexTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.index = SearchIndex(PATTERNS)
+        for cn, uid in (
+            ("Fred Flintstone", "fred"),
+            ("Wilma Flintstone", "wilma"),
+            ("Barney Rubble", "brubble"),
+            ("Freddy Rubble", "fr"),
+        ):
+            self.index.add(person(cn, uid))
+
+    def names(self, query: str, limit: int = 10) -> list[str]:
+        return [r.name for r in self.index.search(query, limit)]
+
+    def test_patterns(self):
+        self.assertEqual({"uid": True, "cn": False, "sn": False}, self.index.attrs)
+        self.assertEqual(["cn", "sn", "uid"], self.index.attributes)
+
+    def test_search(self):
+        self.assertEqual(["Fred Flintstone", "Wilma Flintstone"], self.names("flint"))
+        self.assertEqual(["Barney Rubble", "Freddy Rubble"], self.names("RUB"))
+        self.assertEqual([], self.names("brub"))  # uid is matched exactly
+        self.assertEqual(["Barney Rubble"], self.names("brubble"))
+
+        # Exact matches first
+        self.assertEqual(["Freddy Rubble", "Fred Flintstone"], self.names("fr"))
+        self.assertEqual(["Freddy Rubble"], self.names("fr", limit=1))
+
+    def test_changes(self):
+        self.index.apply(Change(ChangeType.DELETE, f"cn=Wilma Flintstone,{PEOPLE_DN}"))
+        self.assertEqual(["Fred Flintstone"], self.names("flint"))
+
+        self.index.apply(Change(ChangeType.RENAME, PEOPLE_DN, "ou=Folks,o=Flintstones"))
+        self.assertEqual([], self.names("flint"))
+        self.assertIn("cn=Fred Flintstone,ou=Folks,o=Flintstones", self.index.pending)
+        self.assertTrue(self.index.dirty.is_set())
+
+        self.index.add(person("Fred Flintstone", "fred"))
+        self.index.add(person("Fred Flintstone", "fred"))  # Replaced
+        self.assertEqual(1, len(self.index.search("fred", 10)))
+
+    async def test_scan(self):
+        "Scans sort all values at once, with the same outcome as adding entries"
+
+        async def paged_search(*_args, **_kwargs):
+            for i in range(1000):
+                yield person(f"User {i:03}", f"u{i}")
+
+        connection = MagicMock(name="Connection")
+        connection.server.schema = None
+        with (
+            patch.object(search_index, "paged_search", paged_search),
+            patch.object(settings, "BASE_DN", "o=Flintstones"),
+        ):
+            await self.index.scan(connection)
+
+        self.assertTrue(self.index.ready)
+        self.assertEqual(1000, len(self.index.entries))
+        self.assertEqual(sorted(self.index.terms), self.index.terms)
+        self.assertEqual(["User 010"], self.names("u10", limit=1))
+
+        expected = SearchIndex(PATTERNS)
+        async for entry in paged_search():
+            expected.add(entry)
+        self.assertEqual(expected.terms, self.index.terms)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Compare the serialization of bulk responses.
+
+Builds a navigation tree response of many entries, once with validated
+models and FastAPI's generic encoder, and once with unvalidated models
+and a compiled pydantic serializer, as used by `/api/tree`,
+`/api/subtree` and `/api/search`.
+
+Run with: python tests/serialization_benchmark.py [entries]
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from fastapi.encoders import jsonable_encoder
+from ldap_ui.entities import TREE_ITEMS, TreeItem
+from ldap_ui.ldap_helpers import ResponseEntry
+
+
+def entries(count: int) -> list[ResponseEntry]:
+    return [
+        ResponseEntry(
+            raw_dn=f"cn=user{i},ou=People,o=Flintstones".encode(),
+            dn=f"cn=user{i},ou=People,o=Flintstones",
+            attributes={"structuralObjectClass": "inetOrgPerson"},
+            raw_attributes={
+                "structuralObjectClass": [b"inetOrgPerson"],
+                "hasSubordinates": [b"FALSE"],
+            },
+            type="searchResEntry",
+        )
+        for i in range(count)
+    ]
+
+
+def generic(results: list[ResponseEntry]) -> bytes:
+    "Validated models, encoded like FastAPI does for return values"
+    items = [
+        TreeItem(
+            dn=e.dn,
+            structuralObjectClass=e.attributes["structuralObjectClass"],
+            hasSubordinates=e.hasSubordinates,
+        )
+        for e in results
+    ]
+    return json.dumps(jsonable_encoder(items)).encode()
+
+
+def compiled(results: list[ResponseEntry]) -> bytes:
+    "Unvalidated models, encoded by pydantic-core"
+    return TREE_ITEMS.dump_json([TreeItem.of(e) for e in results])
+
+
+def measure(name: str, func: Callable, results: list[ResponseEntry]) -> None:
+    rounds = 5
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(results)
+    elapsed = (time.perf_counter() - start) / rounds
+
+    tracemalloc.start()
+    func(results)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{name:10} {elapsed * 1000:8.1f} ms "
+        f"{len(results) / elapsed:12,.0f} items/s "
+        f"{peak / 1024:10,.0f} KiB peak"
+    )
+
+
+if __name__ == "__main__":
+    results = entries(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
+    assert json.loads(generic(results)) == json.loads(compiled(results))
+    measure("generic", generic, results)
+    measure("compiled", compiled, results)
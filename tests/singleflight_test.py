@@ -0,0 +1,106 @@
+import gzip
+import unittest
+
+from anyio import create_task_group, sleep
+from ldap_ui.singleflight import SingleFlightMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.calls = 0
+
+        async def app(scope, receive, send):
+            self.calls += 1
+            await sleep(0.05)
+            content_type = (
+                b"text/event-stream"
+                if scope["path"] == "/api/events"
+                else b"text/plain"
+            )
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [(b"content-type", content_type)],
+                }
+            )
+            await send({"type": "http.response.body", "body": b"Fred" * 1000})
+
+        self.middleware = SingleFlightMiddleware(app)
+
+    async def request(
+        self,
+        path="/api/tree/base",
+        method="GET",
+        authorization=b"Basic ZnJlZA==",
+        encoding=b"identity",
+    ) -> list[dict]:
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": b"",
+            "headers": [
+                (b"authorization", authorization),
+                (b"accept-encoding", encoding),
+            ],
+        }
+        await self.middleware(scope, None, send)
+        return messages
+
+    async def concurrently(self, *requests) -> list[list[dict]]:
+        results = [None] * len(requests)
+
+        async def run(i, kwargs):
+            results[i] = await self.request(**kwargs)
+
+        async with create_task_group() as tasks:
+            for i, kwargs in enumerate(requests):
+                tasks.start_soon(run, i, kwargs)
+        return results
+
+    async def test_coalesced(self):
+        results = await self.concurrently({}, {}, {})
+        self.assertEqual(1, self.calls)
+        self.assertTrue(all(r == results[0] for r in results))
+        self.assertEqual(b"Fred" * 1000, results[0][-1]["body"])
+        self.assertFalse(self.middleware.flights)
+
+        await self.request()  # Not concurrent
+        self.assertEqual(2, self.calls)
+
+    async def test_not_coalesced(self):
+        await self.concurrently(
+            {},
+            {"authorization": b"Basic d2lsbWE="},
+            {"method": "DELETE"},
+            {"path": "/index.html"},
+        )
+        self.assertEqual(4, self.calls)
+
+    async def test_encoding(self):
+        "Responses are shared before they are compressed for each client"
+
+        self.middleware = GZipMiddleware(self.middleware)
+        compressed, plain, *_ = await self.concurrently(
+            {"encoding": b"gzip"}, {"encoding": b"identity"}, {"encoding": b"gzip"}
+        )
+        self.assertEqual(1, self.calls)
+        self.assertIn((b"content-encoding", b"gzip"), compressed[0]["headers"])
+        self.assertEqual(b"Fred" * 1000, gzip.decompress(compressed[-1]["body"]))
+        self.assertNotIn(b"content-encoding", dict(plain[0]["headers"]))
+        self.assertEqual(b"Fred" * 1000, plain[-1]["body"])
+
+    async def test_streaming(self):
+        await self.concurrently({"path": "/api/events"}, {"path": "/api/events"})
+        self.assertEqual(2, self.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from ldap_ui.static_files import IMMUTABLE, PrecompressedStaticFiles, accepted_encodings
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+SCRIPT = b"console.log('Yabba dabba doo!');\n" * 100
+
+
+class StaticsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.directory, "assets"))
+        for name, content in (
+            ("index.html", b"<html></html>"),
+            ("assets/index-BxV3k1_a.js", SCRIPT),
+            ("assets/index-BxV3k1_a.js.gz", gzip.compress(SCRIPT)),
+        ):
+            with open(os.path.join(self.directory, name), "wb") as file:
+                file.write(content)
+
+        app = Starlette(
+            routes=[
+                Mount(
+                    "/", PrecompressedStaticFiles(directory=self.directory, html=True)
+                )
+            ]
+        )
+        self.client = TestClient(app)
+
+    def test_precompressed(self):
+        result = self.client.get(
+            "/assets/index-BxV3k1_a.js", headers={"Accept-Encoding": "br;q=0, gzip"}
+        )
+        self.assertEqual("gzip", result.headers["Content-Encoding"])
+        self.assertTrue(result.headers["Content-Type"].startswith("text/javascript"))
+        self.assertEqual(IMMUTABLE, result.headers["Cache-Control"])
+        self.assertEqual(SCRIPT, result.content)  # Decoded by the client
+
+        etag = result.headers["ETag"]
+        result = self.client.get(
+            "/assets/index-BxV3k1_a.js",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+        )
+        self.assertEqual(304, result.status_code)
+
+    def test_identity(self):
+        result = self.client.get(
+            "/assets/index-BxV3k1_a.js", headers={"Accept-Encoding": "identity"}
+        )
+        self.assertNotIn("Content-Encoding", result.headers)
+        self.assertEqual(SCRIPT, result.content)
+
+        result = self.client.get("/")
+        self.assertEqual("no-cache", result.headers["Cache-Control"])
+
+    def test_accepted_encodings(self):
+        self.assertEqual(
+            {"gzip", "deflate"}, accepted_encodings("gzip, deflate;q=0.5, br;q=0")
+        )
+        self.assertEqual(set(), accepted_encodings(""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from factories import response_entry
+from ldap3.core.exceptions import LDAPNoSuchObjectResult
+from ldap_ui import subordinates
+from ldap_ui.changes import Change, ChangeType
+from ldap_ui.ldap_helpers import ResponseEntry
+from ldap_ui.subordinates import SubordinateCache, tree_items
+
+# Parent DN -> children, for directories without `hasSubordinates`
+DIRECTORY = {
+    "ou=People,o=x": ["uid=fred,ou=People,o=x", "uid=wilma,ou=People,o=x"],
+    "ou=Groups,o=x": [],
+}
+
+
+def entry(dn: str, **attributes: list[bytes]) -> ResponseEntry:
+    return response_entry(
+        dn, attributes, {"structuralObjectClass": "organizationalUnit"}
+    )
+
+
+class SubordinatesTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        subordinates.cache = SubordinateCache(ttl=30)
+        self.connection = MagicMock(name="Connection")
+        self.connection.user = "cn=admin,o=x"
+        self.connection.search.side_effect = lambda dn, *_args, **_kwargs: dn
+
+    async def get_response(self, _connection, msgid: str):
+        if msgid not in DIRECTORY:
+            raise LDAPNoSuchObjectResult()
+        return [{"dn": dn} for dn in DIRECTORY[msgid][:1]], {}
+
+    async def tree_items(self, dns: list[str], subtree: bool = False) -> dict:
+        with patch.object(subordinates, "get_response", self.get_response):
+            items = await tree_items(
+                self.connection, [entry(dn) for dn in dns], subtree
+            )
+        return {item.dn: item.hasSubordinates for item in items}
+
+    def test_attributes(self):
+        self.assertTrue(entry("o=x", hasSubordinates=[b"TRUE"]).hasSubordinates)
+        self.assertFalse(entry("o=x", hasSubordinates=[b"FALSE"]).hasSubordinates)
+        self.assertTrue(entry("o=x", numSubordinates=[b"3"]).hasSubordinates)
+        self.assertFalse(entry("o=x", numSubordinates=[b"0"]).hasSubordinates)
+        self.assertIsNone(entry("o=x").hasSubordinates)
+
+    async def test_probe(self):
+        dns = ["ou=People,o=x", "ou=Groups,o=x", "ou=Gone,o=x"]
+        self.assertEqual(
+            {"ou=People,o=x": True, "ou=Groups,o=x": False, "ou=Gone,o=x": False},
+            await self.tree_items(dns),
+        )
+        self.assertEqual(3, self.connection.search.call_count)  # All at once
+        self.assertEqual(1, self.connection.search.call_args.kwargs["size_limit"])
+
+        # Cached, except for the failure
+        await self.tree_items(dns)
+        self.assertEqual(4, self.connection.search.call_count)
+
+        # Until a child is added
+        subordinates.cache.apply(Change(ChangeType.ADD, "cn=admins,ou=Groups,o=x"))
+        await self.tree_items(dns)
+        self.assertEqual(6, self.connection.search.call_count)
+
+    async def test_subtree(self):
+        "Complete subtrees tell which entries have children"
+        self.assertEqual(
+            {
+                "ou=People,o=x": True,
+                "uid=fred,ou=People,o=x": False,
+                "ou=Groups,o=x": False,
+            },
+            await self.tree_items(
+                ["ou=People,o=x", "uid=fred,ou=People,o=x", "ou=Groups,o=x"],
+                subtree=True,
+            ),
+        )
+        self.connection.search.assert_not_called()
+
+    def test_cache(self):
+        cache = SubordinateCache(ttl=30)
+        cache.put("fred", "ou=People,o=x", True)
+        self.assertTrue(cache.get("fred", "OU=people, o=x"))
+        self.assertIsNone(cache.get("wilma", "ou=People,o=x"))  # Per user
+
+        cache.apply(Change(ChangeType.MODIFY, "uid=fred,ou=People,o=x"))
+        self.assertTrue(cache.get("fred", "ou=People,o=x"))
+        cache.apply(Change(ChangeType.DELETE, "uid=fred,ou=People,o=x"))
+        self.assertIsNone(cache.get("fred", "ou=People,o=x"))
+        self.assertEqual(0, cache.size)
+
+        with patch.object(subordinates, "CACHE_MAX", 2):
+            for i in range(3):
+                cache.put("fred", f"ou={i},o=x", True)
+            self.assertLessEqual(cache.size, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
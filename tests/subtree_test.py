@@ -0,0 +1,93 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from factories import response_entry
+from ldap3.core.exceptions import LDAPEntryAlreadyExistsResult
+from ldap_ui import subtree
+from ldap_ui.ldap_helpers import ResponseEntry
+
+
+def entry(dn: str, **attributes: list[bytes]) -> ResponseEntry:
+    return response_entry(dn, attributes)
+
+
+TEMPLATE = [
+    entry("cn=admins,ou=Template,o=x", cn=[b"admins"], member=[b"cn=a"]),
+    entry("ou=Template,o=x", ou=[b"Template", b"Skeleton"]),
+    entry("uid=svc,ou=Template,o=x", uid=[b"svc"], mail=[b"svc@x"]),
+    entry("cn=ops,cn=admins,ou=Template,o=x", cn=[b"ops"]),
+]
+
+
+class SubtreeCopyTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.added: list[str] = []
+        self.completed: list[str] = []
+        self.connection = MagicMock(name="Connection")
+        self.connection.add.side_effect = self.add
+
+    def add(self, dn, attributes):
+        self.added.append(dn)
+        return dn  # Use the DN as message ID
+
+    async def empty(self, _connection, msgid):
+        # Parents must be complete before children are sent
+        self.assertNotIn(msgid.partition(",")[2], set(self.added) - set(self.completed))
+        self.completed.append(msgid)
+        if msgid.startswith("uid=") and self.fail:
+            raise LDAPEntryAlreadyExistsResult()
+
+    async def copy(self, window: int, fail: bool = False) -> list:
+        self.fail = fail
+
+        async def paged_search(*_args, **_kwargs):
+            for e in TEMPLATE:
+                yield e
+
+        with (
+            patch.object(subtree, "paged_search", paged_search),
+            patch.object(subtree, "empty", self.empty),
+        ):
+            return [
+                step
+                async for step in subtree.copy_entries(
+                    self.connection, "ou=Template,o=x", "ou=Sales,o=x", window=window
+                )
+            ]
+
+    async def test_copy(self):
+        for window in (1, 2, 16):
+            self.added.clear()
+            self.completed.clear()
+            progress = await self.copy(window)
+            self.assertEqual(
+                [
+                    "ou=Sales,o=x",
+                    "cn=admins,ou=Sales,o=x",
+                    "cn=ops,cn=admins,ou=Sales,o=x",
+                    "uid=svc,ou=Sales,o=x",
+                ],
+                self.added,
+            )
+            self.assertEqual([1, 2, 3, 4], [p.copied for p in progress])
+            self.assertTrue(all(p.total == 4 and not p.error for p in progress))
+
+    async def test_stop_on_error(self):
+        progress = await self.copy(1, fail=True)
+        self.assertEqual(4, len(self.added))
+        self.assertEqual("uid=svc,ou=Sales,o=x", progress[-1].dn)
+        self.assertIsNotNone(progress[-1].error)
+
+    def test_copy_attributes(self):
+        self.assertEqual(
+            {"ou": [b"Skeleton", b"Sales"]},
+            subtree.copy_attributes(TEMPLATE[1], "ou=Sales", set()),
+        )
+        self.assertEqual(
+            {"uid": [b"svc"]},
+            subtree.copy_attributes(TEMPLATE[2], "uid=svc", {"uid", "mail"}),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
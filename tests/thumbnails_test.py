@@ -0,0 +1,91 @@
+import io
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ldap_ui import thumbnails
+from ldap_ui.thumbnails import ThumbnailCache, thumbnail_size
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def jpeg(width: int, height: int) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), "orange").save(out, "JPEG")
+    return out.getvalue()
+
+
+class ThumbnailCacheTest(unittest.TestCase):
+    def test_sizes(self):
+        self.assertEqual(32, thumbnail_size(1))
+        self.assertEqual(128, thumbnail_size(100))
+        self.assertEqual(128, thumbnail_size(128))
+        self.assertEqual(thumbnails.SIZES[-1], thumbnail_size(10_000))
+
+    def test_lru_eviction(self):
+        cache = ThumbnailCache(max_size=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        self.assertEqual(b"1234", cache.get("a"))  # "b" is now least recent
+        cache.put("c", b"1234")
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(8, cache.size)
+
+    def test_media_type(self):
+        self.assertEqual("image/jpeg", thumbnails.media_type(b"\xff\xd8\xff\xe0"))
+        self.assertEqual("image/png", thumbnails.media_type(b"\x89PNG\r\n\x1a\n..."))
+        self.assertEqual(
+            "application/octet-stream", thumbnails.media_type(b"not an image")
+        )
+
+    def test_oversized(self):
+        cache = ThumbnailCache(max_size=3)
+        cache.put("a", b"1234")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(0, cache.size)
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class ResizeTest(unittest.IsolatedAsyncioTestCase):
+    async def test_downscale(self):
+        cache = ThumbnailCache(max_size=1 << 20)
+        result = await cache.thumbnail(jpeg(800, 400), 64)
+        with Image.open(io.BytesIO(result)) as image:
+            self.assertEqual("JPEG", image.format)
+            self.assertEqual((64, 32), image.size)
+        self.assertEqual(len(result), cache.size)
+
+    async def test_small_image(self):
+        original = jpeg(20, 20)
+        self.assertEqual(original, thumbnails.resize(original, 64))
+
+    async def test_disk_store(self):
+        original = jpeg(300, 300)
+        with tempfile.TemporaryDirectory() as tmp:
+            result = await ThumbnailCache(1 << 20, tmp).thumbnail(original, 32)
+            # A fresh memory cache finds the stored thumbnail
+            cache = ThumbnailCache(1 << 20, tmp)
+            self.assertEqual(result, await cache.thumbnail(original, 32))
+            self.assertEqual(len(result), cache.size)
+
+    async def test_decompression_bomb(self):
+        "Images that are too large to decode are sent as they are"
+        original = jpeg(300, 300)
+        cache = ThumbnailCache(max_size=1 << 20)
+        with patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+            self.assertEqual(original, await cache.thumbnail(original, 32))
+        self.assertEqual(0, cache.size)
+
+    async def test_not_an_image(self):
+        cache = ThumbnailCache(max_size=1 << 20)
+        with self.assertRaises(OSError):
+            await cache.thumbnail(b"not an image", 64)
+
+
+if __name__ == "__main__":
+    unittest.main()
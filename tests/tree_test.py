@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from factories import response_entry
+from ldap_ui import ldap_api, settings
+from ldap_ui.entities import TreeItem
+from ldap_ui.ldap_helpers import ResponseEntry
+
+# Parent DN -> children
+DIRECTORY = {
+    "o=x": ["ou=People,o=x", "ou=Groups,o=x"],
+    "ou=People,o=x": ["uid=fred,ou=People,o=x", "uid=wilma,ou=People,o=x"],
+    "ou=Groups,o=x": ["cn=admins,ou=Groups,o=x"],
+    "cn=admins,ou=Groups,o=x": ["cn=ops,cn=admins,ou=Groups,o=x"],
+}
+
+
+def entry(dn: str) -> ResponseEntry:
+    return response_entry(
+        dn,
+        {"hasSubordinates": [b"TRUE" if dn in DIRECTORY else b"FALSE"]},
+        {"structuralObjectClass": "organizationalUnit"},
+    )
+
+
+async def get_responses(_connection, msgid: str):
+    for dn in DIRECTORY[msgid]:
+        yield entry(dn)
+
+
+def dns(items: list[TreeItem] | None) -> list[str]:
+    return [item.dn for item in items or []]
+
+
+class PrefetchTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.connection = MagicMock(name="Connection")
+        self.connection.search.side_effect = lambda dn, **_kwargs: dn  # msgid
+
+    async def prefetch(self, depth: int, reveal: str | None = None) -> list[TreeItem]:
+        items = [TreeItem.of(entry(dn)) for dn in DIRECTORY["o=x"]]
+        with (
+            patch.object(ldap_api, "get_responses", get_responses),
+            patch.object(ldap_api, "index_trusted", lambda: False),
+        ):
+            await ldap_api.prefetch(self.connection, items, depth, reveal)
+        return items
+
+    async def test_depth(self):
+        people, groups = await self.prefetch(depth=2)
+        self.assertEqual(DIRECTORY["ou=People,o=x"], dns(people.children))
+        self.assertEqual(DIRECTORY["ou=Groups,o=x"], dns(groups.children))
+        assert groups.children
+        self.assertIsNone(groups.children[0].children)  # Not prefetched
+        self.assertEqual(2, self.connection.search.call_count)  # One per parent
+
+    async def test_reveal(self):
+        people, groups = await self.prefetch(
+            depth=1, reveal="cn=ops,cn=admins,ou=Groups,o=x"
+        )
+        self.assertIsNone(people.children)
+        assert groups.children
+        self.assertEqual(
+            ["cn=ops,cn=admins,ou=Groups,o=x"], dns(groups.children[0].children)
+        )
+
+    async def test_budget(self):
+        with patch.object(settings, "TREE_PREFETCH_MAX", 3):
+            people, groups = await self.prefetch(depth=3)
+        self.assertEqual(DIRECTORY["ou=People,o=x"], dns(people.children))
+        self.assertIsNone(groups.children)  # Left for the client
+        self.connection.abandon.assert_called_once_with("ou=Groups,o=x")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,12 @@ import vue from "@vitejs/plugin-vue";
 
 // https://vitejs.dev/config/
 export default defineConfig({
-  plugins: [vue(), viteCompression()],
+  plugins: [
+    vue(),
+    // Precompressed variants, see backend/ldap_ui/static_files.py
+    viteCompression({ algorithm: "gzip", ext: ".gz" }),
+    viteCompression({ algorithm: "brotliCompress", ext: ".br" }),
+  ],
 
   base: "./",
 